@@ -1,11 +1,16 @@
 import asyncio
 import os
+import sys
 from dotenv import load_dotenv
 from llama_index.llms.gemini import Gemini
 from llama_index.core.agent.workflow import FunctionAgent, ToolCall, ToolCallResult
 from llama_index.tools.mcp import BasicMCPClient, McpToolSpec
 from llama_index.core.workflow import Context
 
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.llm import wrap_llama_index_llm
+
 # Load environment variables
 load_dotenv()
 
@@ -40,11 +45,12 @@ API_KEY = os.getenv("GOOGLE_API_KEY")
 if not API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
 
-llm = Gemini(
+# Every chat/complete call goes through the shared LLM layer (rate limits, retries, usage metrics)
+llm = wrap_llama_index_llm(Gemini(
     model="models/gemini-1.5-flash",
     api_key=API_KEY,
     temperature=0.1,
-)
+), caller="sqlite_agent")
 
 async def get_agent(server_url: str):
     """Initialize MCP client and create agent with database tools"""
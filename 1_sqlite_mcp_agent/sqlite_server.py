@@ -1,14 +1,23 @@
 # server.py
+import os
 import sqlite3
+import sys
 from fastmcp import FastMCP
 
-# Create FastMCP server
-mcp = FastMCP("MCP TOOLS SERVER")
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.instrumentation import instrument, span
+
+# Relative to the working directory unless SQLITE_DB_PATH says otherwise (gateway.py sets it)
+DB_PATH = os.getenv("SQLITE_DB_PATH", "data.db")
+
+# Create FastMCP server (every tool call is timed; see get_server_metrics and /metrics)
+mcp = instrument(FastMCP("MCP TOOLS SERVER"))
 
 # Initialize database
 def init_db():
     """Create the people table if it doesn't exist"""
-    conn = sqlite3.connect("data.db")
+    conn = sqlite3.connect(DB_PATH)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS people (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,9 +34,10 @@ def init_db():
 def add_data(query: str) -> str:
     """Execute an INSERT/UPDATE/DELETE query on the database"""
     try:
-        conn = sqlite3.connect("data.db")
-        cursor = conn.execute(query)
-        conn.commit()
+        conn = sqlite3.connect(DB_PATH)
+        with span("sql_execute", statement="write"):
+            cursor = conn.execute(query)
+            conn.commit()
         rows_affected = cursor.rowcount
         conn.close()
         return f"Success! {rows_affected} row(s) affected."
@@ -38,9 +48,11 @@ def add_data(query: str) -> str:
 def read_data(query: str = "SELECT * FROM people") -> str:
     """Execute a SELECT query and return results"""
     try:
-        conn = sqlite3.connect("data.db")
-        cursor = conn.execute(query)
-        results = cursor.fetchall()
+        conn = sqlite3.connect(DB_PATH)
+        with span("sql_execute", statement="select") as record:
+            cursor = conn.execute(query)
+            results = cursor.fetchall()
+            record["attributes"]["rows"] = len(results)
         
         # Get column names
         columns = [description[0] for description in cursor.description]
@@ -62,12 +74,13 @@ def read_data(query: str = "SELECT * FROM people") -> str:
 def add_person(name: str, age: int, email: str) -> str:
     """Add a new person to the database (easier than writing SQL)"""
     try:
-        conn = sqlite3.connect("data.db")
-        conn.execute(
-            "INSERT INTO people (name, age, email) VALUES (?, ?, ?)",
-            (name, age, email)
-        )
-        conn.commit()
+        conn = sqlite3.connect(DB_PATH)
+        with span("sql_execute", statement="insert"):
+            conn.execute(
+                "INSERT INTO people (name, age, email) VALUES (?, ?, ?)",
+                (name, age, email)
+            )
+            conn.commit()
         conn.close()
         return f"✅ Added {name} to database!"
     except Exception as e:
@@ -77,7 +90,7 @@ def add_person(name: str, age: int, email: str) -> str:
 def update_person(person_id: int, name: str = None, age: int = None, email: str = None) -> str:
     """Update an existing person's information"""
     try:
-        conn = sqlite3.connect("data.db")
+        conn = sqlite3.connect(DB_PATH)
         updates = []
         params = []
         
@@ -96,8 +109,9 @@ def update_person(person_id: int, name: str = None, age: int = None, email: str
         
         params.append(person_id)
         query = f"UPDATE people SET {', '.join(updates)} WHERE id = ?"
-        cursor = conn.execute(query, params)
-        conn.commit()
+        with span("sql_execute", statement="update"):
+            cursor = conn.execute(query, params)
+            conn.commit()
         rows_affected = cursor.rowcount
         conn.close()
         
@@ -112,9 +126,10 @@ def update_person(person_id: int, name: str = None, age: int = None, email: str
 def delete_person(person_id: int) -> str:
     """Delete a person from the database by their ID"""
     try:
-        conn = sqlite3.connect("data.db")
-        cursor = conn.execute("DELETE FROM people WHERE id = ?", (person_id,))
-        conn.commit()
+        conn = sqlite3.connect(DB_PATH)
+        with span("sql_execute", statement="delete"):
+            cursor = conn.execute("DELETE FROM people WHERE id = ?", (person_id,))
+            conn.commit()
         rows_affected = cursor.rowcount
         conn.close()
         
@@ -129,9 +144,9 @@ def delete_person(person_id: int) -> str:
 def count_people() -> str:
     """Count the total number of people in the database"""
     try:
-        conn = sqlite3.connect("data.db")
-        cursor = conn.execute("SELECT COUNT(*) FROM people")
-        count = cursor.fetchone()[0]
+        conn = sqlite3.connect(DB_PATH)
+        with span("sql_execute", statement="count"):
+            count = conn.execute("SELECT COUNT(*) FROM people").fetchone()[0]
         conn.close()
         return f"Total people in database: {count}"
     except Exception as e:
@@ -151,6 +166,7 @@ if __name__ == "__main__":
     print("  • update_person(person_id, name, age, email) - Update person")
     print("  • delete_person(person_id) - Delete person by ID")
     print("  • count_people() - Count total people")
+    print("  • get_server_metrics(include_traces) - Tool latency, payload and error metrics")
     print("\nPress Ctrl+C to stop\n")
     print("=" * 70)
     
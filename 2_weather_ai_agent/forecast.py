@@ -0,0 +1,289 @@
+"""
+Forecast providers and a per-location TTL cache.
+
+Providers return forecasts in one normalized shape and can fetch many locations in one
+request (Open-Meteo accepts comma-separated coordinate lists). `LocalProvider` is a
+deterministic stand-in that needs no network, for offline use and tests.
+
+`ForecastCache` keeps each location's forecast for WEATHER_CACHE_TTL_SECONDS. Concurrent
+requests for a location that is already being fetched wait for that fetch instead of
+starting their own, and the cache misses of a batch go to the provider in a single call.
+"""
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+# Always fetch the longest forecast, so requests for fewer days share the cached entry
+MAX_FORECAST_DAYS = 7
+MAX_LOCATIONS_PER_REQUEST = 50
+
+CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "600"))
+MAX_CACHED_LOCATIONS = int(os.getenv("WEATHER_CACHE_MAX_LOCATIONS", "2048"))
+FETCH_TIMEOUT = float(os.getenv("WEATHER_FETCH_TIMEOUT", "15"))
+
+# WMO weather interpretation codes used by Open-Meteo
+WMO_CODES = {
+    0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
+    45: "Fog", 48: "Depositing rime fog",
+    51: "Light drizzle", 53: "Drizzle", 55: "Dense drizzle",
+    56: "Light freezing drizzle", 57: "Freezing drizzle",
+    61: "Light rain", 63: "Rain", 65: "Heavy rain",
+    66: "Light freezing rain", 67: "Freezing rain",
+    71: "Light snow", 73: "Snow", 75: "Heavy snow", 77: "Snow grains",
+    80: "Light rain showers", 81: "Rain showers", 82: "Violent rain showers",
+    85: "Snow showers", 86: "Heavy snow showers",
+    95: "Thunderstorm", 96: "Thunderstorm with hail", 99: "Thunderstorm with heavy hail",
+}
+
+
+def describe(code) -> str:
+    return WMO_CODES.get(code, "Unknown") if code is not None else "Unknown"
+
+
+# --- Providers ---
+
+class OpenMeteoProvider:
+    """Forecasts from the free Open-Meteo API (no API key needed)."""
+
+    name = "open-meteo"
+
+    CURRENT = "temperature_2m,apparent_temperature,relative_humidity_2m,precipitation,weather_code,wind_speed_10m"
+    DAILY = ("weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum,"
+             "precipitation_probability_max,wind_speed_10m_max")
+
+    def fetch_many(self, places) -> list:
+        import requests
+
+        forecasts = []
+        for start in range(0, len(places), MAX_LOCATIONS_PER_REQUEST):
+            chunk = places[start:start + MAX_LOCATIONS_PER_REQUEST]
+            response = requests.get(FORECAST_URL, timeout=FETCH_TIMEOUT, params={
+                "latitude": ",".join(f"{place.latitude:.4f}" for place in chunk),
+                "longitude": ",".join(f"{place.longitude:.4f}" for place in chunk),
+                "current": self.CURRENT,
+                "daily": self.DAILY,
+                "timezone": "auto",
+                "forecast_days": MAX_FORECAST_DAYS,
+            })
+            response.raise_for_status()
+            data = response.json()
+            # A single location comes back as an object, several as a list
+            forecasts.extend(self._parse(item) for item in (data if isinstance(data, list) else [data]))
+        return forecasts
+
+    @staticmethod
+    def _parse(item: dict) -> dict:
+        current = item.get("current", {})
+        daily = item.get("daily", {})
+
+        def day_value(name, index):
+            values = daily.get(name) or []
+            return values[index] if index < len(values) else None
+
+        return {
+            "timezone": item.get("timezone"),
+            "current": {
+                "time": current.get("time"),
+                "conditions": describe(current.get("weather_code")),
+                "temperature_c": current.get("temperature_2m"),
+                "feels_like_c": current.get("apparent_temperature"),
+                "humidity_pct": current.get("relative_humidity_2m"),
+                "precipitation_mm": current.get("precipitation"),
+                "wind_speed_kmh": current.get("wind_speed_10m"),
+            },
+            "daily": [
+                {
+                    "date": day,
+                    "conditions": describe(day_value("weather_code", index)),
+                    "temp_max_c": day_value("temperature_2m_max", index),
+                    "temp_min_c": day_value("temperature_2m_min", index),
+                    "precipitation_mm": day_value("precipitation_sum", index),
+                    "precipitation_probability_pct": day_value("precipitation_probability_max", index),
+                    "wind_speed_max_kmh": day_value("wind_speed_10m_max", index),
+                }
+                for index, day in enumerate(daily.get("time", []))
+            ],
+        }
+
+
+class LocalProvider:
+    """
+    Offline stand-in: plausible, deterministic forecasts derived from latitude, season and a
+    seeded random generator. `latency` simulates a slow remote call.
+    """
+
+    name = "local"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    def fetch_many(self, places) -> list:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._forecast(place) for place in places]
+
+    @staticmethod
+    def _forecast(place, today: date = None) -> dict:
+        today = today or date.today()
+        rng = random.Random(f"{place.key}|{today.isoformat()}")
+        # Warm near the equator, seasonal swing growing with latitude (opposite in the south)
+        season = math.cos(2 * math.pi * (today.timetuple().tm_yday - 196) / 365.25)
+        hemisphere = 1 if place.latitude >= 0 else -1
+        base = 28 - 0.45 * abs(place.latitude) + hemisphere * season * abs(place.latitude) / 4
+
+        codes = [0, 1, 2, 3, 61, 63, 80, 95]
+        daily = []
+        for offset in range(MAX_FORECAST_DAYS):
+            code = rng.choice(codes)
+            wet = code >= 61
+            high = round(base + rng.uniform(-3, 4), 1)
+            daily.append({
+                "date": (today + timedelta(days=offset)).isoformat(),
+                "conditions": describe(code),
+                "temp_max_c": high,
+                "temp_min_c": round(high - rng.uniform(6, 11), 1),
+                "precipitation_mm": round(rng.uniform(1, 20), 1) if wet else 0.0,
+                "precipitation_probability_pct": rng.randint(60, 95) if wet else rng.randint(0, 25),
+                "wind_speed_max_kmh": round(rng.uniform(5, 35), 1),
+            })
+        first = daily[0]
+        temperature = round((first["temp_max_c"] + first["temp_min_c"]) / 2, 1)
+        return {
+            "timezone": "UTC",
+            "current": {
+                "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M"),
+                "conditions": first["conditions"],
+                "temperature_c": temperature,
+                "feels_like_c": round(temperature + rng.uniform(-2, 2), 1),
+                "humidity_pct": rng.randint(30, 95),
+                "precipitation_mm": round(first["precipitation_mm"] / 24, 1),
+                "wind_speed_kmh": round(first["wind_speed_max_kmh"] * 0.6, 1),
+            },
+            "daily": daily,
+        }
+
+
+PROVIDERS = {
+    OpenMeteoProvider.name: OpenMeteoProvider,
+    LocalProvider.name: LocalProvider,
+}
+
+
+def get_provider(name: str = None):
+    name = (name or os.getenv("WEATHER_PROVIDER", OpenMeteoProvider.name)).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown weather provider '{name}'. Use one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+# --- Cache ---
+
+class ForecastCache:
+    def __init__(self, provider, ttl: float = CACHE_TTL_SECONDS, max_entries: int = MAX_CACHED_LOCATIONS):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (fetched_at, forecast)
+        self._inflight = {}  # key -> Future of a fetch in progress
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "provider_calls": 0, "errors": 0}
+
+    def get(self, place) -> dict:
+        result = self.get_many([place])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def get_many(self, places) -> list:
+        """
+        Forecasts for the places, in order. Cached ones are returned directly, ones another
+        request is fetching are waited for, and the rest are fetched in one provider call.
+        A location that could not be fetched gets the exception instead of a forecast.
+        """
+        now = time.time()
+        results, waiting, to_fetch = {}, {}, OrderedDict()
+        with self._lock:
+            for place in places:
+                key = place.key
+                if key in results or key in waiting or key in to_fetch:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    results[key] = entry
+                    self.stats["hits"] += 1
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self.stats["coalesced"] += 1
+                else:
+                    self._inflight[key] = Future()
+                    to_fetch[key] = place
+                    self.stats["misses"] += 1
+
+        if to_fetch:
+            self._fetch(to_fetch, results)
+        for key, future in waiting.items():
+            try:
+                results[key] = future.result(timeout=FETCH_TIMEOUT * 2)
+            except Exception as e:
+                results[key] = e
+
+        return [self._with_age(results[place.key]) for place in places]
+
+    def _fetch(self, to_fetch: "OrderedDict", results: dict):
+        try:
+            forecasts = self.provider.fetch_many(list(to_fetch.values()))
+            error = None
+        except Exception as e:
+            print(f"forecast: {self.provider.name} request for {len(to_fetch)} location(s) failed: {e}", file=sys.stderr)
+            forecasts, error = [], e
+
+        fetched_at = time.time()
+        with self._lock:
+            self.stats["provider_calls"] += 1
+            for index, key in enumerate(to_fetch):
+                future = self._inflight.pop(key)
+                if error is None and index < len(forecasts):
+                    entry = (fetched_at, forecasts[index])
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    future.set_result(entry)
+                    results[key] = entry
+                else:
+                    failure = error or RuntimeError("The provider returned no forecast for this location")
+                    self.stats["errors"] += 1
+                    future.set_exception(failure)
+                    results[key] = failure
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _with_age(entry):
+        if isinstance(entry, Exception):
+            return entry
+        fetched_at, forecast = entry
+        return {**forecast, "age_seconds": round(time.time() - fetched_at, 1)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            return {
+                **self.stats,
+                "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 3) if lookups else None,
+                "cached_locations": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "provider": self.provider.name,
+            }
@@ -0,0 +1,164 @@
+"""
+Local geocoding index.
+
+City names are resolved against `cities.json` (name, aliases, country, coordinates,
+population) without any remote call. Names are matched case- and accent-insensitively,
+with a fuzzy fallback for typos. Ambiguous names resolve to the most populous city unless
+a country is given ("Birmingham, US"). Only names the index does not know go to the
+optional remote geocoder, and its answers are remembered.
+"""
+import difflib
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+from dataclasses import asdict, dataclass
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+CITIES_PATH = os.getenv("WEATHER_CITIES_PATH", os.path.join(PROJECT_DIR, "cities.json"))
+
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+# Country qualifiers people write instead of ISO codes
+COUNTRY_ALIASES = {"uk": "GB", "england": "GB", "scotland": "GB", "usa": "US", "america": "US"}
+
+COORDINATES = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    country: str
+    latitude: float
+    longitude: float
+    population: int = 0
+
+    @property
+    def key(self):
+        """Forecasts are cached per ~1 km grid cell."""
+        return round(self.latitude, 2), round(self.longitude, 2)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("population")
+        return data
+
+
+def normalize_name(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char)).lower()
+    name = re.sub(r"['.’]", "", name)
+    return re.sub(r"[\s\-_]+", " ", name).strip()
+
+
+def split_query(query: str):
+    """'Birmingham, US' -> ('birmingham', 'US'); 'Lagos' -> ('lagos', None)."""
+    name, _, qualifier = query.partition(",")
+    country = None
+    qualifier = normalize_name(qualifier)
+    if qualifier:
+        country = COUNTRY_ALIASES.get(qualifier, qualifier.upper() if len(qualifier) == 2 else None)
+    return normalize_name(name), country
+
+
+def open_meteo_geocode(name: str, country: str = None):
+    """Looks a place up with the Open-Meteo geocoding API; returns a Place or None."""
+    import requests
+
+    params = {"name": name, "count": 10, "language": "en", "format": "json"}
+    response = requests.get(GEOCODING_URL, params=params, timeout=10)
+    response.raise_for_status()
+    for result in response.json().get("results", []):
+        if country and result.get("country_code", "").upper() != country:
+            continue
+        return Place(
+            name=result["name"],
+            country=result.get("country_code", ""),
+            latitude=result["latitude"],
+            longitude=result["longitude"],
+            population=result.get("population") or 0,
+        )
+    return None
+
+
+class GeocodingIndex:
+    def __init__(self, path: str = CITIES_PATH, remote=None):
+        """`remote(name, country)` is called for names the local index cannot resolve (None: local only)."""
+        self.remote = remote
+        self._by_name = {}
+        self._remote_cache = {}
+        self._lock = threading.Lock()
+        self.stats = {"local": 0, "fuzzy": 0, "remote": 0, "unresolved": 0}
+
+        with open(path, encoding="utf-8") as f:
+            cities = json.load(f)
+        for city in cities:
+            place = Place(city["name"], city["country"], city["latitude"], city["longitude"], city.get("population", 0))
+            for name in [city["name"], *city.get("aliases", [])]:
+                self._by_name.setdefault(normalize_name(name), []).append(place)
+        for places in self._by_name.values():
+            places.sort(key=lambda place: -place.population)
+        self._names = sorted(self._by_name)
+
+    def __len__(self):
+        return len({place for places in self._by_name.values() for place in places})
+
+    def _candidates(self, name: str, country: str = None):
+        places = self._by_name.get(name, [])
+        if country:
+            places = [place for place in places if place.country == country]
+        return places
+
+    def resolve(self, query: str):
+        """Returns the Place for a city name (or a 'lat,lon' pair), or None if it cannot be found."""
+        match = COORDINATES.match(query)
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return Place(f"{latitude:.2f},{longitude:.2f}", "", latitude, longitude)
+
+        name, country = split_query(query)
+        if not name:
+            return None
+        places = self._candidates(name, country)
+        if places:
+            self.stats["local"] += 1
+            return places[0]
+
+        for close in difflib.get_close_matches(name, self._names, n=3, cutoff=0.85):
+            places = self._candidates(close, country)
+            if places:
+                self.stats["fuzzy"] += 1
+                return places[0]
+
+        if self.remote is None:
+            self.stats["unresolved"] += 1
+            return None
+        key = (name, country)
+        with self._lock:
+            if key in self._remote_cache:
+                return self._remote_cache[key]
+        try:
+            place = self.remote(query.partition(",")[0].strip(), country)
+        except Exception as e:
+            print(f"geocoding: remote lookup for '{query}' failed: {e}", file=sys.stderr)
+            self.stats["unresolved"] += 1
+            return None
+        with self._lock:
+            self._remote_cache[key] = place
+        self.stats["remote" if place else "unresolved"] += 1
+        return place
+
+    def search(self, query: str, limit: int = 5):
+        """Known places whose name starts with or closely matches the query, most populous first."""
+        name, country = split_query(query)
+        names = [known for known in self._names if known.startswith(name)] if name else []
+        names += difflib.get_close_matches(name, self._names, n=limit, cutoff=0.7)
+        found = []
+        for known in names:
+            for place in self._candidates(known, country):
+                if place not in found:
+                    found.append(place)
+        return sorted(found, key=lambda place: -place.population)[:limit]
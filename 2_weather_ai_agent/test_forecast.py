@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from forecast import MAX_FORECAST_DAYS, ForecastCache, LocalProvider
+from geocoding import Place
+
+
+def place(name, lat, lon):
+    return Place(name=name, country="NG", latitude=lat, longitude=lon)
+
+
+LAGOS = place("Lagos", 6.45, 3.39)
+ABUJA = place("Abuja", 9.07, 7.4)
+
+
+class CountingProvider(LocalProvider):
+    def __init__(self, latency=0.0, fail=False):
+        super().__init__(latency)
+        self.batches = []
+        self.fail = fail
+
+    def fetch_many(self, places):
+        self.batches.append([p.name for p in places])
+        if self.fail:
+            raise ConnectionError("provider down")
+        return super().fetch_many(places)
+
+
+def test_forecasts_are_cached_until_the_ttl_expires():
+    provider = CountingProvider()
+    cache = ForecastCache(provider, ttl=0.2)
+    first = cache.get(LAGOS)
+    assert len(first["daily"]) == MAX_FORECAST_DAYS
+    assert cache.get(LAGOS)["daily"] == first["daily"]
+    assert len(provider.batches) == 1
+
+    time.sleep(0.25)
+    cache.get(LAGOS)
+    assert len(provider.batches) == 2
+    assert cache.snapshot()["hits"] == 1
+
+
+def test_concurrent_requests_for_a_location_share_one_fetch():
+    provider = CountingProvider(latency=0.3)
+    cache = ForecastCache(provider)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(LAGOS))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5
+    assert provider.batches == [["Lagos"]]
+    assert cache.snapshot()["coalesced"] == 4
+
+
+def test_batch_misses_go_to_the_provider_in_one_request():
+    provider = CountingProvider()
+    cache = ForecastCache(provider)
+    cache.get(LAGOS)
+    forecasts = cache.get_many([LAGOS, ABUJA, ABUJA])
+    assert provider.batches == [["Lagos"], ["Abuja"]]
+    assert len(forecasts) == 3
+
+
+def test_failed_fetch_is_not_cached():
+    provider = CountingProvider(fail=True)
+    cache = ForecastCache(provider)
+    with pytest.raises(ConnectionError):
+        cache.get(LAGOS)
+    provider.fail = False
+    assert cache.get(LAGOS)["current"]
+    assert len(provider.batches) == 2
@@ -0,0 +1,141 @@
+# weather_server.py
+import json
+import os
+import sys
+import anyio
+from fastmcp import FastMCP
+from forecast import MAX_FORECAST_DAYS, ForecastCache, get_provider
+from geocoding import GeocodingIndex, open_meteo_geocode
+
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.instrumentation import instrument, span
+
+HOST = os.getenv("WEATHER_HOST", "127.0.0.1")
+PORT = int(os.getenv("WEATHER_PORT", "8001"))
+# Most cities a single get_weather_for_cities call may ask for
+MAX_BATCH_CITIES = int(os.getenv("WEATHER_MAX_BATCH_CITIES", "50"))
+
+# Create FastMCP server (every tool call is timed; see get_server_metrics and /metrics)
+mcp = instrument(FastMCP("MCP WEATHER SERVER"))
+
+# Forecast provider (WEATHER_PROVIDER=open-meteo or local) behind a per-location TTL cache
+provider = get_provider()
+forecasts = ForecastCache(provider)
+
+# City names resolve locally from cities.json; unknown names go to Open-Meteo's geocoder
+# unless the server runs offline on the local provider
+geocoder = GeocodingIndex(remote=None if provider.name == "local" else open_meteo_geocode)
+
+
+def format_forecast(place, forecast: dict, days: int) -> dict:
+    """A compact view of a cached forecast limited to `days` days."""
+    return {
+        "location": place.to_dict(),
+        "timezone": forecast.get("timezone"),
+        "current": forecast["current"],
+        "daily": forecast["daily"][:days],
+        "age_seconds": forecast.get("age_seconds"),
+    }
+
+
+def clamp_days(days: int) -> int:
+    return max(1, min(int(days), MAX_FORECAST_DAYS))
+
+
+# Geocoding and forecasts may wait on Open-Meteo, so the tools run them on worker threads:
+# FastMCP runs sync tools on its event loop, where one slow request would hold up every
+# other call and ForecastCache could never see two concurrent requests to coalesce
+
+def weather_for_city(city: str, days: int) -> str:
+    try:
+        with span("geocode"):
+            place = geocoder.resolve(city)
+        if place is None:
+            return f"Error: Could not find a city named '{city}'. Try search_cities to find the right name."
+        with span("forecast", locations=1):
+            forecast = forecasts.get(place)
+        return json.dumps(format_forecast(place, forecast, clamp_days(days)), indent=2)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def weather_for_cities(cities: list[str], days: int) -> str:
+    try:
+        if not cities:
+            return "Error: No cities given."
+        if len(cities) > MAX_BATCH_CITIES:
+            return f"Error: At most {MAX_BATCH_CITIES} cities per call."
+        days = clamp_days(days)
+
+        with span("geocode", cities=len(cities)):
+            resolved = [(city, geocoder.resolve(city)) for city in cities]
+        places = [place for _, place in resolved if place is not None]
+        with span("forecast", locations=len(places)):
+            by_key = dict(zip([place.key for place in places], forecasts.get_many(places)))
+
+        results = []
+        for city, place in resolved:
+            if place is None:
+                results.append({"query": city, "error": f"Could not find a city named '{city}'."})
+                continue
+            forecast = by_key[place.key]
+            if isinstance(forecast, Exception):
+                results.append({"query": city, "error": str(forecast)})
+            else:
+                results.append({"query": city, **format_forecast(place, forecast, days)})
+        return json.dumps(results, indent=2)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def find_cities(name: str, limit: int) -> str:
+    try:
+        places = geocoder.search(name, limit=max(1, min(int(limit), 20)))
+        if not places:
+            return f"No known city matches '{name}'."
+        return json.dumps([place.to_dict() for place in places], indent=2)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@mcp.tool()
+async def get_weather(city: str, days: int = 3) -> str:
+    """Get the current weather and a daily forecast (1-7 days) for a city name like 'Lagos' or 'Paris, FR', or 'lat,lon'"""
+    return await anyio.to_thread.run_sync(weather_for_city, city, days)
+
+
+@mcp.tool()
+async def get_weather_for_cities(cities: list[str], days: int = 1) -> str:
+    """Get the current weather and forecast for many cities in one call (one provider request for all of them)"""
+    return await anyio.to_thread.run_sync(weather_for_cities, cities, days)
+
+
+@mcp.tool()
+async def search_cities(name: str, limit: int = 5) -> str:
+    """Find known cities matching a name (useful when a city name is ambiguous or misspelled)"""
+    return await anyio.to_thread.run_sync(find_cities, name, limit)
+
+
+@mcp.tool()
+def get_weather_cache_stats() -> str:
+    """Report forecast cache hits, misses, coalesced requests, provider calls and geocoding counts"""
+    return json.dumps({"forecasts": forecasts.snapshot(), "geocoding": geocoder.stats}, indent=2)
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print(f"🚀 Starting MCP Weather Server on http://{HOST}:{PORT}")
+    print("=" * 70)
+    print(f"\nForecast provider: {provider.name} | Known cities: {len(geocoder)} | Cache TTL: {forecasts.ttl:.0f}s")
+    print("\nAvailable tools:")
+    print("  • get_weather(city, days) - Current weather and daily forecast")
+    print("  • get_weather_for_cities(cities, days) - Forecasts for many cities at once")
+    print("  • search_cities(name, limit) - Find known cities by name")
+    print("  • get_weather_cache_stats() - Cache and geocoding statistics")
+    print("  • get_server_metrics(include_traces) - Tool latency, payload and error metrics")
+    print("\nPress Ctrl+C to stop\n")
+    print("=" * 70)
+
+    # Run with HTTP transport
+    mcp.run(transport="http", host=HOST, port=PORT)
@@ -0,0 +1,348 @@
+"""
+Retrieval benchmark for the RAG stack.
+
+Builds synthetic (or fixture) corpora, runs a query set through each backend and reports
+index build time, search latency p50/p99, memory footprint, recall@k against brute-force
+ground truth and (optionally) encoder time, as JSON.
+
+    python bench_retrieval.py --sizes 1000 10000 100000 1000000 --output bench.json
+    python bench_retrieval.py --corpus-dir docs/ --encoder --backends bruteforce qdrant
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+SAMPLE_QUERIES = [
+    "What is machine learning?",
+    "Explain supervised learning",
+    "How does reinforcement learning work?",
+    "What is the difference between supervised and unsupervised learning?",
+    "What is deep learning?",
+    "reinforcement learning reward",
+    "neural networks with many layers",
+    "clustering unlabeled data",
+]
+
+
+# --- Corpora ---
+
+class Corpus:
+    def __init__(self, name: str, vectors: np.ndarray, queries: np.ndarray, texts: List[str] = None, query_texts: List[str] = None):
+        self.name = name
+        self.vectors = vectors
+        self.queries = queries
+        self.texts = texts
+        self.query_texts = query_texts
+
+    @property
+    def size(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def synthetic_corpus(size: int, dim: int, n_queries: int, seed: int = 0, chunk: int = 100_000) -> Corpus:
+    """Clustered Gaussian vectors, so nearest neighbours are meaningful rather than uniform noise."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, size // 100)
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+
+    vectors = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, chunk):
+        stop = min(start + chunk, size)
+        assignment = rng.integers(0, n_clusters, stop - start)
+        vectors[start:stop] = centers[assignment] + 0.5 * rng.standard_normal((stop - start, dim), dtype=np.float32)
+    vectors = normalize(vectors)
+
+    # Queries are perturbed corpus points, the usual shape of "paraphrase of a stored document"
+    picks = rng.integers(0, size, n_queries)
+    queries = normalize(vectors[picks] + 0.3 * rng.standard_normal((n_queries, dim), dtype=np.float32))
+    return Corpus(f"synthetic-{size}", vectors, queries)
+
+
+def fixture_corpus(directory: str, embedder, query_texts: List[str], timings: Dict[str, Any]) -> Corpus:
+    from ingestion import chunk_text, iter_documents
+
+    texts = []
+    for path in iter_documents(directory):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            texts.extend(chunk_text(f.read()))
+    if not texts:
+        raise ValueError(f"No .txt/.md documents found under {directory}")
+
+    start = time.perf_counter()
+    vectors = normalize(np.asarray(embedder.embed_batch(texts), dtype=np.float32))
+    timings["corpus_encode_seconds"] = time.perf_counter() - start
+    timings["corpus_chunks"] = len(texts)
+
+    queries = normalize(np.asarray(embedder.embed_batch(query_texts), dtype=np.float32))
+    return Corpus(f"fixture-{os.path.basename(os.path.normpath(directory))}", vectors, queries, texts, query_texts)
+
+
+# --- Backends ---
+
+class BruteForceBackend:
+    """Exact cosine search with one matrix-vector product; also the ground truth for recall."""
+    name = "bruteforce"
+
+    def build(self, corpus: Corpus):
+        # Own copy, so the reported memory is the footprint of the index itself
+        self.vectors = np.array(corpus.vectors, copy=True)
+
+    def search(self, query: np.ndarray, k: int, query_text: str = None) -> List[Any]:
+        scores = self.vectors @ query
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        return top[np.argsort(-scores[top])].tolist()
+
+    def close(self):
+        self.vectors = None
+
+
+class QdrantBackend:
+    """QdrantVDB in local mode, either on disk (as the server runs it) or fully in memory."""
+
+    def __init__(self, in_memory: bool = False):
+        self.in_memory = in_memory
+        self.name = "qdrant-memory" if in_memory else "qdrant"
+
+    def build(self, corpus: Corpus):
+        from qdrant_client.models import PointStruct
+        from rag_app import QdrantVDB
+
+        self.tmpdir = None if self.in_memory else tempfile.mkdtemp(prefix="bench_qdrant_")
+        self.vdb = QdrantVDB("bench", path=":memory:" if self.in_memory else self.tmpdir, vector_size=corpus.dim, seed=False)
+        batch = 1024
+        for start in range(0, corpus.size, batch):
+            self.vdb.upsert_points([
+                PointStruct(id=start + offset, vector=vector.tolist())
+                for offset, vector in enumerate(corpus.vectors[start:start + batch])
+            ])
+
+    def search(self, query: np.ndarray, k: int, query_text: str = None) -> List[Any]:
+        return [hit.id for hit in self.vdb.search(query.tolist(), limit=k)]
+
+    def close(self):
+        self.vdb.client.close()
+        if self.tmpdir:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class HybridBackend:
+    """
+    Retriver end to end (BM25 first, vector search + reciprocal rank fusion otherwise).
+    Needs document texts and the encoder, so it only runs on fixture corpora.
+    """
+    name = "hybrid"
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+
+    def build(self, corpus: Corpus):
+        from qdrant_client.models import PointStruct
+        from rag_app import QdrantVDB
+
+        self.vdb = QdrantVDB("bench", path=":memory:", vector_size=corpus.dim, seed=False)
+        self.vdb.upsert_points([
+            PointStruct(id=doc_id, vector=vector.tolist(), payload={"text": text})
+            for doc_id, (vector, text) in enumerate(zip(corpus.vectors, corpus.texts))
+        ])
+        self.retriever = None
+
+    def search(self, query: np.ndarray, k: int, query_text: str = None) -> List[Any]:
+        from rag_app import Retriver
+
+        if self.retriever is None:
+            self.retriever = Retriver(self.vdb, self.embedder, limit=k)
+        return [hit["id"] for hit in self.retriever.retrieve(query_text)]
+
+    def close(self):
+        self.vdb.client.close()
+
+
+BACKENDS = {
+    "bruteforce": lambda embedder: BruteForceBackend(),
+    "qdrant": lambda embedder: QdrantBackend(in_memory=False),
+    "qdrant-memory": lambda embedder: QdrantBackend(in_memory=True),
+    "hybrid": HybridBackend,
+}
+
+# Backends that need document texts and the encoder
+TEXT_BACKENDS = {"hybrid"}
+
+
+# --- Measurement ---
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss is a high-water mark (KiB on Linux, bytes on macOS); good enough as a fallback
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        "p50": float(np.percentile(ms, 50)),
+        "p99": float(np.percentile(ms, 99)),
+        "mean": float(ms.mean()),
+        "max": float(ms.max()),
+    }
+
+
+def ground_truth(corpus: Corpus, k: int, batch: int = 64) -> List[set]:
+    truth = []
+    for start in range(0, len(corpus.queries), batch):
+        scores = corpus.queries[start:start + batch] @ corpus.vectors.T
+        top = np.argpartition(-scores, min(k, corpus.size - 1), axis=1)[:, :k]
+        truth.extend(set(row.tolist()) for row in top)
+    return truth
+
+
+def run_backend(backend, corpus: Corpus, k: int, truth: List[set]) -> Dict[str, Any]:
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    backend.build(corpus)
+    build_seconds = time.perf_counter() - start
+    memory_bytes = max(0, rss_bytes() - rss_before)
+
+    query_texts = corpus.query_texts or [None] * len(corpus.queries)
+    # One warm-up query so lazy initialisation is not billed to the first measurement
+    backend.search(corpus.queries[0], k, query_texts[0])
+
+    latencies = []
+    recalls = []
+    for query, query_text, expected in zip(corpus.queries, query_texts, truth):
+        start = time.perf_counter()
+        ids = backend.search(query, k, query_text)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected.intersection(ids[:k])) / len(expected))
+
+    backend.close()
+    return {
+        "backend": backend.name,
+        "corpus": corpus.name,
+        "corpus_size": corpus.size,
+        "dim": corpus.dim,
+        "k": k,
+        "queries": len(corpus.queries),
+        "build_seconds": build_seconds,
+        "memory_bytes": memory_bytes,
+        "search_ms": latency_summary(latencies),
+        f"recall_at_{k}": float(np.mean(recalls)),
+    }
+
+
+def encoder_benchmark(embedder, query_texts: List[str], repeats: int = 3) -> Dict[str, Any]:
+    embedder.embed(query_texts[0])  # warm-up
+    single = []
+    for _ in range(repeats):
+        for text in query_texts:
+            start = time.perf_counter()
+            embedder.embed(text)
+            single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embedder.embed_batch(query_texts)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "single_query_ms": latency_summary(single),
+        "batch_size": len(query_texts),
+        "batch_ms_per_text": batch_seconds * 1000.0 / len(query_texts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency and recall for the RAG backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Synthetic corpus sizes")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per synthetic corpus")
+    parser.add_argument("--k", type=int, default=5, help="Results per query (Retriver uses 5)")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                        help="'hybrid' only runs on --corpus-dir corpora")
+    parser.add_argument("--corpus-dir", help="Benchmark a real document directory instead of synthetic corpora")
+    parser.add_argument("--query-file", help="Query texts, one per line (fixture corpora and --encoder)")
+    parser.add_argument("--encoder", action="store_true", help="Also time the EmbededData encoder")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    query_texts = SAMPLE_QUERIES
+    if args.query_file:
+        with open(args.query_file, "r", encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+
+    report = {
+        "config": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": [],
+    }
+
+    embedder = None
+    if args.encoder or args.corpus_dir:
+        from rag_app import EmbededData
+        start = time.perf_counter()
+        embedder = EmbededData()
+        report["encoder"] = {"load_seconds": time.perf_counter() - start}
+        if args.encoder:
+            report["encoder"].update(encoder_benchmark(embedder, query_texts))
+
+    if args.corpus_dir:
+        corpora = [fixture_corpus(args.corpus_dir, embedder, query_texts, report["encoder"])]
+    else:
+        corpora = (synthetic_corpus(size, args.dim, args.queries, args.seed) for size in args.sizes)
+
+    for corpus in corpora:
+        print(f"Benchmarking {corpus.name} ({corpus.size} vectors)...", file=sys.stderr)
+        start = time.perf_counter()
+        truth = ground_truth(corpus, args.k)
+        print(f"  ground truth in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        for name in args.backends:
+            if name in TEXT_BACKENDS and corpus.texts is None:
+                continue
+            result = run_backend(BACKENDS[name](embedder), corpus, args.k, truth)
+            print(
+                f"  {name}: build {result['build_seconds']:.2f}s, "
+                f"p50 {result['search_ms']['p50']:.2f}ms, p99 {result['search_ms']['p99']:.2f}ms, "
+                f"recall@{args.k} {result[f'recall_at_{args.k}']:.3f}",
+                file=sys.stderr
+            )
+            report["results"].append(result)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
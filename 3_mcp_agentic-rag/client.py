@@ -1,10 +1,16 @@
 import os
 print("Client script started...")
+import argparse
+import sys
 import asyncio
 from dotenv import load_dotenv
 import google.generativeai as genai
 from google.generativeai.types import FunctionDeclaration, Tool
-from server import mcp
+from fastmcp import Client
+
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.llm import shared_llm
 
 # Load environment variables
 load_dotenv()
@@ -56,32 +62,97 @@ model = genai.GenerativeModel(
     system_instruction="You are a helpful assistant. Use the provided tools to answer user questions. When a tool returns information, use it to construct your response. Do not call the same tool with the same arguments multiple times in a row."
 )
 
-from server import machine_learning_faq_retrieval_tool, serpapi_web_search_tool
-
-# Manual tool mapping since we are importing the server code directly
-TOOL_MAPPING = {
-    "machine_learning_faq_retrieval_tool": machine_learning_faq_retrieval_tool,
-    "serpapi_web_search_tool": serpapi_web_search_tool
+# Per-tool timeouts in seconds; web search goes over the network, retrieval is local
+TOOL_TIMEOUTS = {
+    "machine_learning_faq_retrieval_tool": 30,
+    "serpapi_web_search_tool": 20,
 }
+DEFAULT_TOOL_TIMEOUT = 30
+MAX_TOOL_ROUNDS = 3
+
+# URL of a running RAG server, e.g. http://127.0.0.1:8002/mcp (start it with: python server.py --transport http)
+RAG_SERVER_URL = os.getenv("RAG_SERVER_URL")
+
+class LocalToolHost:
+    """
+    Runs the RAG tools inside this process by importing the server code directly.
+    Each client process loads its own embedding model and opens the local Qdrant store.
+    """
+
+    async def __aenter__(self):
+        from server import machine_learning_faq_retrieval_tool, serpapi_web_search_tool
+
+        # Manual tool mapping since we are importing the server code directly;
+        # @mcp.tool() wraps the function, the plain callable lives on .fn
+        self.tools = {
+            "machine_learning_faq_retrieval_tool": getattr(machine_learning_faq_retrieval_tool, "fn", machine_learning_faq_retrieval_tool),
+            "serpapi_web_search_tool": getattr(serpapi_web_search_tool, "fn", serpapi_web_search_tool),
+        }
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    async def call_tool(self, name, args, timeout):
+        if name not in self.tools:
+            return f"Tool {name} not found."
+        # The tools are sync functions; run them on the default thread pool so the
+        # event loop stays free and several calls can run at the same time
+        return await asyncio.wait_for(asyncio.to_thread(self.tools[name], **args), timeout=timeout)
+
+class RemoteToolHost:
+    """
+    Calls the tools of a long-running RAG MCP server over HTTP.
+    One session is opened for the lifetime of the client and reused for every call,
+    so the model and index stay warm in the server and are shared by all clients.
+    """
 
-async def call_mcp_tool(name, args):
+    def __init__(self, url):
+        self.url = url
+        self.client = Client(url)
+
+    async def __aenter__(self):
+        await self.client.__aenter__()
+        try:
+            tools = await self.client.list_tools()
+        except BaseException as e:
+            # __aexit__ is not called when __aenter__ raises: close the session here
+            await self.client.__aexit__(type(e), e, e.__traceback__)
+            raise
+        print(f"Connected to RAG server at {self.url} ({len(tools)} tools).")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.__aexit__(*exc_info)
+
+    async def call_tool(self, name, args, timeout):
+        result = await self.client.call_tool(name, args, timeout=timeout)
+        if result.data is not None:
+            return result.data
+        return "\n".join(getattr(content, "text", "") for content in result.content)
+
+async def call_mcp_tool(host, name, args):
     print(f"Executing tool: {name} with args: {args}")
+    timeout = TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)
     try:
-        if name in TOOL_MAPPING:
-            func = TOOL_MAPPING[name]
-            # Simple dispatch
-            if name == "machine_learning_faq_retrieval_tool":
-                return func(query=args.get("query"))
-            elif name == "serpapi_web_search_tool":
-                return func(query=args.get("query"))
-            else:
-                return func(**args)
-        else:
-            return f"Tool {name} not found."
+        return await host.call_tool(name, args, timeout)
+    except asyncio.TimeoutError:
+        return f"Error executing tool: {name} timed out after {timeout}s"
     except Exception as e:
         return f"Error executing tool: {e}"
 
-async def main():
+async def call_mcp_tools(host, function_calls):
+    """Runs every function call from one model response concurrently, preserving order."""
+    calls = [(fc.name, dict(fc.args)) for fc in function_calls]
+    results = await asyncio.gather(*(call_mcp_tool(host, name, args) for name, args in calls))
+    return [(name, result) for (name, _), result in zip(calls, results)]
+
+async def main(server_url=None):
+    host = RemoteToolHost(server_url) if server_url else LocalToolHost()
+    async with host:
+        await chat_loop(host)
+
+async def chat_loop(host):
     chat = model.start_chat()
     print("Antigravity Client (Gemini + MCP) Started. Type 'exit' to quit.")
     
@@ -91,33 +162,36 @@ async def main():
             if user_input.lower() in ["exit", "quit"]:
                 break
                 
-            response = chat.send_message(user_input)
+            # Gemini calls go through the shared LLM layer (rate limits, retries, usage metrics)
+            # on a worker thread, so the event loop is not blocked while the model answers
+            response = await asyncio.to_thread(shared_llm.call, "rag_client", chat.send_message, user_input)
             
-            # Simple loop to handle up to 3 chained tool calls
-            for i in range(3):
-                function_call_part = None
-                for part in response.candidates[0].content.parts:
-                    if part.function_call:
-                        function_call_part = part
-                        break
+            # Handle up to MAX_TOOL_ROUNDS rounds of tool calls; every call in a round runs concurrently
+            for i in range(MAX_TOOL_ROUNDS):
+                function_calls = [
+                    part.function_call
+                    for part in response.candidates[0].content.parts
+                    if part.function_call
+                ]
                 
-                if function_call_part:
-                    fc = function_call_part.function_call
-                    name = fc.name
-                    args = dict(fc.args)
-                    
-                    tool_result = await call_mcp_tool(name, args)
-                    print(f"Tool Result ({len(str(tool_result))} chars): {str(tool_result)[:100]}...")
+                if function_calls:
+                    tool_results = await call_mcp_tools(host, function_calls)
+                    for name, tool_result in tool_results:
+                        print(f"Tool Result [{name}] ({len(str(tool_result))} chars): {str(tool_result)[:100]}...")
                     
-                    # Send result back to model
-                    response = chat.send_message(
+                    # Send all results back to the model in a single turn
+                    response = await asyncio.to_thread(
+                        shared_llm.call, "rag_client", chat.send_message,
                         genai.protos.Content(
-                            parts=[genai.protos.Part(
-                                function_response=genai.protos.FunctionResponse(
-                                    name=name,
-                                    response={"result": tool_result}
+                            parts=[
+                                genai.protos.Part(
+                                    function_response=genai.protos.FunctionResponse(
+                                        name=name,
+                                        response={"result": tool_result}
+                                    )
                                 )
-                            )]
+                                for name, tool_result in tool_results
+                            ]
                         )
                     )
                 else:
@@ -128,10 +202,17 @@ async def main():
                         print("AI: [Model returned non-text response]")
                     break
             else:
-                print("AI: [Stopped after 3 tool calls to prevent infinite loop]")
+                print(f"AI: [Stopped after {MAX_TOOL_ROUNDS} tool call rounds to prevent infinite loop]")
                 
         except Exception as e:
             print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Gemini client for the MCP Agentic RAG server.")
+    parser.add_argument(
+        "--server-url",
+        default=RAG_SERVER_URL,
+        help="URL of a running RAG server (e.g. http://127.0.0.1:8002/mcp). If omitted, the tools run in-process."
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.server_url))
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import os
+import re
+import sys
+import uuid
+from typing import List, Dict, Any
+from qdrant_client.models import PointStruct
+
+DEFAULT_EXTENSIONS = (".txt", ".md")
+
+
+def chunk_text(text: str, max_chars: int = 1000) -> List[str]:
+    """
+    Splits a document into chunks of at most max_chars, packing whole paragraphs together
+    and only cutting inside a paragraph when it is too long on its own.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+    pieces = []
+    for paragraph in paragraphs:
+        paragraph = " ".join(paragraph.split())
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        # Long paragraph: break on sentence boundaries, then hard-wrap whatever is still too long
+        sentence_chunk = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            while len(sentence) > max_chars:
+                if sentence_chunk:
+                    pieces.append(sentence_chunk)
+                    sentence_chunk = ""
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence_chunk and len(sentence_chunk) + 1 + len(sentence) > max_chars:
+                pieces.append(sentence_chunk)
+                sentence_chunk = sentence
+            else:
+                sentence_chunk = f"{sentence_chunk} {sentence}".strip()
+        if sentence_chunk:
+            pieces.append(sentence_chunk)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def iter_documents(directory: str, extensions=DEFAULT_EXTENSIONS):
+    extensions = tuple(ext.lower() for ext in extensions)
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                yield os.path.join(root, name)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source: str, chunk_hash: str) -> str:
+    # Deterministic point ID: an unchanged chunk keeps its ID across runs, a changed one gets a new ID
+    digest = hashlib.sha256(f"{source}\n{chunk_hash}".encode("utf-8")).hexdigest()
+    return str(uuid.UUID(digest[:32]))
+
+
+class DocumentIngestor:
+    """
+    Incrementally syncs a directory of documents into a QdrantVDB collection.
+
+    Every chunk is stored with its source path and content hash, so a re-run only embeds
+    chunks that are new or changed and deletes chunks whose source no longer produces them.
+    """
+
+    def __init__(self, vdb, embedder, max_chars: int = 1000, extensions=DEFAULT_EXTENSIONS):
+        self.vdb = vdb
+        self.embedder = embedder
+        self.max_chars = max_chars
+        self.extensions = tuple(ext.lower() for ext in extensions)
+
+    def _desired_chunks(self, directory: str) -> Dict[str, Dict[str, Any]]:
+        corpus = os.path.abspath(directory)
+        desired = {}
+        for path in iter_documents(corpus, self.extensions):
+            source = os.path.relpath(path, corpus).replace(os.sep, "/")
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+            except OSError as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+                continue
+            for index, chunk in enumerate(chunk_text(text, self.max_chars)):
+                chunk_hash = content_hash(chunk)
+                desired[chunk_id(source, chunk_hash)] = {
+                    "text": chunk,
+                    "source": source,
+                    "corpus": corpus,
+                    "chunk_index": index,
+                    "content_hash": chunk_hash,
+                }
+        return desired
+
+    def ingest(self, directory: str) -> Dict[str, int]:
+        """
+        Syncs the collection with the documents under directory.
+        Returns counts of added, deleted and unchanged chunks.
+        """
+        if not os.path.isdir(directory):
+            raise ValueError(f"Not a directory: {directory}")
+
+        corpus = os.path.abspath(directory)
+        desired = self._desired_chunks(corpus)
+        existing = set(self.vdb.scroll_payloads("corpus", corpus, fields=["content_hash"]))
+
+        new_ids = [point_id for point_id in desired if point_id not in existing]
+        stale_ids = [point_id for point_id in existing if point_id not in desired]
+
+        vectors = self.embedder.embed_batch([desired[point_id]["text"] for point_id in new_ids])
+        points = [
+            PointStruct(id=point_id, vector=vector, payload=desired[point_id])
+            for point_id, vector in zip(new_ids, vectors)
+        ]
+        self.vdb.upsert_points(points)
+        self.vdb.delete_points(stale_ids)
+        self.vdb.save_lexical_index()
+
+        stats = {
+            "added": len(new_ids),
+            "deleted": len(stale_ids),
+            "unchanged": len(desired) - len(new_ids),
+        }
+        print(f"Ingested {corpus} into {self.vdb.collection_name}: {stats}", file=sys.stderr)
+        return stats
+
+
+if __name__ == "__main__":
+    from rag_app import QdrantVDB, EmbededData
+
+    parser = argparse.ArgumentParser(description="Incrementally ingest a directory of documents into Qdrant.")
+    parser.add_argument("directory", help="Directory of .txt/.md documents to ingest")
+    parser.add_argument("--collection", default="ml_faq_collection", help="Qdrant collection name")
+    parser.add_argument("--path", default="./qdrant_db_new", help="Local Qdrant storage path")
+    parser.add_argument("--max-chars", type=int, default=1000, help="Maximum characters per chunk")
+    args = parser.parse_args()
+
+    ingestor = DocumentIngestor(QdrantVDB(args.collection, path=args.path), EmbededData(), max_chars=args.max_chars)
+    print(ingestor.ingest(args.directory))
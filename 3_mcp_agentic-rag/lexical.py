@@ -0,0 +1,144 @@
+import json
+import math
+import os
+import re
+import threading
+from typing import List, Dict, Any, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "of", "on", "or", "tell", "that", "the", "this", "to", "what",
+    "when", "where", "which", "who", "why", "with", "about", "explain",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incrementally maintained BM25 inverted index over the text payloads of a Qdrant collection.
+
+    Lives next to the collection on disk, so keyword queries can be answered without
+    running the embedding model. Safe to search while another thread ingests.
+    """
+
+    def __init__(self, path: str = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Any, int]] = {}
+        self.doc_terms: Dict[Any, Dict[str, int]] = {}
+        self.doc_lengths: Dict[Any, int] = {}
+        self.total_length = 0
+        self.dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.doc_terms)
+
+    @classmethod
+    def load(cls, path: str):
+        index = cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for doc_id, terms in data["docs"]:
+            index._add_terms(doc_id, terms)
+        index.dirty = False
+        return index
+
+    def save(self, path: str = None):
+        """Writes the index to its file if it changed, or, given a path, a copy there."""
+        with self._lock:
+            target = path or self.path
+            if not target or (path is None and not self.dirty):
+                return
+            tmp_path = f"{target}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"docs": [[doc_id, terms] for doc_id, terms in self.doc_terms.items()]}, f)
+            os.replace(tmp_path, target)
+            if path is None:
+                self.dirty = False
+
+    def _add_terms(self, doc_id, terms: Dict[str, int]):
+        with self._lock:
+            self.doc_terms[doc_id] = terms
+            self.doc_lengths[doc_id] = sum(terms.values())
+            self.total_length += self.doc_lengths[doc_id]
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.dirty = True
+
+    def add(self, doc_id, text: str):
+        terms = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+        with self._lock:
+            self.remove(doc_id)
+            self._add_terms(doc_id, terms)
+
+    def remove(self, doc_id):
+        with self._lock:
+            terms = self.doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            for term in terms:
+                docs = self.postings.get(term)
+                if docs is not None:
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del self.postings[term]
+            self.dirty = True
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Any, float, int]]:
+        """Returns [(doc_id, score, matched_query_terms)] ordered by BM25 score."""
+        query_terms = set(tokenize(query))
+        scores: Dict[Any, float] = {}
+        matched: Dict[Any, int] = {}
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not query_terms or not n_docs:
+                return []
+
+            avg_length = self.total_length / n_docs
+            for term in query_terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(doc_id, score, matched[doc_id]) for doc_id, score in ranked]
+
+    def is_confident(self, query: str, results: List[Tuple[Any, float, int]], margin: float = 1.5) -> bool:
+        """
+        A lexical hit is trusted on its own when the top document contains every query term
+        and clearly outscores the runner-up.
+        """
+        if not results:
+            return False
+        query_terms = set(tokenize(query))
+        top_id, top_score, top_matched = results[0]
+        if top_matched < len(query_terms):
+            return False
+        if len(results) == 1:
+            return True
+        return top_score >= margin * results[1][1]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Any]], k: int = 60) -> List[Any]:
+    """Fuses several ranked ID lists; documents ranked high in any list float to the top."""
+    scores: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
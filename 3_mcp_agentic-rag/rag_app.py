@@ -1,28 +1,109 @@
 import os
+import sys
+import threading
 from typing import List, Dict, Any
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (Distance, VectorParams, PointStruct, PointIdsList, Filter, FieldCondition, MatchValue,
+                                  IsEmptyCondition, PayloadField)
 from sentence_transformers import SentenceTransformer
+from lexical import BM25Index, reciprocal_rank_fusion
+
+try:
+    from mcp_shared.instrumentation import span
+except ImportError:
+    # Used outside the MCP server (ingestion CLI, bench_retrieval.py): stages are not timed
+    from contextlib import contextmanager
+
+    @contextmanager
+    def span(name, **attributes):
+        yield {"name": name, "attributes": attributes}
 
 class EmbededData:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", query_cache=None, lazy: bool = False):
+        # model_name may also be a local directory, e.g. the encoder saved in a snapshot
+        self.model_name = model_name
+        # Optional query text -> vector cache (snapshot.QueryCache); queries it holds are not encoded
+        self.query_cache = query_cache
+        self._model = None
+        self._model_lock = threading.Lock()
+        if not lazy:
+            self._model = SentenceTransformer(model_name)
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> SentenceTransformer:
+        # lazy=True defers loading the encoder to the first text that has to be encoded
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    with span("model_load"):
+                        self._model = SentenceTransformer(self.model_name)
+        return self._model
 
     def embed(self, text: str) -> List[float]:
-        return self.model.encode(text).tolist()
+        if self.query_cache is not None:
+            cached = self.query_cache.get(text)
+            if cached is not None:
+                return cached.tolist()
+        with span("embed", texts=1):
+            vector = self.model.encode(text)
+        if self.query_cache is not None:
+            self.query_cache.add(text, vector)
+        return vector.tolist()
+
+    def embed_batch(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        # One encode call per batch is much cheaper than encoding texts one by one
+        if not texts:
+            return []
+        with span("embed", texts=len(texts)):
+            return self.model.encode(texts, batch_size=batch_size).tolist()
 
 class QdrantVDB:
-    def __init__(self, collection_name: str, path: str = "./qdrant_db_new"):
-        self.client = QdrantClient(path=path)
+    # Points the lexical index holds: those with a text payload
+    _has_text = Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="text"))])
+
+    def __init__(self, collection_name: str, path: str = "./qdrant_db_new", vector_size: int = 384, seed: bool = True):
+        # path=":memory:" keeps the whole store in process memory (used by the benchmarks)
+        self.client = QdrantClient(location=":memory:") if path == ":memory:" else QdrantClient(path=path)
         self.collection_name = collection_name
         
         if not self.client.collection_exists(collection_name):
             self.client.create_collection(
                 collection_name=collection_name,
-                vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
             )
             # Seed with some initial data if created
-            self._seed_data()
+            if seed:
+                self._seed_data()
+
+        self.lexical = self._open_lexical_index(path)
+
+    def _open_lexical_index(self, path: str) -> BM25Index:
+        # The BM25 index is kept next to the collection, e.g. ./qdrant_db_new/ml_faq_collection.bm25.json
+        index_path = None if path == ":memory:" else os.path.join(path, f"{self.collection_name}.bm25.json")
+        if index_path and os.path.exists(index_path):
+            index = BM25Index.load(index_path)
+            # Points written around the index (an older ingestion, a recreated collection) make
+            # it diverge from the collection: rebuild it then
+            stored = self.client.count(collection_name=self.collection_name, count_filter=self._has_text, exact=True).count
+            if len(index) == stored:
+                return index
+            print(f"Lexical index of {self.collection_name} has {len(index)} documents, the collection {stored}; rebuilding it.",
+                  file=sys.stderr)
+
+        # First start after an upgrade (or an in-memory store): build the index from the stored payloads
+        index = BM25Index(index_path)
+        for point_id, payload in self.scroll_payloads(fields=["text"]).items():
+            if payload.get("text"):
+                index.add(point_id, payload["text"])
+        index.save()
+        return index
+
+    def save_lexical_index(self):
+        self.lexical.save()
 
     def _seed_data(self):
         # Dummy data for ML FAQ
@@ -49,8 +130,70 @@ class QdrantVDB:
             collection_name=self.collection_name,
             points=points
         )
+        # The lexical index is opened (and built from these payloads) right after seeding
         print(f"Seeded {self.collection_name} with {len(faqs)} documents.")
 
+    def upsert_points(self, points: List[PointStruct], batch_size: int = 256):
+        """Upserts points and keeps the lexical index in step; call save_lexical_index() when done."""
+        for start in range(0, len(points), batch_size):
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=points[start:start + batch_size]
+            )
+        for point in points:
+            if point.payload and point.payload.get("text"):
+                self.lexical.add(point.id, point.payload["text"])
+
+    def delete_points(self, ids: List[Any]):
+        if ids:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=list(ids))
+            )
+            for point_id in ids:
+                self.lexical.remove(point_id)
+
+    def retrieve_payloads(self, ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        points = self.client.retrieve(collection_name=self.collection_name, ids=list(ids), with_payload=True)
+        return {point.id: point.payload or {} for point in points}
+
+    def scroll_payloads(self, key: str = None, value: Any = None, fields: List[str] = None) -> Dict[Any, Dict[str, Any]]:
+        """Returns {point_id: payload} for every point, optionally filtered on a payload field."""
+        scroll_filter = None
+        if key is not None:
+            scroll_filter = Filter(must=[FieldCondition(key=key, match=MatchValue(value=value))])
+
+        payloads = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1024,
+                offset=offset,
+                with_payload=fields if fields is not None else True,
+                with_vectors=False
+            )
+            for point in points:
+                payloads[point.id] = point.payload or {}
+            if offset is None:
+                return payloads
+
+    def iter_points(self, with_vectors: bool = False, batch_size: int = 1024):
+        """Yields every point of the collection with its payload (and vector)."""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors
+            )
+            yield from points
+            if offset is None:
+                return
+
     def search(self, vector: List[float], limit: int = 5) -> List[Any]:
         return self.client.search(
             collection_name=self.collection_name,
@@ -59,17 +202,51 @@ class QdrantVDB:
         )
 
 class Retriver:
-    def __init__(self, vdb: QdrantVDB, embedder: EmbededData):
+    def __init__(self, vdb: QdrantVDB, embedder: EmbededData, limit: int = 5):
         self.vdb = vdb
         self.embedder = embedder
+        self.limit = limit
+
+    def retrieve(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Hybrid retrieval: BM25 first, and when the keyword match is confident the answer is
+        returned without encoding the query. Otherwise the vector results are fused with the
+        lexical ones by reciprocal rank fusion.
+        """
+        with span("lexical_search") as record:
+            lexical_hits = self.vdb.lexical.search(query, self.limit)
+            confident = self.vdb.lexical.is_confident(query, lexical_hits)
+            record["attributes"].update(hits=len(lexical_hits), confident=confident)
+        if confident:
+            ranking = [doc_id for doc_id, _, _ in lexical_hits]
+            with span("fetch_payloads", ids=len(ranking)):
+                payloads = self.vdb.retrieve_payloads(ranking)
+            return [{"id": doc_id, **payloads[doc_id]} for doc_id in ranking if doc_id in payloads]
 
-    def search(self, query: str) -> str:
         vector = self.embedder.embed(query)
-        results = self.vdb.search(vector)
+        with span("vector_search", limit=self.limit):
+            vector_hits = self.vdb.search(vector, limit=self.limit)
+        if not lexical_hits:
+            return [{"id": hit.id, **(hit.payload or {})} for hit in vector_hits]
+
+        payloads = {hit.id: hit.payload or {} for hit in vector_hits}
+        ranking = reciprocal_rank_fusion([
+            [hit.id for hit in vector_hits],
+            [doc_id for doc_id, _, _ in lexical_hits],
+        ])[:self.limit]
+        missing = [doc_id for doc_id in ranking if doc_id not in payloads]
+        if missing:
+            with span("fetch_payloads", ids=len(missing)):
+                payloads.update(self.vdb.retrieve_payloads(missing))
+        return [{"id": doc_id, **payloads[doc_id]} for doc_id in ranking if doc_id in payloads]
+
+    def search(self, query: str) -> str:
+        with span("retrieve"):
+            results = self.retrieve(query)
         
         if not results:
             return "No relevant documents found."
             
         # Format results
-        formatted_results = "\n\n".join([f"Document {i+1}:\n{hit.payload.get('text', '')}" for i, hit in enumerate(results)])
+        formatted_results = "\n\n".join([f"Document {i+1}:\n{hit.get('text', '')}" for i, hit in enumerate(results)])
         return formatted_results
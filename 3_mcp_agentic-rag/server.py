@@ -1,6 +1,17 @@
-from rag_app import Retriver, QdrantVDB, EmbededData
+import anyio
+import argparse
+import atexit
 import os
 import sys
+import threading
+import time
+
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.instrumentation import instrument, metrics, span
+from rag_app import Retriver, QdrantVDB, EmbededData
+from ingestion import DocumentIngestor
+from snapshot import QueryCache, load_snapshot, save_query_cache, write_snapshot
 import requests
 from dotenv import load_dotenv
 from fastmcp import FastMCP
@@ -10,22 +21,84 @@ from serpapi import GoogleSearch
 load_dotenv()
 
 # Initialize MCP Server
-mcp = FastMCP("MCP AGENTIC RAG SERVER")
+mcp = instrument(FastMCP("MCP AGENTIC RAG SERVER"))
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODEL_NAME = "all-MiniLM-L6-v2"
+COLLECTION_NAME = "ml_faq_collection"
+# Relative to the working directory unless RAG_QDRANT_PATH says otherwise (gateway.py sets it)
+QDRANT_PATH = os.getenv("RAG_QDRANT_PATH", "./qdrant_db_new")
+# Warm-state snapshot mapped in at boot (see snapshot.py); an empty value disables it
+SNAPSHOT_PATH = os.getenv("RAG_SNAPSHOT_PATH", os.path.join(HERE, "rag_snapshot"))
+
+store = None
+_store_lock = threading.Lock()
+
+
+def open_store() -> QdrantVDB:
+    """The Qdrant store: opened at boot without a snapshot, otherwise by the first ingestion."""
+    global store
+    with _store_lock:
+        if store is None:
+            store = QdrantVDB(COLLECTION_NAME, path=QDRANT_PATH)
+        return store
+
+
+def refresh_snapshot():
+    """Rewrites the snapshot from the store and serves retrieval from the new snapshot."""
+    global retriever
+    try:
+        with span("snapshot_write"):
+            write_snapshot(SNAPSHOT_PATH, open_store(), embedder, QDRANT_PATH, MODEL_NAME,
+                           query_cache=embedder.query_cache)
+    except Exception as e:
+        print(f"Warning: Failed to write the RAG snapshot: {e}", file=sys.stderr)
+        return
+    warm = load_snapshot(SNAPSHOT_PATH, QDRANT_PATH, COLLECTION_NAME, MODEL_NAME)
+    if warm is not None:
+        embedder.query_cache = warm.query_cache
+        if not embedder.model_loaded:
+            embedder.model_name = warm.model_path
+        retriever = Retriver(warm.index, embedder)
+
 
 # Initialize RAG components globally to avoid reloading model on every request
 try:
     print("Initializing RAG components...", file=sys.stderr)
-    # These will be initialized when the module is imported
-    embedder = EmbededData()
-    vdb = QdrantVDB("ml_faq_collection")
-    retriever = Retriver(vdb, embedder)
-    print("RAG components initialized.", file=sys.stderr)
+    started = time.perf_counter()
+    warm = load_snapshot(SNAPSHOT_PATH, QDRANT_PATH, COLLECTION_NAME, MODEL_NAME) if SNAPSHOT_PATH else None
+    if warm is not None:
+        # The encoder is only loaded (from the snapshot's weights) when a query has to be encoded
+        embedder = EmbededData(warm.model_path, query_cache=warm.query_cache, lazy=True)
+        retriever = Retriver(warm.index, embedder)
+        print(f"RAG components mapped in from {SNAPSHOT_PATH} in {time.perf_counter() - started:.3f}s "
+              f"({len(warm.index)} points, {len(warm.query_cache)} cached queries).", file=sys.stderr)
+    else:
+        embedder = EmbededData(MODEL_NAME, query_cache=QueryCache())
+        retriever = Retriver(open_store(), embedder)
+        print(f"RAG components initialized in {time.perf_counter() - started:.2f}s.", file=sys.stderr)
+        if SNAPSHOT_PATH:
+            # So that the next start is a warm one
+            refresh_snapshot()
 except Exception as e:
     print(f"Warning: Failed to initialize RAG components: {e}", file=sys.stderr)
     retriever = None
+else:
+    if SNAPSHOT_PATH:
+        # Queries embedded by this process are kept for the next start
+        atexit.register(lambda: save_query_cache(SNAPSHOT_PATH, embedder.query_cache))
+    metrics.add_section("rag_snapshot", lambda: {
+        "path": SNAPSHOT_PATH or None,
+        "serving_from_snapshot": not isinstance(retriever.vdb, QdrantVDB),
+        "encoder_loaded": embedder.model_loaded,
+        "query_cache": embedder.query_cache.stats(),
+    })
+
+# The tools below encode, search the web or ingest: they are async and do that on a worker thread,
+# because FastMCP runs sync tools on the event loop, which would stall every other call meanwhile
 
 @mcp.tool()
-def machine_learning_faq_retrieval_tool(query:str)->str:
+async def machine_learning_faq_retrieval_tool(query:str)->str:
     """
     Retrieves the most relevant documents from the machine learning FAQ collection, Use this  tool when the user ask about ML
     
@@ -42,11 +115,11 @@ def machine_learning_faq_retrieval_tool(query:str)->str:
     if retriever is None:
         return "Error: RAG system is not initialized. Please check server logs."
     
-    return retriever.search(query)
+    return await anyio.to_thread.run_sync(retriever.search, query)
 
 
 @mcp.tool()
-def serpapi_web_search_tool(query:str)->list[str]:
+async def serpapi_web_search_tool(query:str)->list[str]:
     """
     Search for information on a given topic using SerpAPI (Google Search).
     
@@ -65,7 +138,8 @@ def serpapi_web_search_tool(query:str)->list[str]:
             "api_key": api_key,
             "num": 5
         })
-        results = search.get_dict()
+        with span("web_search"):
+            results = await anyio.to_thread.run_sync(search.get_dict)
         
         if "error" in results:
             return [f"SerpAPI Error: {results['error']}"]
@@ -87,8 +161,45 @@ def serpapi_web_search_tool(query:str)->list[str]:
     except Exception as e:
         return [f"Error performing search: {str(e)}"]
 
+@mcp.tool()
+async def ingest_documents_tool(directory:str)->str:
+    """
+    Incrementally ingests a directory of .txt/.md documents into the machine learning FAQ collection.
+    Only new or changed chunks are embedded; chunks whose source disappeared are deleted.
+    
+    input:
+        directory:str->path to the directory of documents to ingest
+    output:
+        response:str -> counts of added, deleted and unchanged chunks
+    """
+    if retriever is None:
+        return "Error: RAG system is not initialized. Please check server logs."
+
+    def ingest():
+        stats = DocumentIngestor(open_store(), embedder).ingest(directory)
+        if SNAPSHOT_PATH and (stats["added"] or stats["deleted"]):
+            refresh_snapshot()
+        return stats
+
+    try:
+        stats = await anyio.to_thread.run_sync(ingest)
+    except Exception as e:
+        return f"Error ingesting documents: {str(e)}"
+    return f"Ingested {directory}: {stats['added']} added, {stats['deleted']} deleted, {stats['unchanged']} unchanged chunks."
+
 # starting the RAG MCP SERVER
 if __name__=="__main__":
-    # Use stdio transport for Claude Desktop compatibility
-    print("Starting MCP Server on stdio...", file=sys.stderr)
-    mcp.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MCP Agentic RAG server.")
+    parser.add_argument("--transport", choices=["stdio", "http"], default=os.getenv("RAG_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.getenv("RAG_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("RAG_PORT", "8002")))
+    args = parser.parse_args()
+
+    if args.transport == "http":
+        # One long-running process shares its warm model and index with every connected client
+        print(f"Starting MCP Server on http://{args.host}:{args.port}/mcp ...", file=sys.stderr)
+        mcp.run(transport="http", host=args.host, port=args.port)
+    else:
+        # Use stdio transport for Claude Desktop compatibility
+        print("Starting MCP Server on stdio...", file=sys.stderr)
+        mcp.run()
\ No newline at end of file
@@ -0,0 +1,374 @@
+"""
+Warm-state snapshot of the RAG server.
+
+Starting the server normally means constructing the SentenceTransformer (with a hub lookup),
+opening the local Qdrant store and loading the BM25 index. A snapshot is a directory holding
+everything retrieval needs, in files that are memory-mapped instead of parsed:
+
+    rag_snapshot/
+        manifest.json         model name, collection, point count, store fingerprint
+        model/                the encoder, saved as safetensors (loaded only on a cache miss)
+        vectors.npy           normalized float32 vectors, one row per point (mmap)
+        ids.json              point id of each row
+        payloads.jsonl        one JSON payload per line; payload_offsets.npy indexes it (mmap)
+        bm25.json             copy of the lexical index
+        query_texts.json      query embedding cache: texts and the name of...
+        query_vectors-*.npy   ...the file holding their vectors (mmap)
+
+The server maps a snapshot in at boot when its fingerprint still matches the Qdrant store,
+so no model or store is opened until a query needs the encoder. The first confident
+keyword query or cached query is answered in milliseconds, and several server processes
+share the page cache of the mapped files. Ingestion goes to the Qdrant store and rewrites
+the snapshot afterwards.
+
+    python snapshot.py --queries queries.txt    # precompute the embeddings of these queries
+    python snapshot.py --rebuild                # rewrite the snapshot from the store
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Dict, List
+
+import numpy as np
+
+from lexical import BM25Index
+
+SNAPSHOT_VERSION = 1
+QUERY_CACHE_MAX = int(os.getenv("RAG_QUERY_CACHE_MAX", "10000"))
+
+SnapshotHit = namedtuple("SnapshotHit", ["id", "score", "payload"])
+
+
+def store_fingerprint(qdrant_path: str, collection_name: str) -> str:
+    """Changes whenever the local Qdrant collection or its BM25 index is written."""
+    digest = hashlib.sha1()
+    paths = [
+        os.path.join(qdrant_path, "meta.json"),
+        os.path.join(qdrant_path, f"{collection_name}.bm25.json"),
+    ]
+    collection_dir = os.path.join(qdrant_path, "collection", collection_name)
+    for root, _, files in os.walk(collection_dir):
+        paths.extend(os.path.join(root, name) for name in files)
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f"{os.path.relpath(path, qdrant_path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class QueryCache:
+    """
+    Query text -> embedding. Vectors from the snapshot stay memory-mapped; queries embedded
+    since boot are kept in memory (up to RAG_QUERY_CACHE_MAX entries in total) and written
+    with the next snapshot.
+    """
+
+    def __init__(self, texts: List[str] = (), vectors: np.ndarray = None, max_entries: int = QUERY_CACHE_MAX):
+        self._rows = {text: row for row, text in enumerate(texts)}
+        self._vectors = vectors
+        self._new: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._new)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._new)
+
+    def get(self, text: str):
+        key = text.strip()
+        row = self._rows.get(key)
+        vector = self._vectors[row] if row is not None else self._new.get(key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return vector
+
+    def add(self, text: str, vector):
+        key = text.strip()
+        with self._lock:
+            if key not in self._rows and len(self) < self.max_entries:
+                self._new[key] = np.asarray(vector, dtype=np.float32)
+
+    def items(self):
+        for text, row in self._rows.items():
+            yield text, self._vectors[row]
+        yield from list(self._new.items())
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self), "new": len(self._new), "hits": self.hits, "misses": self.misses}
+
+
+class SnapshotIndex:
+    """
+    Read-only stand-in for QdrantVDB, served from a snapshot: exact cosine search over the
+    mapped vectors, payloads read from the mapped payload file and the BM25 index.
+    """
+
+    def __init__(self, path: str, collection_name: str):
+        self.collection_name = collection_name
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self._rows = {point_id: row for row, point_id in enumerate(self.ids)}
+        self._offsets = np.load(os.path.join(path, "payload_offsets.npy"), mmap_mode="r")
+        self._payloads = np.memmap(os.path.join(path, "payloads.jsonl"), dtype=np.uint8, mode="r") \
+            if self.ids else np.zeros(0, dtype=np.uint8)
+        # path=None: the copy is never written back; ingestion updates the store's own index
+        self.lexical = BM25Index.load(os.path.join(path, "bm25.json"))
+        self.lexical.path = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _payload(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._payloads[self._offsets[row]:self._offsets[row + 1]].tobytes())
+
+    def retrieve_payloads(self, ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        return {point_id: self._payload(self._rows[point_id]) for point_id in ids if point_id in self._rows}
+
+    def search(self, vector: List[float], limit: int = 5) -> List[SnapshotHit]:
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        scores = self.vectors @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [SnapshotHit(self.ids[row], float(scores[row]), self._payload(row)) for row in top]
+
+
+class WarmState:
+    """A loaded snapshot: the index, the query cache and where the encoder weights are."""
+
+    def __init__(self, path: str, manifest: Dict[str, Any], index: SnapshotIndex, query_cache: QueryCache):
+        self.path = path
+        self.manifest = manifest
+        self.index = index
+        self.query_cache = query_cache
+        self.model_path = os.path.join(path, "model")
+
+
+def load_snapshot(path: str, qdrant_path: str, collection_name: str, model_name: str):
+    """
+    Maps in the snapshot at path. Returns None (and says why on stderr) when there is none,
+    or when it was built from another model, collection or state of the store.
+    """
+    try:
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        print(f"No RAG snapshot at {path}.", file=sys.stderr)
+        return None
+
+    expected = {
+        "version": SNAPSHOT_VERSION,
+        "model": model_name,
+        "collection": collection_name,
+        "store_fingerprint": store_fingerprint(qdrant_path, collection_name),
+    }
+    stale = [key for key, value in expected.items() if manifest.get(key) != value]
+    if stale:
+        print(f"RAG snapshot at {path} is out of date ({', '.join(stale)}); starting from the store.", file=sys.stderr)
+        return None
+
+    index = SnapshotIndex(path, collection_name)
+    query_cache = QueryCache(*_load_query_vectors(path))
+    return WarmState(path, manifest, index, query_cache)
+
+
+def _load_query_vectors(path: str):
+    try:
+        with open(os.path.join(path, "query_texts.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        texts = data["texts"]
+        vectors = np.load(os.path.join(path, data["vectors"]), mmap_mode="r") if texts else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return [], None
+    if vectors is not None and len(vectors) != len(texts):
+        return [], None
+    return texts, vectors
+
+
+def _merge_query_vectors(query_cache: QueryCache, path: str) -> Dict[str, np.ndarray]:
+    """
+    The cache's entries plus those another process saved to the snapshot at path since this
+    one loaded it, up to the cache's max_entries.
+    """
+    entries = dict(query_cache.items())
+    texts, vectors = _load_query_vectors(path)
+    for row, text in enumerate(texts):
+        if len(entries) >= query_cache.max_entries:
+            break
+        if text not in entries:
+            entries[text] = vectors[row]
+    return entries
+
+
+def _write_query_vectors(path: str, entries: Dict[str, np.ndarray]):
+    """
+    Several server processes may save into the same snapshot. Each writes its vectors to a file
+    of its own and then swaps in query_texts.json, which names that file, so texts and vectors
+    always change together. Processes mapping the previous vectors file keep reading it.
+    """
+    vectors_name = f"query_vectors-{os.getpid()}-{time.time_ns()}.npy"
+    vectors = np.asarray(list(entries.values()), dtype=np.float32)
+    np.save(os.path.join(path, vectors_name), vectors)
+    texts_tmp = os.path.join(path, f"query_texts.json.tmp-{os.getpid()}")
+    with open(texts_tmp, "w", encoding="utf-8") as f:
+        json.dump({"vectors": vectors_name, "texts": list(entries)}, f)
+    os.replace(texts_tmp, os.path.join(path, "query_texts.json"))
+
+    # Drop vectors files nothing points to any more; recent ones may belong to a save in progress
+    for name in os.listdir(path):
+        if name.startswith("query_vectors-") and name != vectors_name:
+            file_path = os.path.join(path, name)
+            try:
+                if time.time() - os.path.getmtime(file_path) > 60:
+                    os.remove(file_path)
+            except OSError:
+                pass
+
+
+def save_query_cache(path: str, query_cache: QueryCache):
+    """
+    Writes the query cache (including queries embedded since boot) into an existing snapshot,
+    keeping the queries other processes saved there meanwhile.
+    """
+    if query_cache is None or not query_cache.dirty or not os.path.exists(os.path.join(path, "manifest.json")):
+        return
+    entries = _merge_query_vectors(query_cache, path)
+    _write_query_vectors(path, entries)
+    print(f"Saved {len(entries)} cached query embeddings to {path}.", file=sys.stderr)
+
+
+def precompute_queries(embedder, query_cache: QueryCache, queries: List[str]) -> int:
+    """Embeds the queries the cache does not hold yet; returns how many were added."""
+    new_queries = list(dict.fromkeys(query.strip() for query in queries if query.strip() and query_cache.get(query) is None))
+    for query, vector in zip(new_queries, embedder.embed_batch(new_queries)):
+        query_cache.add(query, vector)
+    return len(new_queries)
+
+
+def write_snapshot(path: str, vdb, embedder, qdrant_path: str, model_name: str,
+                   query_cache: QueryCache = None) -> Dict[str, Any]:
+    """Builds a snapshot of vdb (a QdrantVDB) next to path and swaps it in. Returns the manifest."""
+    started = time.perf_counter()
+    query_cache = query_cache if query_cache is not None else QueryCache()
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # Encoder weights: copied from the current snapshot when the model was never loaded from them
+    model_dir = os.path.join(tmp_path, "model")
+    if embedder.model_loaded:
+        embedder.model.save(model_dir, safe_serialization=True)
+    else:
+        shutil.copytree(embedder.model_name, model_dir)
+
+    ids, vectors, offsets = [], [], [0]
+    with open(os.path.join(tmp_path, "payloads.jsonl"), "wb") as f:
+        for point in vdb.iter_points(with_vectors=True):
+            line = json.dumps(point.payload or {}, ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+            ids.append(point.id)
+            vectors.append(point.vector)
+    dim = len(vectors[0]) if vectors else 0
+    np.save(os.path.join(tmp_path, "vectors.npy"), normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), dim)))
+    np.save(os.path.join(tmp_path, "payload_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_path, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+    # The store's own index file, brought up to date first, is copied as is
+    vdb.save_lexical_index()
+    lexical_path = os.path.join(tmp_path, "bm25.json")
+    if vdb.lexical.path and os.path.exists(vdb.lexical.path):
+        shutil.copy(vdb.lexical.path, lexical_path)
+    else:
+        # An in-memory store (or an empty one) has no file to copy
+        vdb.lexical.save(lexical_path)
+
+    # Queries other processes saved to the current snapshot, unless it was built with another encoder
+    try:
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            same_model = json.load(f).get("model") == model_name
+    except (OSError, ValueError):
+        same_model = False
+    query_entries = _merge_query_vectors(query_cache, path) if same_model else dict(query_cache.items())
+    _write_query_vectors(tmp_path, query_entries)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "model": model_name,
+        "collection": vdb.collection_name,
+        "store_fingerprint": store_fingerprint(qdrant_path, vdb.collection_name),
+        "points": len(ids),
+        "dim": dim,
+        "queries": len(query_entries),
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Directories cannot be replaced atomically: move the old one aside first. Processes that
+    # still map its files keep reading them until they load the new snapshot.
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    print(f"Wrote RAG snapshot to {path}: {len(ids)} points, {len(query_entries)} cached queries "
+          f"in {time.perf_counter() - started:.2f}s.", file=sys.stderr)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or extend the warm-state snapshot the RAG server maps in at boot.")
+    parser.add_argument("--queries", help="File with one query per line whose embeddings are precomputed")
+    parser.add_argument("--rebuild", action="store_true", help="Rewrite the snapshot even if it is up to date")
+    args = parser.parse_args()
+
+    # Importing the server maps in the snapshot, or builds it when it is missing or out of date
+    import server
+
+    if server.retriever is None:
+        sys.exit("RAG components failed to initialize; see the messages above.")
+    if not server.SNAPSHOT_PATH:
+        sys.exit("RAG_SNAPSHOT_PATH is empty: snapshots are disabled.")
+
+    query_cache = server.embedder.query_cache
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            added = precompute_queries(server.embedder, query_cache, f.read().splitlines())
+        print(f"Embedded {added} new queries.", file=sys.stderr)
+    if args.rebuild:
+        server.refresh_snapshot()
+    else:
+        save_query_cache(server.SNAPSHOT_PATH, query_cache)
+
+
+if __name__ == "__main__":
+    main()
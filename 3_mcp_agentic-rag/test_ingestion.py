@@ -0,0 +1,75 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qdrant_client")
+pytest.importorskip("sentence_transformers")
+
+from ingestion import DocumentIngestor
+from rag_app import QdrantVDB
+
+
+class HashEmbedder:
+    """Deterministic vectors, so the tests need no model download."""
+
+    def embed(self, text):
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(384).tolist()
+
+    def embed_batch(self, texts, batch_size=64):
+        self.encoded = getattr(self, "encoded", 0) + len(texts)
+        return [self.embed(text) for text in texts]
+
+
+@pytest.fixture
+def vdb():
+    return QdrantVDB("test_collection", path=":memory:", seed=False)
+
+
+def test_ingest_adds_then_skips_unchanged_then_deletes(vdb, tmp_path):
+    (tmp_path / "a.md").write_text("Gradient descent minimizes a loss function.")
+    (tmp_path / "b.txt").write_text("Overfitting means the model memorizes its training data.")
+    (tmp_path / "ignored.csv").write_text("not,a,document")
+    embedder = HashEmbedder()
+    ingestor = DocumentIngestor(vdb, embedder)
+
+    assert ingestor.ingest(str(tmp_path)) == {"added": 2, "deleted": 0, "unchanged": 0}
+    assert len(vdb.lexical) == 2
+
+    assert ingestor.ingest(str(tmp_path)) == {"added": 0, "deleted": 0, "unchanged": 2}
+    assert embedder.encoded == 2
+
+    (tmp_path / "a.md").write_text("Gradient descent follows the negative gradient.")
+    (tmp_path / "b.txt").unlink()
+    assert ingestor.ingest(str(tmp_path)) == {"added": 1, "deleted": 2, "unchanged": 0}
+
+    payloads = vdb.scroll_payloads()
+    assert [payload["source"] for payload in payloads.values()] == ["a.md"]
+    assert [doc_id for doc_id, _, _ in vdb.lexical.search("negative gradient")] == list(payloads)
+    assert vdb.lexical.search("overfitting") == []
+
+
+def test_missing_directory_is_rejected(vdb, tmp_path):
+    with pytest.raises(ValueError):
+        DocumentIngestor(vdb, HashEmbedder()).ingest(str(tmp_path / "missing"))
+
+
+def test_stale_lexical_index_is_rebuilt_on_open(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text("Gradient descent minimizes a loss function.")
+    (docs / "b.md").write_text("Dropout randomly disables neurons during training.")
+    store = str(tmp_path / "store")
+    vdb = QdrantVDB("test_collection", path=store, seed=False)
+    DocumentIngestor(vdb, HashEmbedder()).ingest(str(docs))
+
+    # A point written around the index, as an older ingestion would have done
+    dropped = next(doc_id for doc_id, _, _ in vdb.lexical.search("dropout"))
+    vdb.lexical.remove(dropped)
+    vdb.save_lexical_index()
+    vdb.client.close()
+
+    reopened = QdrantVDB("test_collection", path=store, seed=False)
+    assert len(reopened.lexical) == 2
+    assert [doc_id for doc_id, _, _ in reopened.lexical.search("dropout")] == [dropped]
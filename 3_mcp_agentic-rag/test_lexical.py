@@ -0,0 +1,65 @@
+from lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    1: "Supervised learning uses labeled datasets to train algorithms.",
+    2: "Unsupervised learning clusters unlabeled datasets.",
+    3: "Reinforcement learning maximizes cumulative reward in an environment.",
+}
+
+
+def make_index(path=None):
+    index = BM25Index(path)
+    for doc_id, text in DOCS.items():
+        index.add(doc_id, text)
+    return index
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("What is Deep-Learning?") == ["deep", "learning"]
+
+
+def test_search_ranks_matching_document_first():
+    results = make_index().search("reinforcement reward")
+    assert results[0][0] == 3
+    assert results[0][2] == 2
+    assert make_index().is_confident("reinforcement reward", results)
+
+
+def test_common_term_is_not_confident():
+    index = make_index()
+    results = index.search("learning")
+    assert len(results) == 3
+    assert not index.is_confident("learning", results)
+
+
+def test_remove_and_readd():
+    index = make_index()
+    index.remove(3)
+    assert index.search("reward") == []
+    index.add(3, "reward")
+    assert [doc_id for doc_id, _, _ in index.search("reward")] == [3]
+    assert len(index) == 3
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "index.bm25.json")
+    index = make_index(path)
+    index.save()
+    loaded = BM25Index.load(path)
+    assert len(loaded) == len(index)
+    assert loaded.search("unlabeled clusters") == index.search("unlabeled clusters")
+    assert not loaded.dirty
+
+
+def test_reciprocal_rank_fusion_prefers_documents_ranked_high_in_both():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]])
+    assert fused[:2] == ["b", "a"]
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_save_to_path_writes_a_copy(tmp_path):
+    index = make_index(str(tmp_path / "store.bm25.json"))
+    index.save(str(tmp_path / "copy.json"))
+    assert index.dirty
+    assert not (tmp_path / "store.bm25.json").exists()
+    assert len(BM25Index.load(str(tmp_path / "copy.json"))) == 3
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pytest
+
+from snapshot import QueryCache, _load_query_vectors, save_query_cache
+
+
+def make_snapshot(tmp_path):
+    (tmp_path / "manifest.json").write_text("{}")
+    return str(tmp_path)
+
+
+def test_processes_saving_to_one_snapshot_keep_each_others_queries(tmp_path):
+    path = make_snapshot(tmp_path)
+    first, second = QueryCache(), QueryCache()
+    first.add("what is bm25", np.ones(3))
+    second.add("what is rag", np.zeros(3))
+    save_query_cache(path, first)
+    save_query_cache(path, second)
+
+    texts, vectors = _load_query_vectors(path)
+    cache = QueryCache(texts, vectors)
+    assert sorted(texts) == ["what is bm25", "what is rag"]
+    assert cache.get("what is bm25").tolist() == [1, 1, 1]
+    assert cache.get("what is rag").tolist() == [0, 0, 0]
+
+
+def test_merge_respects_max_entries(tmp_path):
+    path = make_snapshot(tmp_path)
+    first, second = QueryCache(max_entries=2), QueryCache(max_entries=2)
+    first.add("a", np.ones(2))
+    first.add("b", np.ones(2))
+    second.add("c", np.zeros(2))
+    save_query_cache(path, first)
+    save_query_cache(path, second)
+    assert _load_query_vectors(path)[0] == ["c", "a"]
+
+
+
+class StubEncoder:
+    """Stands in for EmbededData: write_snapshot only saves its weights."""
+
+    model_name = "stub-model"
+    model_loaded = True
+
+    class model:
+        @staticmethod
+        def save(path, safe_serialization=True):
+            os.makedirs(path)
+
+
+def unit_vector(seed):
+    vector = np.random.default_rng(seed).standard_normal(384)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@pytest.fixture
+def store(tmp_path):
+    pytest.importorskip("qdrant_client")
+    pytest.importorskip("sentence_transformers")
+    from qdrant_client.models import PointStruct
+    from rag_app import QdrantVDB
+
+    path = str(tmp_path / "qdrant")
+    vdb = QdrantVDB("faq", path=path, seed=False)
+    texts = ["Gradient descent minimizes a loss function.", "Overfitting memorizes the training data.",
+             "Dropout regularizes neural networks.", "Recall is the share of positives found."]
+    vdb.upsert_points([PointStruct(id=i, vector=unit_vector(i), payload={"text": text}) for i, text in enumerate(texts)])
+    vdb.save_lexical_index()
+    yield vdb, path
+    vdb.client.close()
+
+
+def test_snapshot_answers_like_the_store(store, tmp_path):
+    from snapshot import load_snapshot, write_snapshot
+
+    vdb, qdrant_path = store
+    snapshot_path = str(tmp_path / "snapshot")
+    write_snapshot(snapshot_path, vdb, StubEncoder, qdrant_path, "stub-model")
+    warm = load_snapshot(snapshot_path, qdrant_path, "faq", "stub-model")
+    assert warm is not None and len(warm.index) == 4
+
+    for seed in (0, 2, 99):
+        query = unit_vector(seed)
+        expected = vdb.search(query, limit=3)
+        hits = warm.index.search(query, limit=3)
+        assert [hit.id for hit in hits] == [hit.id for hit in expected]
+        assert [hit.score for hit in hits] == pytest.approx([hit.score for hit in expected], abs=1e-5)
+        assert [hit.payload for hit in hits] == [hit.payload for hit in expected]
+    assert warm.index.retrieve_payloads([1, 3, 42]) == vdb.retrieve_payloads([1, 3])
+    assert warm.index.lexical.search("dropout") == vdb.lexical.search("dropout")
+
+
+def test_snapshot_is_stale_once_the_store_or_model_changes(store, tmp_path):
+    from qdrant_client.models import PointStruct
+    from snapshot import load_snapshot, write_snapshot
+
+    vdb, qdrant_path = store
+    snapshot_path = str(tmp_path / "snapshot")
+    write_snapshot(snapshot_path, vdb, StubEncoder, qdrant_path, "stub-model")
+    assert load_snapshot(snapshot_path, qdrant_path, "faq", "other-model") is None
+
+    vdb.upsert_points([PointStruct(id=9, vector=unit_vector(9), payload={"text": "Precision counts false positives."})])
+    vdb.save_lexical_index()
+    assert load_snapshot(snapshot_path, qdrant_path, "faq", "stub-model") is None
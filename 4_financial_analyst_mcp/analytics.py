@@ -0,0 +1,130 @@
+"""
+Vectorized multi-ticker analytics.
+
+Loads several tickers in one call from the market-data store and computes returns,
+volatility, drawdowns, correlations and relative performance with whole-frame pandas/NumPy
+operations. The result is a compact numeric summary sized for an LLM prompt, not raw frames.
+"""
+import numpy as np
+import pandas as pd
+
+from market_data import get_store, period_start
+
+TRADING_DAYS = 252
+# Shorter windows are not annualized: compounding a few days' return to a year is meaningless
+MIN_ANNUALIZED_DAYS = 30
+
+
+def number(value, scale: float = 1, digits: int = 2):
+    """Rounded float, or None for NaN/inf (too few rows, a flat series), which JSON cannot carry."""
+    value = float(value) * scale
+    return round(value, digits) if np.isfinite(value) else None
+
+
+def daily_series(series: pd.Series) -> pd.Series:
+    # Index daily bars by calendar date, so tickers from exchanges in different time zones line up
+    return series.set_axis(pd.DatetimeIndex(series.index.date, name="Date"))
+
+
+def compute_summary(closes: pd.DataFrame, rolling_window: int = 20) -> dict:
+    """Summarizes a DataFrame of close prices (one column per ticker)."""
+    closes = closes.sort_index().ffill().dropna(how="all")
+    if closes.empty:
+        return {"error": "No price data available."}
+
+    returns = closes.pct_change(fill_method=None)
+    first = closes.bfill().iloc[0]
+    last = closes.iloc[-1]
+    days = max((closes.index[-1] - closes.index[0]).days, 1)
+
+    total_return = last / first - 1
+    if days >= MIN_ANNUALIZED_DAYS:
+        annual_return = (1 + total_return) ** (365.25 / days) - 1
+    else:
+        annual_return = pd.Series(np.nan, index=total_return.index)
+    annual_volatility = returns.std() * np.sqrt(TRADING_DAYS)
+    rolling_volatility = returns.rolling(rolling_window).std().iloc[-1] * np.sqrt(TRADING_DAYS)
+    sharpe = returns.mean() / returns.std() * np.sqrt(TRADING_DAYS)
+
+    drawdown = closes / closes.cummax() - 1
+    max_drawdown = drawdown.min()
+    max_drawdown_date = drawdown.idxmin()
+
+    best_day = returns.max()
+    worst_day = returns.min()
+
+    tickers = {}
+    for ticker in closes.columns:
+        tickers[ticker] = {
+            "first_close": number(first[ticker]),
+            "last_close": number(last[ticker]),
+            "total_return_pct": number(total_return[ticker], 100),
+            "annualized_return_pct": number(annual_return[ticker], 100),
+            "annualized_volatility_pct": number(annual_volatility[ticker], 100),
+            f"volatility_{rolling_window}d_pct": number(rolling_volatility[ticker], 100),
+            "sharpe_ratio": number(sharpe[ticker]),
+            "max_drawdown_pct": number(max_drawdown[ticker], 100),
+            "max_drawdown_date": str(max_drawdown_date[ticker].date()) if pd.notna(max_drawdown_date[ticker]) else None,
+            "current_drawdown_pct": number(drawdown[ticker].iloc[-1], 100),
+            "best_day_pct": number(best_day[ticker], 100),
+            "worst_day_pct": number(worst_day[ticker], 100),
+        }
+
+    summary = {
+        "start": str(closes.index[0].date()),
+        "end": str(closes.index[-1].date()),
+        "trading_days": int(len(closes)),
+        "tickers": tickers,
+        "ranking_by_return": total_return.sort_values(ascending=False).index.tolist(),
+    }
+    if len(closes.columns) > 1:
+        correlation = returns.corr()
+        summary["return_correlation"] = {
+            ticker: {other: number(value) for other, value in row.items() if other != ticker}
+            for ticker, row in correlation.to_dict(orient="index").items()
+        }
+        # Each ticker's return minus the equal-weight average of the group
+        summary["relative_to_group_pct"] = {
+            ticker: number(value, 100) for ticker, value in (total_return - total_return.mean()).items()
+        }
+    return summary
+
+
+def load_histories(tickers, period: str, interval: str) -> dict:
+    """
+    {TICKER: DataFrame} from one bulk store call. A ticker with no data (unknown, delisted)
+    fails that call; the others are then read one by one and the failed ones map to None.
+    """
+    store = get_store()
+    try:
+        return store.get_histories(tickers, period=period, interval=interval)
+    except ValueError:
+        pass
+    histories = {}
+    for ticker in tickers:
+        try:
+            histories[ticker] = store.get_history(ticker, period=period, interval=interval)
+        except ValueError:
+            histories[ticker] = None
+    return histories
+
+
+def analyze_tickers(tickers, period: str = "1y", interval: str = "1d") -> dict:
+    """Loads all tickers in one store call (missing ranges are bulk-downloaded) and summarizes them."""
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker.strip()))
+    if not tickers:
+        return {"error": "No tickers given."}
+    period_start(period)  # an unsupported period is an error, not a missing ticker
+    histories = load_histories(tickers, period, interval)
+    missing = [ticker for ticker, hist in histories.items() if hist is None or hist.empty]
+    if len(missing) == len(tickers):
+        return {"error": f"No data for {', '.join(missing)}.", "period": period, "missing_tickers": missing}
+    closes = pd.DataFrame({
+        ticker: daily_series(hist["Close"]) if interval.endswith(("d", "wk", "mo")) else hist["Close"]
+        for ticker, hist in histories.items() if ticker not in missing
+    })
+    summary = compute_summary(closes)
+    summary["period"] = period
+    if missing:
+        summary["missing_tickers"] = missing
+    return summary
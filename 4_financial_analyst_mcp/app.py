@@ -2,12 +2,42 @@ import streamlit as st
 import os
 import sys
 from dotenv import load_dotenv
-from server import run_analysis, generate_story
 import urllib.parse
 
 # Load environment variables
 load_dotenv()
 
+# --- Process-wide resources ---
+# Created once per Streamlit process and shared by every session and rerun, instead of being
+# rebuilt (and Gemini re-configured) on each interaction.
+
+@st.cache_resource
+def get_analysis_backend():
+    """The job manager (with its crews) and the warm executor pool from server.py."""
+    import server
+    server.get_pool()
+    return server
+
+@st.cache_resource
+def get_story_cache():
+    from stories import story_cache
+    return story_cache
+
+# Labels for the job stages reported by server.analyze_query
+STAGE_LABELS = {
+    "queued": "⏳ Waiting for a free analyst",
+    "planning": "🧭 Planning",
+    "fast_path": "⚡ Using a ready-made template",
+    "plan_cache": "♻️ Reusing a script from a similar query",
+    "parsing": "🔍 Parsing the query",
+    "code_generation": "✍️ Writing the analysis code",
+    "code_generated": "✅ Code written",
+    "extracting_code": "📋 Extracting the code",
+    "executing": "⚙️ Running the analysis",
+    "plotting": "📊 Plot rendered",
+    "finished": "🏁 Finished",
+}
+
 st.set_page_config(
     page_title="Financial Analyst Agent", 
     page_icon="📈",
@@ -105,22 +135,46 @@ with col1:
 with col2:
     analyze_btn = st.button("Analyze 🚀", use_container_width=True)
 
+backend = get_analysis_backend()
+story_cache = get_story_cache()
+
 if analyze_btn:
     if not query:
         st.warning("Please enter a query.")
     else:
-        with st.spinner("🤖 Agents are working... (Parsing -> Coding -> Plotting)"):
-            try:
-                # Call the function directly from server.py
-                result = run_analysis(query)
-                
-                # Store in session state
-                st.session_state['analysis_complete'] = True
-                st.session_state['analysis_result'] = result
-                st.session_state['current_query'] = query
-                
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
+        # The analysis runs as a background job (see server.py), so this session and every
+        # other one stay responsive while the agents work
+        job = backend.jobs.submit(query)
+        st.session_state['job_id'] = job.id
+        st.session_state['current_query'] = query
+        st.session_state['analysis_complete'] = False
+        # Start the village story now, so it is written while the agents work
+        story_cache.get(query)
+
+@st.fragment(run_every=1.0)
+def show_progress(job_id: str):
+    """Polls the running job and lists its progress events; reruns the page once it finishes."""
+    job = backend.jobs.get(job_id)
+    if job is None:
+        st.error("The analysis job was not found. Please run the query again.")
+        del st.session_state['job_id']
+        return
+
+    status = job.to_dict()
+    with st.status(f"🤖 Agents are working... {STAGE_LABELS.get(job.stage, job.stage)}", expanded=True):
+        for event in status["events"]:
+            label = STAGE_LABELS.get(event["stage"], event["stage"])
+            st.markdown(f"`{event['elapsed']:6.1f}s` {label} {event['detail']}")
+
+    if job.finished:
+        st.session_state['analysis_complete'] = True
+        st.session_state['analysis_result'] = job.message
+        st.session_state['plot_png'] = backend.plot_png(job)
+        del st.session_state['job_id']
+        st.rerun()
+
+if st.session_state.get('job_id'):
+    show_progress(st.session_state['job_id'])
 
 # Display Results if analysis is complete
 if st.session_state.get('analysis_complete'):
@@ -143,34 +197,36 @@ if st.session_state.get('analysis_complete'):
             st.markdown(result)
         
         # Check for and display the plot
-        if os.path.exists("stock_plot.png"):
-            st.image("stock_plot.png", caption="Generated Stock Analysis Plot", use_container_width=True)
+        # The plot is kept in memory as PNG bytes (see plotting.py)
+        plot = st.session_state.get('plot_png')
+        if plot:
+            st.image(plot, caption="Generated Stock Analysis Plot", use_container_width=True)
         else:
-            st.warning("No plot image found (stock_plot.png).")
+            st.warning("No plot was produced (stock_plot.png).")
 
     with tab2:
-        st.info("Click the button below to hear the story behind the numbers.")
-        
-        # Use a unique key for this button to avoid conflicts
-        if st.button("📖 Tell me the Story", key="story_btn"):
-            with st.spinner("✨ Weaving a story..."):
-                story, image_prompt = generate_story(st.session_state['current_query'])
-                
-                # Generate Image URL using Pollinations AI
-                encoded_prompt = urllib.parse.quote(image_prompt)
-                image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1024&height=576&nologo=true"
-                
-                st.markdown(f"### 🌿 The Story of {st.session_state['current_query']}")
-                
-                # Display Image
-                st.image(image_url, caption=image_prompt, use_container_width=True)
-                
-                # Display Story
-                st.markdown(f"""
-                <div style="background-color: #f9f9f9; padding: 20px; border-radius: 10px; border-left: 5px solid #FFC107; font-size: 1.1em;">
-                    {story}
-                </div>
-                """, unsafe_allow_html=True)
+        current_query = st.session_state['current_query']
+        st.markdown(f"### 🌿 The Story of {current_query}")
+
+        # Started together with the analysis and cached per query, so it is usually ready already
+        story_entry = story_cache.get(current_query)
+        if story_entry.finished:
+            story, image_prompt = story_entry.result()
+            st.markdown(f"""
+            <div style="background-color: #f9f9f9; padding: 20px; border-radius: 10px; border-left: 5px solid #FFC107; font-size: 1.1em;">
+                {story}
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            # Still being written: show it word by word as Gemini produces it
+            st.write_stream(story_entry.stream())
+            story, image_prompt = story_entry.result()
+
+        if image_prompt:
+            # Generate Image URL using Pollinations AI
+            encoded_prompt = urllib.parse.quote(image_prompt)
+            image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1024&height=576&nologo=true"
+            st.image(image_url, caption=image_prompt, use_container_width=True)
 
 st.markdown("---")
 st.caption("Powered by CrewAI, Gemini 2.5 Flash, FastMCP, and Pollinations AI.")
@@ -0,0 +1,272 @@
+"""
+Offline end-to-end benchmark for the analysis pipeline.
+
+Queries go through the same path as the MCP server: JobManager, analyze_query, crew,
+code extraction, the warm executor pool and in-memory plotting. Two things are replaced.
+The crew is a stub that answers after a configurable latency with a script like the ones
+the writer agent produces. Market data comes from synthetic OHLCV files instead of Yahoo
+Finance. The run needs no API key and no network, and server.py loads crewai and yfinance
+only when the real crew runs, so fastmcp, numpy, pandas and matplotlib are enough.
+
+Per-stage latencies are taken from the server's own spans (mcp_shared/instrumentation.py),
+alongside job latency percentiles and throughput, for each pipeline mode and concurrency level:
+
+- crew: every query goes through the (stub) crew;
+- fast_path: template queries skip the crew (the others still use it);
+- plan_cache: the first query of each kind goes through the crew, later ones reuse its script.
+
+    python bench_pipeline.py --queries 40 --concurrency 1 2 4 --output bench_pipeline.json
+    python bench_pipeline.py --modes crew --llm-latency 1.5 --years 20
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+MODES = ["crew", "fast_path", "plan_cache"]
+STAGES = ["analysis", "fast_path", "plan_cache_lookup", "crew", "crew_parse", "codegen",
+          "code_extraction", "script_execution", "plotting"]
+
+COMPANIES = {"Apple": "AAPL", "Microsoft": "MSFT", "Google": "GOOGL", "Amazon": "AMZN", "Tesla": "TSLA",
+             "Nvidia": "NVDA", "Meta": "META", "Netflix": "NFLX", "Intel": "INTC", "AMD": "AMD"}
+PERIODS = ["3 months", "6 months", "1 year", "2 years", "5 years"]
+
+# A mix of queries the templates answer and ones only the crew can
+QUERY_TEMPLATES = [
+    "Show {name}'s stock price over the last {period}",
+    "Compare {name} and {other} stock over the past {period}",
+    "Plot the trading volume of {name} for the last {period}",
+    "Show the 30-day rolling volatility of {name} over the last {period}",
+    "Forecast {name} stock using its trend over the past {period}",
+]
+
+STUB_SCRIPT = '''import pandas as pd
+import matplotlib.pyplot as plt
+from market_data import load_close
+
+closes = load_close({tickers!r}, period={period!r})
+fig, ax = plt.subplots(figsize=(12, 6))
+for column in closes.columns:
+    ax.plot(closes.index, closes[column], label=f"{{column}} Close")
+    ax.plot(closes.index, closes[column].rolling(20).mean(), linestyle="--", label=f"{{column}} 20-day MA")
+ax.set_title("Closing prices and 20-day moving averages")
+ax.set_xlabel("Date")
+ax.set_ylabel("Price (USD)")
+ax.legend()
+plt.savefig("stock_plot.png")
+print("Plot saved to stock_plot.png")
+'''
+
+
+# --- Synthetic inputs ---
+
+def synthetic_ohlcv(ticker: str, years: int, seed: int) -> pd.DataFrame:
+    """Business-day OHLCV bars ending today: a geometric random walk with plausible ranges and volume."""
+    rng = np.random.default_rng([seed, *ticker.encode()])
+    index = pd.bdate_range(end=pd.Timestamp(date.today()), periods=years * 252, tz="UTC", name="Date")
+    returns = rng.normal(0.0004, 0.018, len(index))
+    close = 50 * rng.uniform(0.5, 4) * np.exp(np.cumsum(returns))
+    open_ = close * np.exp(rng.normal(0, 0.006, len(index)))
+    spread = np.abs(rng.normal(0, 0.01, len(index))) * close
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.lognormal(16, 0.4, len(index)).astype(np.int64),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=index)
+
+
+def write_market_data(directory: str, years: int, seed: int):
+    os.makedirs(directory, exist_ok=True)
+    for ticker in COMPANIES.values():
+        synthetic_ohlcv(ticker, years, seed).to_csv(os.path.join(directory, f"{ticker}.csv"))
+
+
+def make_queries(count: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    names = list(COMPANIES)
+    queries = []
+    for index in range(count):
+        name, other = rng.choice(names, size=2, replace=False)
+        template = QUERY_TEMPLATES[index % len(QUERY_TEMPLATES)]
+        queries.append(template.format(name=name, other=other, period=PERIODS[rng.integers(len(PERIODS))]))
+    return queries
+
+
+class StubCrew:
+    """Stands in for FinancialCrew: reports the same task boundaries, answers with a fixed-shape script."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def run(self, query: str, progress=None):
+        from plan_cache import intent_for
+
+        progress = progress or (lambda stage, detail="": None)
+        intent = intent_for(query) or {"tickers": ["AAPL"], "period": "1y"}
+        time.sleep(self.latency)
+        progress("code_generation", "query parsed")
+        time.sleep(self.latency)
+        progress("code_generated")
+        script = STUB_SCRIPT.format(tickers=intent["tickers"], period=intent["period"])
+        return f"Here is the script:\n```python\n{script}```"
+
+
+class NoPlanCache:
+    def lookup(self, query):
+        return None
+
+    def store(self, query, code):
+        return False
+
+    def invalidate(self, *args, **kwargs):
+        return 0
+
+
+# --- Runs ---
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    values = np.asarray(values)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def configure_mode(server, mode: str, original_plan_query):
+    from plan_cache import PlanCache
+
+    server.plan_query = original_plan_query if mode == "fast_path" else (lambda query: None)
+    # path=None: an in-memory plan cache that starts empty for every run
+    server.plan_cache = PlanCache(path=None) if mode == "plan_cache" else NoPlanCache()
+
+
+def run_level(server, queries, concurrency: int, workspace: str) -> dict:
+    from jobs import JobManager
+    from mcp_shared.instrumentation import metrics
+
+    manager = JobManager(server.traced_analysis, base_dir=workspace, max_parallel=concurrency,
+                         max_stored=len(queries))
+    metrics.reset()
+    start = time.perf_counter()
+    jobs = [manager.submit(query) for query in queries]
+    for job in jobs:
+        job.done.wait()
+    wall = time.perf_counter() - start
+    manager.shutdown()
+
+    spans = metrics.snapshot()["spans"]
+    succeeded = [job for job in jobs if job.status == "succeeded"]
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "succeeded": len(succeeded),
+        "failed": len(jobs) - len(succeeded),
+        "wall_seconds": wall,
+        "throughput_per_second": len(jobs) / wall if wall else None,
+        "job_seconds": percentiles([job.finished_at - job.started_at for job in jobs]),
+        "queue_seconds": percentiles([job.started_at - job.created_at for job in jobs]),
+        "stages_ms": {
+            name: {key: value for key, value in spans[name].items() if key != "buckets"}
+            for name in STAGES if name in spans
+        },
+        "errors": sorted({job.message.splitlines()[0][:200] for job in jobs if job.status != "succeeded"}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the financial analysis pipeline.")
+    parser.add_argument("--queries", type=int, default=30, help="Queries per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="Parallel jobs per run")
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds each stub crew task takes")
+    parser.add_argument("--years", type=int, default=10, help="Years of synthetic daily bars per ticker")
+    parser.add_argument("--pool-size", type=int, default=2, help="Executor worker processes (ANALYSIS_POOL_SIZE)")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed queries run first to warm the pool and data store")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory(prefix="bench_pipeline_")
+    # Set before the server is imported: the store, workspaces and worker processes read them
+    os.environ.update({
+        "MARKET_DATA_CSV_DIR": os.path.join(scratch.name, "csv"),
+        "MARKET_DATA_DB": os.path.join(scratch.name, "market_data.db"),
+        "ANALYSIS_WORKSPACE_DIR": os.path.join(scratch.name, "jobs"),
+        "PLAN_CACHE_PATH": "",
+        "ANALYSIS_POOL_SIZE": str(args.pool_size),
+    })
+    start = time.perf_counter()
+    write_market_data(os.environ["MARKET_DATA_CSV_DIR"], args.years, args.seed)
+    print(f"Synthetic market data ({len(COMPANIES)} tickers x {args.years}y) in {time.perf_counter() - start:.2f}s",
+          file=sys.stderr)
+
+    start = time.perf_counter()
+    import server
+    server.get_crew = lambda crew=StubCrew(args.llm_latency): crew
+    original_plan_query = server.plan_query
+    pool = server.get_pool()
+    import_seconds = time.perf_counter() - start
+
+    report = {
+        "config": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "cpu_count": os.cpu_count(),
+            "server_import_seconds": import_seconds,
+        },
+        "results": [],
+    }
+
+    queries = make_queries(args.queries, args.seed)
+    try:
+        configure_mode(server, "crew", original_plan_query)
+        for query in make_queries(args.warmup, args.seed + 1):
+            server.jobs.run(query)
+
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                configure_mode(server, mode, original_plan_query)
+                workspace = os.path.join(scratch.name, "jobs", f"{mode}_{concurrency}")
+                result = {"mode": mode, **run_level(server, queries, concurrency, workspace)}
+                stages = result["stages_ms"]
+                print(
+                    f"{mode} x{concurrency}: {result['throughput_per_second']:.2f} jobs/s, "
+                    f"job p50 {result['job_seconds']['p50']:.2f}s p95 {result['job_seconds']['p95']:.2f}s, "
+                    f"script p50 {stages.get('script_execution', {}).get('p50') or 0:.0f}ms, "
+                    f"{result['failed']} failed",
+                    file=sys.stderr
+                )
+                report["results"].append(result)
+    finally:
+        pool.shutdown()
+        scratch.cleanup()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
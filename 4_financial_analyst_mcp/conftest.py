@@ -0,0 +1,2 @@
+# test_finance.py and test_server_logic.py are manual scripts that call Gemini and Yahoo Finance
+collect_ignore = ["test_finance.py", "test_server_logic.py"]
@@ -0,0 +1,323 @@
+"""
+Pool of warm worker processes for running generated analysis scripts.
+
+Starting `python generated_stock_analysis.py` pays interpreter startup plus the pandas,
+matplotlib and yfinance imports on every request. The workers here import those modules
+once, select the Agg backend, and then run each submitted script in a fresh namespace with
+a per-job timeout, a memory limit and captured output. PNG plots the script saves are
+rendered in memory (see plotting.py) and returned with the result. A worker is replaced after a
+configurable number of jobs, after a timeout, or when it dies.
+"""
+import atexit
+import contextlib
+import importlib
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+
+WARM_MODULES = ("numpy", "pandas", "matplotlib", "matplotlib.pyplot", "yfinance", "market_data", "plotting")
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+POOL_SIZE = int(os.getenv("ANALYSIS_POOL_SIZE", "2"))
+MAX_JOBS_PER_WORKER = int(os.getenv("ANALYSIS_WORKER_MAX_JOBS", "20"))
+SCRIPT_TIMEOUT = float(os.getenv("ANALYSIS_SCRIPT_TIMEOUT", "120"))
+MEMORY_LIMIT_MB = int(os.getenv("ANALYSIS_WORKER_MEMORY_MB", "1024"))
+# A worker that fails to start (or to finish its imports) is retried this often, with backoff
+START_ATTEMPTS = 5
+START_TIMEOUT = 120.0
+START_BACKOFF_SECONDS = 1.0
+
+
+@dataclass
+class ScriptResult:
+    ok: bool
+    stdout: str = ""
+    stderr: str = ""
+    error: str = ""
+    duration: float = 0.0
+    timed_out: bool = False
+    # PNG bytes of the plots the script saved, by file name
+    images: dict = field(default_factory=dict)
+    # Part of `duration` spent downsampling and rendering those plots
+    render_seconds: float = 0.0
+
+
+# --- Worker side ---
+
+def _set_memory_limit(memory_limit_mb: int):
+    """Caps the address space at the worker's warm footprint plus memory_limit_mb (POSIX only)."""
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (ImportError, OSError, ValueError):
+        return
+    limit = current + memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_job(code: str, cwd: str, script_name: str) -> dict:
+    import matplotlib.pyplot as plt
+    from plotting import capture_savefig
+
+    images, render_stats = {}, {}
+    stdout, stderr = io.StringIO(), io.StringIO()
+    ok, error, recycle = True, "", False
+    start = time.perf_counter()
+    previous_cwd = os.getcwd()
+    sys.path.insert(0, cwd)
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), capture_savefig(images, render_stats):
+            exec(compile(code, os.path.join(cwd, script_name), "exec"), {"__name__": "__main__", "__file__": script_name})
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+        if not ok:
+            error = f"SystemExit: {e.code}"
+    except MemoryError:
+        ok, recycle = False, True
+        error = "MemoryError: the script exceeded the worker memory limit"
+    except BaseException:
+        ok = False
+        error = traceback.format_exc()
+    finally:
+        plt.close("all")
+        os.chdir(previous_cwd)
+        if cwd in sys.path:
+            sys.path.remove(cwd)
+
+    return {
+        "ok": ok,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "error": error,
+        "duration": time.perf_counter() - start,
+        "images": images,
+        "render_seconds": render_stats.get("render_seconds", 0.0),
+        "recycle": recycle,
+    }
+
+
+def _worker_main(conn, memory_limit_mb: int):
+    os.environ["MPLBACKEND"] = "Agg"
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    import matplotlib
+    matplotlib.use("Agg")
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    _set_memory_limit(memory_limit_mb)
+    conn.send("ready")
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        conn.send(_run_job(*job))
+
+
+# --- Pool side ---
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+
+    def stop(self, kill: bool = False):
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ScriptExecutorPool:
+    """
+    Runs scripts on `size` warm workers; at most `size` scripts run at once and further
+    submissions wait for a free worker.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_jobs_per_worker: int = MAX_JOBS_PER_WORKER,
+                 timeout: float = SCRIPT_TIMEOUT, memory_limit_mb: int = MEMORY_LIMIT_MB, start_method: str = None):
+        methods = multiprocessing.get_all_start_methods()
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in methods else "spawn"
+        self.ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a server that already imported the heavy modules
+            self.ctx.set_forkserver_preload(list(WARM_MODULES))
+
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._starting = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._start_worker()
+
+    def _spawn(self):
+        """Starts one worker process and waits for its imports; returns None if it does not come up."""
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(target=_worker_main, args=(child_conn, self.memory_limit_mb), daemon=True)
+        try:
+            process.start()
+        except OSError as e:
+            print(f"executor_pool: worker failed to start: {e}", file=sys.stderr)
+            return None
+        finally:
+            child_conn.close()
+        worker = _Worker(process, parent_conn)
+        try:
+            if parent_conn.poll(START_TIMEOUT):
+                parent_conn.recv()  # "ready"
+                return worker
+            print(f"executor_pool: worker not ready after {START_TIMEOUT:.0f}s", file=sys.stderr)
+        except (EOFError, OSError):
+            print("executor_pool: worker failed to start", file=sys.stderr)
+        worker.stop(kill=True)
+        return None
+
+    def _start_worker(self):
+        """
+        Starts a worker in the background; it joins the idle queue once its imports are done.
+        Failed starts are retried with backoff. When none of the pool's workers is alive or
+        starting any more, waiting runs are woken up so they fail at once (see run).
+        """
+        with self._lock:
+            self._starting += 1
+
+        def start():
+            worker = None
+            try:
+                for attempt in range(START_ATTEMPTS):
+                    if attempt:
+                        time.sleep(START_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                    if self._closed:
+                        return
+                    worker = self._spawn()
+                    if worker is not None:
+                        break
+                else:
+                    print(f"executor_pool: giving up on a worker after {START_ATTEMPTS} attempts", file=sys.stderr)
+                    return
+                with self._lock:
+                    if self._closed:
+                        worker.stop()
+                        return
+                    self._workers.add(worker)
+                self._idle.put(worker)
+            finally:
+                with self._lock:
+                    self._starting -= 1
+                    dead = not self._workers and not self._starting and not self._closed
+                if dead:
+                    self._idle.put(None)
+
+        threading.Thread(target=start, daemon=True).start()
+
+    def _revive(self) -> bool:
+        """Starts a full set of workers again if none is alive or starting; returns False if some are."""
+        with self._lock:
+            if self._workers or self._starting or self._closed:
+                return False
+        for _ in range(self.size):
+            self._start_worker()
+        return True
+
+    def _retire(self, worker: _Worker, kill: bool = False):
+        with self._lock:
+            self._workers.discard(worker)
+            closed = self._closed
+        # Stopping can take a moment; keep it off the caller's path
+        threading.Thread(target=worker.stop, kwargs={"kill": kill}, daemon=True).start()
+        if not closed:
+            self._start_worker()
+
+    def run(self, code: str, cwd: str = ".", timeout: float = None, script_name: str = "generated_stock_analysis.py") -> ScriptResult:
+        """Runs code as __main__ with cwd as working directory and returns its captured output."""
+        if self._closed:
+            raise RuntimeError("Executor pool is shut down")
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        while True:
+            try:
+                worker = self._idle.get(timeout=max(0.0, start + timeout - time.perf_counter()))
+            except queue.Empty:
+                return ScriptResult(ok=False, error=f"No executor worker became available within {timeout:.0f}s",
+                                    duration=time.perf_counter() - start, timed_out=True)
+            if worker is not None:
+                break
+            # Every worker failed to start: fail now instead of at the timeout, wake the other
+            # waiting runs, and start the workers again for later runs
+            if self._revive():
+                self._idle.put(None)
+                return ScriptResult(ok=False, error="No executor worker could be started; see the server log",
+                                    duration=time.perf_counter() - start)
+        start = time.perf_counter()
+        try:
+            worker.conn.send((code, os.path.abspath(cwd), script_name))
+            if not worker.conn.poll(timeout):
+                self._retire(worker, kill=True)
+                return ScriptResult(ok=False, error=f"Script timed out after {timeout:.0f}s",
+                                    duration=time.perf_counter() - start, timed_out=True)
+            result = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # The worker died mid-job (e.g. killed by the OS for exceeding memory)
+            self._retire(worker, kill=True)
+            return ScriptResult(ok=False, error=f"Worker process died: {e!r}", duration=time.perf_counter() - start)
+
+        worker.jobs += 1
+        if result.pop("recycle") or worker.jobs >= self.max_jobs_per_worker:
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+        return ScriptResult(**result)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ScriptExecutorPool:
+    """Process-wide pool, created on first use and configured from the ANALYSIS_* environment variables."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ScriptExecutorPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,302 @@
+"""
+Fast path for common stock queries.
+
+A lightweight extractor pulls tickers, period and analysis type out of the query, and a
+library of pre-written, parameterized scripts covers the usual requests ("show AAPL over
+6 months", "compare Google and Amazon this year"). The rendered scripts run on the warm
+executor pool like crew-generated code. Queries the templates cannot express return None
+from plan_query() and go to the crew.
+"""
+import re
+from string import Template
+
+COMPANY_TICKERS = {
+    "apple": "AAPL",
+    "microsoft": "MSFT",
+    "google": "GOOGL",
+    "alphabet": "GOOGL",
+    "amazon": "AMZN",
+    "meta": "META",
+    "facebook": "META",
+    "tesla": "TSLA",
+    "nvidia": "NVDA",
+    "netflix": "NFLX",
+    "ford": "F",
+    "general motors": "GM",
+    "ibm": "IBM",
+    "intel": "INTC",
+    "amd": "AMD",
+    "oracle": "ORCL",
+    "salesforce": "CRM",
+    "adobe": "ADBE",
+    "disney": "DIS",
+    "walmart": "WMT",
+    "coca-cola": "KO",
+    "coca cola": "KO",
+    "pepsi": "PEP",
+    "nike": "NKE",
+    "visa": "V",
+    "mastercard": "MA",
+    "jpmorgan": "JPM",
+    "goldman sachs": "GS",
+    "boeing": "BA",
+    "uber": "UBER",
+    "airbnb": "ABNB",
+    "paypal": "PYPL",
+    "shopify": "SHOP",
+    "spotify": "SPOT",
+    "mtn": "MTNOY",
+    "airtel": "AAF.L",
+}
+
+CALENDAR_WORDS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december", "monday", "tuesday", "wednesday", "thursday", "friday",
+}
+
+# All-caps words that are not tickers: currencies, exchanges, finance jargon and shouted words
+NOT_TICKERS = {
+    "I", "A", "AI", "US", "USA", "UK", "EU", "CEO", "CFO", "CTO", "ETF", "ETFS", "IPO", "EPS", "PE",
+    "YTD", "YOY", "QOQ", "VS", "THE", "AND", "OR", "OF", "TO", "IN", "ON", "MY", "ME", "IS", "IT",
+    "SMA", "EMA", "MA", "MTN", "USD", "EUR", "GBP", "JPY", "CNY", "CHF", "CAD", "AUD", "NGN", "ZAR",
+    "KES", "BTC", "ETH", "FX", "OHLC", "OHLCV", "NYSE", "LSE", "SEC", "GDP", "CPI", "ROI", "ROE",
+    "EBITDA", "DCF", "NAV", "APR", "APY", "ESG", "ATH", "API", "CSV", "PDF", "PNG", "FAQ", "OK",
+    "INC", "LLC", "LTD", "PLC", "BUY", "SELL", "HOLD", "HIGH", "LOW", "OPEN", "CLOSE", "PRICE",
+    "STOCK", "CHART", "PLOT", "SHOW", "DAY", "WEEK", "YEAR",
+}
+
+# Anything beyond plotting prices, returns, moving averages and volume goes to the crew
+UNSUPPORTED = re.compile(
+    r"predict|forecast|regression|correlat|volatil|rsi\b|macd|bollinger|portfolio|dividend|"
+    r"earning|p/e|pe ratio|sharpe|drawdown|option|candlestick|histogram|beta\b|backtest|"
+    r"revenue|profit|balance sheet|news|sentiment|why\b",
+    re.IGNORECASE
+)
+
+
+def extract_tickers(query: str):
+    tickers = []
+    # Explicit symbols: $AAPL, (MSFT), or bare all-caps words like TSLA
+    for match in re.finditer(r"\$([A-Za-z]{1,5})\b|\(([A-Z]{1,5}(?:\.[A-Z]{1,2})?)\)|\b([A-Z]{2,5})\b", query):
+        symbol = (match.group(1) or match.group(2) or match.group(3)).upper()
+        if symbol not in NOT_TICKERS and symbol not in tickers:
+            tickers.append(symbol)
+
+    lowered = query.lower()
+    matches = []
+    for name, symbol in COMPANY_TICKERS.items():
+        for match in re.finditer(rf"\b{re.escape(name)}\b", lowered):
+            matches.append((match.start(), symbol))
+    for _, symbol in sorted(matches):
+        if symbol not in tickers:
+            tickers.append(symbol)
+    return tickers
+
+
+def has_unknown_names(query: str) -> bool:
+    """True when the query mentions a capitalized name (mid-sentence) we cannot map to a ticker."""
+    known = {word for name in COMPANY_TICKERS for word in name.split()} | CALENDAR_WORDS
+    for match in re.finditer(r"\b[A-Z][a-z]+\b", query):
+        before = query[:match.start()].rstrip()
+        if not before or before[-1] in ".!?:":
+            continue
+        if match.group(0).lower() not in known:
+            return True
+    return False
+
+
+# Timeframes extract_period maps onto a yfinance period. "50 day" also covers moving-average windows.
+KNOWN_TIMEFRAMES = re.compile(
+    r"\b(?:ytd|year[- ]to[- ]date|this year|all[- ]time|max|since ipo|ever|today|(?:this|last|past) week|"
+    r"(?:the )?(?:last |past )?decade|\d+\s*-?\s*(?:day|week|month|year|yr|mo)s?|(?:last|past|this) month|"
+    r"a month|(?:last|past) quarter|(?:last|past) year)\b",
+    re.IGNORECASE
+)
+# Calendar dates and ranges ("in 2023", "since January", "from March to June", "3/15") that no
+# trailing yfinance period expresses
+CALENDAR_DATES = re.compile(
+    r"\b(?:19|20)\d{2}\b|\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b|"
+    r"\b(?:jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec)\.?(?=\s+\d|\s*$)|"
+    r"\b(?:" + "|".join(sorted(CALENDAR_WORDS)) + r")\b|"
+    r"\b(?:since|between|until|till|before|after)\b|\bfrom\b.+\b(?:to|through)\b",
+    re.IGNORECASE
+)
+# Time words left over once the known timeframes are removed: "the last two years", "Q3", "yesterday"
+TIME_WORDS = re.compile(
+    r"\b(?:days?|weeks?|months?|years?|yrs?|quarters?|decades?|yesterday|tomorrow|weekends?|q[1-4]|h[12]|fy\d*)\b",
+    re.IGNORECASE
+)
+
+
+def has_unresolved_time(query: str) -> bool:
+    """True when the query asks about a date, a range or a timeframe extract_period would not map exactly."""
+    remaining = KNOWN_TIMEFRAMES.sub(" ", query)
+    return bool(CALENDAR_DATES.search(remaining) or TIME_WORDS.search(remaining))
+
+
+def extract_period(query: str) -> str:
+    """Maps the timeframe in the query onto a yfinance period, defaulting to 1y like the crew."""
+    lowered = query.lower()
+    if re.search(r"\b(ytd|year to date|year-to-date|this year)\b", lowered):
+        return "ytd"
+    if re.search(r"\b(all[- ]time|max|since ipo|ever)\b", lowered):
+        return "max"
+    if re.search(r"\btoday\b", lowered):
+        return "1d"
+    if re.search(r"\b(this|last|past) week\b", lowered):
+        return "5d"
+    if re.search(r"\bdecade\b", lowered):
+        return "10y"
+
+    # "50 day moving average" is a window, not a timeframe
+    match = re.search(r"\b(\d+)\s*-?\s*(day|week|month|year|yr|mo)s?\b(?!\s*(?:moving|average|ma\b|sma\b|ema\b))", lowered)
+    if match:
+        n, unit = int(match.group(1)), match.group(2)
+        days = n * {"day": 1, "week": 7, "month": 30, "mo": 30, "year": 365, "yr": 365}[unit]
+        for period, limit in (("5d", 7), ("1mo", 31), ("3mo", 92), ("6mo", 183), ("1y", 366),
+                              ("2y", 731), ("5y", 1827), ("10y", 3653)):
+            if days <= limit:
+                return period
+        return "max"
+
+    if re.search(r"\b(last|past|this) month\b|\ba month\b", lowered):
+        return "1mo"
+    if re.search(r"\b(last|past) quarter\b", lowered):
+        return "3mo"
+    return "1y"
+
+
+def extract_analysis(query: str, tickers) -> str:
+    lowered = query.lower()
+    if re.search(r"moving average|\bsma\b|\bma\b|\d+[- ]day average", lowered):
+        return "moving_average"
+    if re.search(r"\bvolume\b", lowered):
+        return "volume"
+    if len(tickers) > 1 or re.search(r"\bcompare\b|\bvs\.?\b|\bversus\b|\breturns?\b", lowered):
+        return "compare"
+    return "price"
+
+
+def extract_intent(query: str):
+    """Returns {"tickers", "period", "analysis"} or None when the query needs the crew."""
+    if UNSUPPORTED.search(query) or has_unknown_names(query) or has_unresolved_time(query):
+        return None
+    tickers = extract_tickers(query)
+    if not tickers or len(tickers) > 6:
+        return None
+    return {
+        "tickers": tickers,
+        "period": extract_period(query),
+        "analysis": extract_analysis(query, tickers),
+    }
+
+
+# --- Templates ---
+
+_PREAMBLE = '''import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from market_data import load_close, load_history
+from plotting import downsample
+
+TICKERS = $tickers
+PERIOD = $period
+PLOT_PATH = $plot_path
+'''
+
+TEMPLATES = {
+    "price": _PREAMBLE + '''
+closes = load_close(TICKERS, period=PERIOD).dropna(how="all")
+
+fig, ax = plt.subplots(figsize=(12, 6))
+for ticker in TICKERS:
+    ax.plot(closes.index, closes[ticker], label=ticker)
+    series = closes[ticker].dropna()
+    change = (series.iloc[-1] / series.iloc[0] - 1) * 100
+    print(f"{ticker}: close {series.iloc[-1]:.2f}, {change:+.2f}% over {PERIOD}")
+ax.set_title(f"{', '.join(TICKERS)} Close Price ({PERIOD})")
+ax.set_xlabel("Date")
+ax.set_ylabel("Close Price")
+ax.legend()
+ax.grid(True, alpha=0.3)
+fig.tight_layout()
+fig.savefig(PLOT_PATH)
+plt.close(fig)
+print(f"Plot saved to {PLOT_PATH}")
+''',
+    "compare": _PREAMBLE + '''
+closes = load_close(TICKERS, period=PERIOD).dropna(how="all").ffill()
+returns = (closes / closes.bfill().iloc[0] - 1) * 100
+
+fig, ax = plt.subplots(figsize=(12, 6))
+for ticker in TICKERS:
+    ax.plot(returns.index, returns[ticker], label=ticker)
+    print(f"{ticker}: {returns[ticker].iloc[-1]:+.2f}% over {PERIOD}")
+ax.axhline(0, color="grey", linewidth=0.8)
+ax.set_title(f"Relative Performance: {' vs '.join(TICKERS)} ({PERIOD})")
+ax.set_xlabel("Date")
+ax.set_ylabel("Return (%)")
+ax.legend()
+ax.grid(True, alpha=0.3)
+fig.tight_layout()
+fig.savefig(PLOT_PATH)
+plt.close(fig)
+print(f"Plot saved to {PLOT_PATH}")
+''',
+    "moving_average": _PREAMBLE + '''
+fig, ax = plt.subplots(figsize=(12, 6))
+for ticker in TICKERS:
+    close = load_history(ticker, period=PERIOD)["Close"]
+    ax.plot(close.index, close, label=f"{ticker} Close")
+    for window in (50, 200):
+        if len(close) > window:
+            ax.plot(close.index, close.rolling(window).mean(), label=f"{ticker} {window}-day MA")
+    print(f"{ticker}: close {close.iloc[-1]:.2f}, 50-day MA {close.tail(50).mean():.2f}")
+ax.set_title(f"{', '.join(TICKERS)} Close Price and Moving Averages ({PERIOD})")
+ax.set_xlabel("Date")
+ax.set_ylabel("Price")
+ax.legend()
+ax.grid(True, alpha=0.3)
+fig.tight_layout()
+fig.savefig(PLOT_PATH)
+plt.close(fig)
+print(f"Plot saved to {PLOT_PATH}")
+''',
+    "volume": _PREAMBLE + '''
+fig, (price_ax, volume_ax) = plt.subplots(2, 1, figsize=(12, 8), sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+for ticker in TICKERS:
+    hist = load_history(ticker, period=PERIOD)
+    price_ax.plot(hist.index, hist["Close"], label=ticker)
+    # One bar per day does not scale to long periods; draw the min/max envelope instead
+    volume = downsample(hist["Volume"], method="minmax")
+    volume_ax.fill_between(volume.index, volume, step="mid", label=ticker, alpha=0.4)
+    print(f"{ticker}: average daily volume {hist['Volume'].mean():,.0f} over {PERIOD}")
+price_ax.set_title(f"{', '.join(TICKERS)} Price and Volume ({PERIOD})")
+price_ax.set_ylabel("Close Price")
+price_ax.legend()
+price_ax.grid(True, alpha=0.3)
+volume_ax.set_xlabel("Date")
+volume_ax.set_ylabel("Volume")
+fig.tight_layout()
+fig.savefig(PLOT_PATH)
+plt.close(fig)
+print(f"Plot saved to {PLOT_PATH}")
+''',
+}
+
+
+def render_template(intent, plot_path: str = "stock_plot.png") -> str:
+    return Template(TEMPLATES[intent["analysis"]]).substitute(
+        tickers=repr(intent["tickers"]),
+        period=repr(intent["period"]),
+        plot_path=repr(plot_path),
+    ).strip()
+
+
+def plan_query(query: str, plot_path: str = "stock_plot.png"):
+    """Returns (intent, code) for queries a template can answer, otherwise None."""
+    intent = extract_intent(query)
+    if intent is None:
+        return None
+    return intent, render_template(intent, plot_path)
+
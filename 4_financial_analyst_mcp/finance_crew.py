@@ -2,10 +2,19 @@ from crewai import Agent, Task, Crew, Process, LLM
 from crewai.tools import tool
 from pydantic import BaseModel, Field
 import os
+import sys
 import yfinance as yf
 import matplotlib.pyplot as plt
 import pandas as pd
 from dotenv import load_dotenv
+from market_data import load_history
+from analytics import analyze_tickers
+from plan_cache import PROMPT_VERSION
+import json
+
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.llm import wrap_crewai_llm
 
 load_dotenv()
 
@@ -13,10 +22,13 @@ load_dotenv()
 # CrewAI supports Gemini via the 'gemini' provider string or LLM class
 # We will use the LLM class for better control if needed, or just the string.
 # Using 'gemini/gemini-1.5-flash' is the standard way in newer CrewAI versions.
-my_llm = LLM(
+# Temperature 0 makes parsing and code generation repeatable, so the shared LLM layer
+# (mcp_shared/llm.py) can answer repeated prompts from its cache
+my_llm = wrap_crewai_llm(LLM(
     model="gemini/gemini-2.5-flash",
-    api_key=os.getenv("GOOGLE_API_KEY")
-)
+    api_key=os.getenv("GOOGLE_API_KEY"),
+    temperature=0
+), caller="finance_crew")
 
 # --- Tools ---
 
@@ -32,27 +44,53 @@ class StockAnalysisTools:
             A string summary of the dataframe head and description.
         """
         try:
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            return hist.to_string()
+            # Served from the local market-data store; only missing dates hit yfinance
+            hist = load_history(ticker, period=period)
+            if hist.empty:
+                return f"No data found for {ticker} ({period})."
+            return (
+                f"{ticker.upper()} {period}: {len(hist)} rows from {hist.index[0].date()} to {hist.index[-1].date()}\n\n"
+                f"Head:\n{hist.head().to_string()}\n\nTail:\n{hist.tail().to_string()}\n\n"
+                f"Summary:\n{hist.describe().to_string()}"
+            )
         except Exception as e:
             return f"Error fetching stock data: {e}"
 
+    @tool("Compare Stock Metrics")
+    def get_multi_ticker_summary(tickers: list[str], period: str = "1y"):
+        """
+        Computes returns, volatility, drawdowns, correlations and relative performance for several tickers at once.
+        Args:
+            tickers: The stock ticker symbols (e.g., ["AAPL", "MSFT"]).
+            period: The period to analyze (e.g., 1mo, 3mo, 1y, 5y, max).
+        Returns:
+            A compact JSON summary of the metrics.
+        """
+        try:
+            return json.dumps(analyze_tickers(tickers, period=period))
+        except Exception as e:
+            return f"Error computing stock metrics: {e}"
+
 # --- Agents ---
 
 class FinancialCrew:
+    """
+    Agents are built once per instance and reused for every query; tasks and the crew are per run.
+    An instance runs one query at a time (server.py keeps one per job thread).
+    """
+
     def __init__(self):
         self.llm = my_llm
 
-    def run(self, query: str):
         # 1. Query Parser Agent
         # Extracts structured intent from the user's natural language query.
-        parser_agent = Agent(
+        self.parser_agent = Agent(
             role='Senior Financial Data Analyst',
             goal='Accurately interpret user queries to extract stock tickers and analysis requirements.',
             backstory="""You are an expert at understanding financial requests. 
             You know exactly what data is needed to answer questions about stock trends, 
             comparisons, and performance.""",
+            tools=[StockAnalysisTools.get_multi_ticker_summary],
             verbose=True,
             allow_delegation=False,
             llm=self.llm
@@ -60,14 +98,17 @@ class FinancialCrew:
 
         # 2. Code Writer Agent
         # Writes Python code to analyze data and create plots.
-        writer_agent = Agent(
+        self.writer_agent = Agent(
             role='Python Financial Data Visualizer',
-            goal='Write executable Python code to fetch data using yfinance and plot it using matplotlib.',
+            goal='Write executable Python code to load stock data with the market_data helper and plot it using matplotlib.',
             backstory="""You are a Python expert specializing in financial data visualization.
             You write clean, error-free code. 
             IMPORTANT: You MUST write code that saves the plot to a file named 'stock_plot.png' in the current directory.
             Do not use plt.show(). Use plt.savefig('stock_plot.png').
-            You should use the 'yfinance' library to get data.""",
+            You get data from the local cache with `from market_data import load_history, load_close`:
+            load_history(ticker, period) returns the same DataFrame as yfinance's Ticker.history(period=period),
+            load_close([tickers], period) returns a DataFrame of Close prices with one column per ticker.
+            Do not download data with yfinance directly.""",
             verbose=True,
             allow_delegation=False,
             llm=self.llm
@@ -78,47 +119,69 @@ class FinancialCrew:
         # We will actually skip a separate executor agent for simplicity and have the writer output the code,
         # which the MCP server will then execute. 
         # HOWEVER, to follow the "Crew" structure, let's have an agent that reviews the code.
-        reviewer_agent = Agent(
+        self.reviewer_agent = Agent(
             role='Senior Code Reviewer',
             goal='Review the Python code to ensure it is safe, correct, and saves the plot as requested.',
             backstory="""You are a senior software engineer. You check code for errors and security issues.
-            You ensure the code uses yfinance and matplotlib correctly and saves the output to 'stock_plot.png'.""",
+            You ensure the code uses the market_data helper and matplotlib correctly and saves the output to 'stock_plot.png'.""",
             verbose=True,
             allow_delegation=False,
             llm=self.llm
         )
 
+    def run(self, query: str, progress=None):
+        """
+        Runs the crew. progress(stage, detail) is called as each task finishes, and with the
+        current stage for every agent step.
+        """
+        progress = progress or (lambda stage, detail="": None)
+        current = {"stage": "parsing"}
+
+        def task_done(stage, detail=""):
+            current["stage"] = stage
+            progress(stage, detail)
+
+        def step_done(step):
+            detail = getattr(step, "tool", None) or getattr(step, "thought", None) or type(step).__name__
+            progress(current["stage"], f"agent step: {str(detail).strip()[:80]}")
+
         # --- Tasks ---
 
         task1 = Task(
             description=f"""Analyze the following user query: '{query}'.
             Identify the stock ticker(s) and the timeframe mentioned.
             If no timeframe is mentioned, default to '1y'.
+            If the query asks about returns, volatility, drawdowns or how stocks compare, use the
+            Compare Stock Metrics tool and include its key numbers in your summary.
             Output a clear summary of what needs to be done.""",
-            agent=parser_agent,
-            expected_output="A summary of the stock ticker and timeframe to analyze."
+            agent=self.parser_agent,
+            expected_output="A summary of the stock ticker and timeframe to analyze.",
+            callback=lambda output: task_done("code_generation", "query parsed")
         )
 
         task2 = Task(
             description="""Based on the analysis, write a complete Python script.
             The script must:
-            1. Import yfinance, pandas, and matplotlib.pyplot.
-            2. Download the stock data for the identified ticker and timeframe.
+            1. Import pandas, matplotlib.pyplot, and `from market_data import load_history, load_close`.
+            2. Load the stock data for the identified ticker(s) and timeframe with load_history / load_close
+               (periods: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max).
             3. Plot the 'Close' price.
             4. Set the title and labels correctly.
             5. Save the plot to 'stock_plot.png'.
             6. Print 'Plot saved to stock_plot.png' at the end.
             
             Return ONLY the Python code block (markdown formatted).""",
-            agent=writer_agent,
-            expected_output="A Python script in a markdown code block."
+            agent=self.writer_agent,
+            expected_output="A Python script in a markdown code block.",
+            callback=lambda output: task_done("code_generated")
         )
 
         # Instantiate Crew
         crew = Crew(
-            agents=[parser_agent, writer_agent],
+            agents=[self.parser_agent, self.writer_agent],
             tasks=[task1, task2],
             verbose=True,
+            step_callback=step_done,
             process=Process.sequential
         )
 
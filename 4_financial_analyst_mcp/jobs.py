@@ -0,0 +1,141 @@
+"""
+Bounded scheduler for analysis jobs.
+
+Every job gets its own workspace directory, so concurrent analyses never overwrite each
+other's generated script or plot. At most `max_parallel` jobs run at once; the rest wait
+in the queue. Each job records its status, the pipeline stage it is in and a timeline of
+progress events, which the MCP tools and the web app poll.
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORKSPACE_DIR = os.getenv("ANALYSIS_WORKSPACE_DIR", os.path.join(PROJECT_DIR, "analysis_jobs"))
+MAX_PARALLEL_JOBS = int(os.getenv("ANALYSIS_MAX_PARALLEL_JOBS", "4"))
+# Finished jobs (and their workspaces) kept around for artifact downloads
+MAX_STORED_JOBS = int(os.getenv("ANALYSIS_MAX_STORED_JOBS", "100"))
+
+
+@dataclass
+class AnalysisJob:
+    id: str
+    query: str
+    workspace: str
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    stage: str = "queued"
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    message: str = ""
+    result: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def progress(self, stage: str, detail: str = ""):
+        self.stage = stage
+        self.events.append({"time": time.time(), "stage": stage, "detail": detail})
+
+    def artifacts(self) -> Dict[str, str]:
+        """Files produced in the job's workspace, by name."""
+        if not os.path.isdir(self.workspace):
+            return {}
+        return {name: os.path.join(self.workspace, name) for name in sorted(os.listdir(self.workspace))}
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "query": self.query,
+            "status": self.status,
+            "stage": self.stage,
+            "events": [
+                {"elapsed": round(event["time"] - self.created_at, 3), "stage": event["stage"], "detail": event["detail"]}
+                for event in self.events
+            ],
+            "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+            "run_seconds": round(end - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobManager:
+    """
+    Runs `runner(query, workspace, progress)` for each submitted job on a bounded thread pool.
+    The runner returns a dict with at least "ok" and "message".
+    """
+
+    def __init__(self, runner: Callable[..., Dict[str, Any]], base_dir: str = WORKSPACE_DIR,
+                 max_parallel: int = MAX_PARALLEL_JOBS, max_stored: int = MAX_STORED_JOBS):
+        self.runner = runner
+        self.base_dir = base_dir
+        self.max_stored = max_stored
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="analysis-job")
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, query: str) -> AnalysisJob:
+        job_id = uuid.uuid4().hex[:12]
+        workspace = os.path.join(self.base_dir, job_id)
+        os.makedirs(workspace, exist_ok=True)
+        job = AnalysisJob(id=job_id, query=query, workspace=workspace)
+        job.progress("queued")
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[AnalysisJob]:
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def run(self, query: str, timeout: float = None) -> AnalysisJob:
+        """Submits a job and blocks until it finishes."""
+        job = self.submit(query)
+        job.done.wait(timeout)
+        return job
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting jobs; with `wait`, blocks until the queued and running ones have finished."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: AnalysisJob):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = self.runner(job.query, job.workspace, job.progress) or {}
+            job.message = job.result.get("message", "")
+            job.status = "succeeded" if job.result.get("ok") else "failed"
+        except Exception as e:
+            print(f"Job {job.id} crashed: {e}", file=sys.stderr)
+            job.message = f"An error occurred during analysis: {str(e)}"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.progress("finished", job.status)
+            job.done.set()
+
+    def _evict_finished(self):
+        # Called with the lock held: drop the oldest finished jobs beyond max_stored
+        excess = len(self._jobs) - self.max_stored
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(0, excess)]:
+            job = self._jobs.pop(job_id)
+            shutil.rmtree(job.workspace, ignore_errors=True)
@@ -0,0 +1,394 @@
+"""
+Local, incrementally updated OHLCV store for yfinance history.
+
+Bars are kept in SQLite keyed by (ticker, interval, timestamp); daily and longer bars by
+(ticker, interval, exchange-local date). A request only downloads
+the date range that is not stored yet; any `period` is then served by slicing locally.
+
+Generated analysis scripts should read data through the helper API instead of calling
+yfinance directly:
+
+    from market_data import load_history, load_close
+    hist = load_history("AAPL", period="6mo")        # same columns as yf.Ticker.history()
+    closes = load_close(["GOOGL", "AMZN"], period="1y")
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+# Calendar days covered by each yfinance period string
+PERIOD_DAYS = {
+    "1d": 9, "5d": 17, "1wk": 7, "1mo": 31, "3mo": 92, "6mo": 183,
+    "1y": 366, "2y": 731, "5y": 1827, "10y": 3653,
+}
+# yfinance counts these periods in trading sessions, not calendar days: their PERIOD_DAYS window
+# spans weekends and holidays, and the last sessions stored in it are returned
+SESSION_PERIODS = {"1d": 1, "5d": 5}
+# Intervals with at most one bar per trading day: their bars are keyed by exchange-local date,
+# because yf.download returns them tz-naive and Ticker.history at midnight in the exchange's zone
+DAILY_INTERVALS = ("1d", "5d", "1wk", "1mo", "3mo")
+# "max" is requested from this date; the provider simply returns the oldest bars it has
+EARLIEST_DATE = date(1900, 1, 1)
+
+DEFAULT_DB_PATH = os.getenv(
+    "MARKET_DATA_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_data.db")
+)
+# Bars for the current day are re-fetched at most this often
+REFRESH_SECONDS = int(os.getenv("MARKET_DATA_REFRESH_SECONDS", "900"))
+
+
+def period_start(period: str, today: date = None) -> date:
+    today = today or date.today()
+    period = period.lower()
+    if period == "max":
+        return EARLIEST_DATE
+    if period == "ytd":
+        return date(today.year, 1, 1)
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period '{period}'. Use one of: {', '.join([*PERIOD_DAYS, 'ytd', 'max'])}")
+    return today - timedelta(days=PERIOD_DAYS[period])
+
+
+# --- Providers ---
+
+class YFinanceProvider:
+    """Downloads bars from Yahoo Finance."""
+
+    def fetch(self, ticker: str, start: date, end: date, interval: str = "1d") -> pd.DataFrame:
+        import yfinance as yf
+
+        # yfinance treats `end` as exclusive
+        return yf.Ticker(ticker).history(start=start, end=end + timedelta(days=1), interval=interval)
+
+    def fetch_many(self, tickers, start: date, end: date, interval: str = "1d"):
+        """One bulk yf.download() for several tickers; returns {ticker: DataFrame}."""
+        import yfinance as yf
+
+        data = yf.download(
+            list(tickers), start=start, end=end + timedelta(days=1), interval=interval,
+            group_by="ticker", actions=True, auto_adjust=True, threads=True, progress=False
+        )
+        if not isinstance(data.columns, pd.MultiIndex):
+            frames = {tickers[0]: data}
+        else:
+            available = set(data.columns.get_level_values(0))
+            frames = {ticker: data[ticker].dropna(how="all") for ticker in tickers if ticker in available}
+        for ticker, frame in frames.items():
+            if not frame.empty and frame.index.tz is None:
+                # Put the bars in the exchange's zone, as Ticker.history returns them
+                tz = self._exchange_tz(ticker)
+                if tz:
+                    frame.index = frame.index.tz_localize(tz, ambiguous=False, nonexistent="shift_forward")
+        return frames
+
+    @staticmethod
+    def _exchange_tz(ticker: str):
+        import yfinance as yf
+
+        try:
+            # yfinance caches time zones on disk, so this rarely costs a request
+            return yf.Ticker(ticker).fast_info["timezone"]
+        except Exception:
+            return None
+
+
+class CSVProvider:
+    """
+    Local stand-in for offline use and tests: reads <directory>/<TICKER>.csv files with a
+    Date column and the usual OHLCV columns (e.g. saved with yf.Ticker(...).history().to_csv()).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, ticker: str, start: date, end: date, interval: str = "1d") -> pd.DataFrame:
+        path = os.path.join(self.directory, f"{ticker.upper()}.csv")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True)
+        days = df.index.date
+        return df[(days >= start) & (days <= end)]
+
+
+# --- Store ---
+
+class MarketDataStore:
+    def __init__(self, path: str = DEFAULT_DB_PATH, provider=None):
+        self.path = path
+        self.provider = provider or YFinanceProvider()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS bars (
+                ticker TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                day TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL,
+                volume REAL, dividends REAL, splits REAL,
+                PRIMARY KEY (ticker, interval, ts)
+            );
+            CREATE INDEX IF NOT EXISTS bars_by_day ON bars (ticker, interval, day);
+            CREATE TABLE IF NOT EXISTS coverage (
+                ticker TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                start_day TEXT NOT NULL,
+                end_day TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                tz TEXT,
+                PRIMARY KEY (ticker, interval)
+            );
+        """)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Earlier versions keyed daily bars by timestamp, so a bulk (tz-naive) and a single
+            # (tz-aware) download of the same day were stored twice; merge them under their day
+            conn.execute(
+                f"UPDATE OR REPLACE bars SET ts = day WHERE ts != day AND interval IN ({', '.join('?' * len(DAILY_INTERVALS))})",
+                DAILY_INTERVALS
+            )
+            conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _coverage(self, conn, ticker: str, interval: str):
+        row = conn.execute(
+            "SELECT start_day, end_day, fetched_at, tz FROM coverage WHERE ticker = ? AND interval = ?",
+            (ticker, interval)
+        ).fetchone()
+        if row is None:
+            return None
+        return date.fromisoformat(row[0]), date.fromisoformat(row[1]), row[2], row[3]
+
+    def _missing_ranges(self, coverage, start: date, end: date, today: date):
+        if coverage is None:
+            return [(start, end)]
+        covered_start, covered_end, fetched_at, _ = coverage
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start - timedelta(days=1)))
+        if end > covered_end:
+            # Re-fetch the last covered day too, its bar may have been partial
+            ranges.append((covered_end, end))
+        elif end >= today and time.time() - fetched_at > REFRESH_SECONDS:
+            ranges.append((covered_end, end))
+        return ranges
+
+    @staticmethod
+    def _has_trading_days(start: date, end: date) -> bool:
+        return len(pd.bdate_range(start, end)) > 0
+
+    def _store_bars(self, conn, ticker: str, interval: str, df: pd.DataFrame):
+        if df is None or df.empty:
+            return None
+        df = df.reindex(columns=COLUMNS, fill_value=0.0)
+        daily = interval in DAILY_INTERVALS
+        rows = [
+            (ticker, interval, ts.date().isoformat() if daily else ts.isoformat(), ts.date().isoformat(),
+             *[float(v) for v in values])
+            for ts, values in zip(df.index, df[COLUMNS].itertuples(index=False, name=None))
+        ]
+        conn.executemany(
+            "INSERT OR REPLACE INTO bars (ticker, interval, ts, day, open, high, low, close, volume, dividends, splits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return str(df.index.tz) if getattr(df.index, "tz", None) is not None else None
+
+    def _fetch(self, tickers, start: date, end: date, interval: str):
+        """Fetches one date range for several tickers, in a single bulk request when the provider supports it."""
+        print(f"market_data: fetching {', '.join(tickers)} {interval} {start}..{end}", file=sys.stderr)
+        if len(tickers) > 1 and hasattr(self.provider, "fetch_many"):
+            return self.provider.fetch_many(tickers, start, end, interval)
+        return {ticker: self.provider.fetch(ticker, start, end, interval) for ticker in tickers}
+
+    def ensure_many(self, tickers, start: date, end: date, interval: str = "1d") -> int:
+        """
+        Downloads whatever part of [start, end] is not stored yet for each ticker.
+        Tickers missing the same range are fetched together. Returns the number of remote fetches.
+        Raises ValueError for a ticker that has nothing stored and whose fetch returned no bars.
+        """
+        tickers = sorted({ticker.upper() for ticker in tickers})
+        today = date.today()
+        end = min(end, today)
+        # Sorted acquisition order, so overlapping bulk requests cannot deadlock
+        locks = [self._lock_for((ticker, interval)) for ticker in tickers]
+        for lock in locks:
+            lock.acquire()
+        try:
+            conn = self._connect()
+            try:
+                coverages = {ticker: self._coverage(conn, ticker, interval) for ticker in tickers}
+                groups = {}
+                for ticker in tickers:
+                    for missing in self._missing_ranges(coverages[ticker], start, end, today):
+                        groups.setdefault(missing, []).append(ticker)
+
+                timezones = {ticker: coverage[3] if coverage else None for ticker, coverage in coverages.items()}
+                # Ranges that came back with bars. A failed fetch (an exception, or a ticker left out
+                # of a bulk answer) is never recorded as covered, and neither is an empty answer for
+                # a ticker with nothing stored (unknown, or the provider is unavailable)
+                received = {}
+                # Ranges that have no bars for a stored ticker: weekends, holidays, dates before its
+                # first bar. Recorded as covered, so they are not asked for again
+                answered = {}
+                fetches = 0
+                for (fetch_start, fetch_end), group in groups.items():
+                    if not self._has_trading_days(fetch_start, fetch_end):
+                        for ticker in group:
+                            if coverages[ticker] is not None:
+                                answered.setdefault(ticker, []).append((fetch_start, fetch_end))
+                        continue
+                    fetches += 1
+                    try:
+                        frames = self._fetch(group, fetch_start, fetch_end, interval)
+                    except Exception as e:
+                        print(f"market_data: fetching {', '.join(group)} failed: {e}", file=sys.stderr)
+                        continue
+                    for ticker in group:
+                        df = frames.get(ticker)
+                        if df is None:
+                            continue
+                        if df.empty:
+                            if coverages[ticker] is not None:
+                                answered.setdefault(ticker, []).append((fetch_start, fetch_end))
+                            continue
+                        timezones[ticker] = self._store_bars(conn, ticker, interval, df) or timezones[ticker]
+                        received.setdefault(ticker, []).append((fetch_start, fetch_end))
+
+                for ticker in set(received) | set(answered):
+                    ranges = received.get(ticker, []) + answered.get(ticker, [])
+                    # Missing ranges border the covered one, so the union stays contiguous
+                    coverage = coverages[ticker]
+                    covered_start = min([start for start, _ in ranges] + ([coverage[0]] if coverage else []))
+                    covered_end = max([end for _, end in ranges] + ([coverage[1]] if coverage else []))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO coverage (ticker, interval, start_day, end_day, fetched_at, tz) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (ticker, interval, covered_start.isoformat(), covered_end.isoformat(), time.time(), timezones[ticker])
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        failed = [ticker for ticker in tickers if coverages[ticker] is None and ticker not in received]
+        if failed:
+            raise ValueError(f"No {interval} data returned for {', '.join(failed)} between {start} and {end}: "
+                             f"unknown ticker or data provider unavailable.")
+        empty = sorted({ticker for group in groups.values() for ticker in group}
+                       - set(received) - set(answered) - set(failed))
+        if empty:
+            print(f"market_data: no answer for {', '.join(empty)}; will ask again next time", file=sys.stderr)
+        return fetches
+
+    def ensure(self, ticker: str, start: date, end: date, interval: str = "1d") -> int:
+        """Downloads whatever part of [start, end] is not stored yet. Returns the number of remote fetches."""
+        return self.ensure_many([ticker], start, end, interval)
+
+    def _read(self, conn, ticker: str, interval: str, start: date, end: date) -> pd.DataFrame:
+        df = pd.read_sql_query(
+            "SELECT ts, open, high, low, close, volume, dividends, splits FROM bars "
+            "WHERE ticker = ? AND interval = ? AND day >= ? AND day <= ? ORDER BY ts",
+            conn,
+            params=(ticker, interval, start.isoformat(), end.isoformat())
+        )
+        coverage = self._coverage(conn, ticker, interval)
+
+        tz = coverage[3] if coverage else None
+        if interval in DAILY_INTERVALS:
+            # Stored by exchange-local date: midnight in the exchange's zone, like Ticker.history
+            index = pd.to_datetime(df.pop("ts"))
+            if tz:
+                index = index.dt.tz_localize(tz, ambiguous=False, nonexistent="shift_forward")
+        else:
+            index = pd.to_datetime(df.pop("ts"), utc=True)
+            if tz:
+                index = index.dt.tz_convert(tz)
+        df.index = pd.DatetimeIndex(index, name="Date")
+        df.columns = COLUMNS
+        return df
+
+    def get_histories(self, tickers, period: str = "1y", interval: str = "1d", start: date = None, end: date = None):
+        """Like get_history for several tickers at once; returns {TICKER: DataFrame}."""
+        tickers = [ticker.upper() for ticker in tickers]
+        sessions = SESSION_PERIODS.get(period.lower()) if start is None else None
+        end = end or date.today()
+        start = start or period_start(period, end)
+        self.ensure_many(tickers, start, end, interval)
+
+        conn = self._connect()
+        try:
+            histories = {ticker: self._read(conn, ticker, interval, start, end) for ticker in tickers}
+        finally:
+            conn.close()
+        if sessions:
+            for ticker, df in histories.items():
+                days = pd.Index(df.index.date)
+                histories[ticker] = df[days.isin(days.unique()[-sessions:])]
+        return histories
+
+    def get_history(self, ticker: str, period: str = "1y", interval: str = "1d", start: date = None, end: date = None) -> pd.DataFrame:
+        """
+        Returns OHLCV bars shaped like yf.Ticker(ticker).history(period=period, interval=interval).
+        Only missing dates are downloaded; everything else is served from the local store.
+        """
+        return self.get_histories([ticker], period, interval, start, end)[ticker.upper()]
+
+
+# --- Helper API for generated code ---
+
+_default_store = None
+_default_store_guard = threading.Lock()
+
+
+def get_store() -> MarketDataStore:
+    global _default_store
+    with _default_store_guard:
+        if _default_store is None:
+            csv_dir = os.getenv("MARKET_DATA_CSV_DIR")
+            provider = CSVProvider(csv_dir) if csv_dir else None
+            _default_store = MarketDataStore(provider=provider)
+        return _default_store
+
+
+def set_store(store: MarketDataStore):
+    """Replaces the process-wide store, e.g. with one backed by a local stand-in provider."""
+    global _default_store
+    with _default_store_guard:
+        _default_store = store
+
+
+def load_history(ticker: str, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
+    return get_store().get_history(ticker, period=period, interval=interval)
+
+
+def load_close(tickers, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
+    """Close prices of one or more tickers as a DataFrame with one column per ticker."""
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    histories = get_store().get_histories(tickers, period=period, interval=interval)
+    return pd.DataFrame({ticker: hist["Close"] for ticker, hist in histories.items()})
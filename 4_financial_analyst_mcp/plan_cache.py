@@ -0,0 +1,291 @@
+"""
+Cache of crew-generated scripts, keyed by the shape of the query.
+
+Most scripts the crew writes differ only in ticker and period. Once a crew script has run
+successfully, its ticker and period string literals are turned into placeholders. The
+template is stored under the query's skeleton: the query with its tickers, company names,
+timeframe and filler words removed (so "Show Apple volatility against gold" keeps
+"against gold volatility"), plus the number of tickers. A later query with the same skeleton
+gets the template back with its own tickers and period filled in, and the parser and writer
+LLM calls are skipped.
+
+Rendered scripts are validated before use: they must compile and must not mention the
+original tickers, company names or period anywhere else. A script that fails at execution
+time invalidates its entry (see server.py), and a new PROMPT_VERSION drops them all.
+"""
+import ast
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from fast_path import COMPANY_TICKERS, UNSUPPORTED, extract_analysis, extract_period, extract_tickers, has_unknown_names
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CACHE_PATH = os.getenv("PLAN_CACHE_PATH", os.path.join(PROJECT_DIR, "plan_cache.json"))
+MAX_PLANS = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "500"))
+
+# Bump when the agent prompts in finance_crew.py (or the plan key) change: cached crew scripts from
+# other versions are dropped.
+# Kept here rather than in finance_crew.py so the server can load the cache without importing crewai
+PROMPT_VERSION = "3"
+
+TICKER_PLACEHOLDER = "__PLAN_TICKER_{}__"
+PERIOD_PLACEHOLDER = "__PLAN_PERIOD__"
+
+# "over 2 years", "for the last 6 months": numbers that set the period, not an analysis parameter
+PERIOD_NUMBER = re.compile(
+    r"\b(?:over|for|in|during|past|last|of)\s+(?:the\s+)?(?:last\s+|past\s+)?(\d+)\s*-?\s*(?:day|week|month|year|yr|mo)s?\b",
+    re.IGNORECASE
+)
+# Timeframes without a number: "over the last year", "this month", "year to date"
+PERIOD_PHRASE = re.compile(
+    r"\b(?:ytd|year[- ]to[- ]date|all[- ]time|since ipo|today|(?:this|last|past|previous)\s+"
+    r"(?:week|month|quarter|year|decade))\b",
+    re.IGNORECASE
+)
+# Words that do not change what the script has to do
+FILLER_WORDS = {
+    "a", "an", "the", "of", "for", "over", "in", "on", "at", "and", "to", "with", "by", "from", "as",
+    "show", "me", "us", "plot", "chart", "graph", "display", "draw", "give", "get", "see", "visualize",
+    "please", "can", "could", "you", "i", "my", "want", "would", "like", "what", "how", "is", "was",
+    "did", "do", "does", "s", "stock", "stocks", "share", "shares", "price", "prices", "company",
+    "companies", "its", "their", "it", "last", "past",
+}
+
+
+def query_skeleton(query: str, tickers) -> str:
+    """The query's content words without its tickers, company names, timeframe and filler words."""
+    for ticker in tickers:
+        query = re.sub(rf"\$?(?<![\w.]){re.escape(ticker)}(?![\w.])", " ", query)
+    lowered = query.lower()
+    for name in sorted(COMPANY_TICKERS, key=len, reverse=True):
+        lowered = re.sub(rf"\b{re.escape(name)}\b", " ", lowered)
+    lowered = PERIOD_PHRASE.sub(" ", PERIOD_NUMBER.sub(" ", lowered))
+    words = {word for word in re.findall(r"[a-z0-9]+(?:\.[0-9]+)?", lowered) if word not in FILLER_WORDS}
+    return " ".join(sorted(words))
+
+
+def intent_for(query: str):
+    """
+    Returns {"tickers", "period", "analysis", "skeleton"} for a query the crew would handle, or None
+    when the query cannot be mapped reliably (no ticker found, or a name we cannot resolve).
+    """
+    if has_unknown_names(query):
+        return None
+    tickers = extract_tickers(query)
+    if not tickers:
+        return None
+
+    keywords = sorted({match.lower() for match in UNSUPPORTED.findall(query)})
+    period_spans = [match.span(1) for match in PERIOD_NUMBER.finditer(query)]
+    numbers = [
+        match.group(0) for match in re.finditer(r"\b\d+(?:\.\d+)?\b", query)
+        if not any(start <= match.start() < end for start, end in period_spans)
+    ]
+    analysis = "+".join([extract_analysis(query, tickers), *keywords, *(f"n{number}" for number in numbers)])
+    # "30-day volatility for the last 6 months": the phrase after "for" is the period, not the window
+    period_phrase = PERIOD_NUMBER.search(query)
+    period = extract_period(period_phrase.group(0) if period_phrase else query)
+    return {"tickers": tickers, "period": period, "analysis": analysis, "skeleton": query_skeleton(query, tickers)}
+
+
+def _string_literals(code: str):
+    """(start, end, value) character offsets of every plain string literal outside f-strings."""
+    tree = ast.parse(code)
+    in_fstring = {id(node) for joined in ast.walk(tree) if isinstance(joined, ast.JoinedStr)
+                  for node in ast.walk(joined)}
+    lines = code.splitlines(keepends=True)
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    def offset(lineno, col_offset):
+        # ast offsets are UTF-8 byte offsets within the line
+        line = lines[lineno - 1]
+        return line_starts[lineno - 1] + len(line.encode("utf-8")[:col_offset].decode("utf-8"))
+
+    literals = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in in_fstring:
+            literals.append((offset(node.lineno, node.col_offset), offset(node.end_lineno, node.end_col_offset), node.value))
+    return literals
+
+
+def _mentions(code: str, tickers, period: str = None) -> bool:
+    """True when the code mentions any of the tickers, their company names or the period."""
+    names = [name for name, symbol in COMPANY_TICKERS.items() if symbol in tickers]
+    if any(re.search(rf"(?<![\w.]){re.escape(ticker)}(?![\w.])", code) for ticker in tickers):
+        return True
+    if any(re.search(rf"\b{re.escape(name)}\b", code, re.IGNORECASE) for name in names):
+        return True
+    return period is not None and re.search(rf"(?<![\w.]){re.escape(period)}(?![\w.])", code) is not None
+
+
+def make_template(code: str, intent):
+    """
+    Replaces the intent's ticker and period literals in code with placeholders.
+    Returns (template, period_parameterized) or None when the script cannot be reused safely.
+    """
+    try:
+        literals = _string_literals(code)
+    except SyntaxError:
+        return None
+    tickers = [ticker.upper() for ticker in intent["tickers"]]
+    replacements = []
+    found = set()
+    period_found = False
+    for start, end, value in literals:
+        if value.upper() in tickers:
+            index = tickers.index(value.upper())
+            replacements.append((start, end, TICKER_PLACEHOLDER.format(index)))
+            found.add(index)
+        elif value == intent["period"]:
+            replacements.append((start, end, PERIOD_PLACEHOLDER))
+            period_found = True
+    if len(found) != len(tickers):
+        return None
+
+    template = code
+    for start, end, placeholder in sorted(replacements, reverse=True):
+        template = template[:start] + placeholder + template[end:]
+    # Anything left (titles, comments, f-strings) would describe the wrong stock after substitution
+    if _mentions(template, tickers, intent["period"] if period_found else None):
+        return None
+    return template, period_found
+
+
+def render_plan(template: str, intent) -> str:
+    code = template.replace(PERIOD_PLACEHOLDER, repr(intent["period"]))
+    for index, ticker in enumerate(intent["tickers"]):
+        code = code.replace(TICKER_PLACEHOLDER.format(index), repr(ticker))
+    return code
+
+
+class PlanCache:
+    """
+    Thread-safe template store persisted as JSON. `version` identifies the prompts the
+    templates were generated with; entries from another version are dropped on load.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, version: str = "1", max_entries: int = MAX_PLANS):
+        self.path = path
+        self.version = str(version)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._plans = {}
+        self.metrics = {"hits": 0, "misses": 0, "stored": 0, "rejected": 0, "invalid": 0, "invalidated": 0}
+        self._load()
+
+    @staticmethod
+    def key(intent, period_parameterized: bool = True) -> str:
+        key = f"{intent['skeleton']}|{len(intent['tickers'])}"
+        return key if period_parameterized else f"{key}|{intent['period']}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"plan_cache: ignoring unreadable {self.path}: {e}", file=sys.stderr)
+            return
+        if data.get("version") == self.version:
+            self._plans = data.get("plans", {})
+
+    def _save(self):
+        # Called with the lock held
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.version, "plans": self._plans}, f)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, query: str):
+        """Returns (intent, code) with the query's tickers and period filled in, or None."""
+        intent = intent_for(query)
+        with self._lock:
+            plan = None
+            if intent is not None:
+                plan = self._plans.get(self.key(intent)) or self._plans.get(self.key(intent, False))
+            if plan is None:
+                self.metrics["misses"] += 1
+                return None
+
+            code = render_plan(plan["template"], intent)
+            original = [ticker for ticker in plan["tickers"] if ticker not in intent["tickers"]]
+            try:
+                compile(code, "<plan>", "exec")
+                valid = not _mentions(code, original)
+            except SyntaxError:
+                valid = False
+            if not valid:
+                self.metrics["invalid"] += 1
+                self.metrics["misses"] += 1
+                return None
+
+            plan["hits"] += 1
+            plan["last_used"] = time.time()
+            self.metrics["hits"] += 1
+            return intent, code
+
+    def store(self, query: str, code: str) -> bool:
+        """Caches a script that ran successfully for the query. Returns False if it cannot be reused."""
+        intent = intent_for(query)
+        template = make_template(code, intent) if intent is not None else None
+        with self._lock:
+            if template is None:
+                self.metrics["rejected"] += 1
+                return False
+            template, period_parameterized = template
+            self._plans[self.key(intent, period_parameterized)] = {
+                "template": template,
+                "analysis": intent["analysis"],
+                "skeleton": intent["skeleton"],
+                "tickers": intent["tickers"],
+                "period": intent["period"],
+                "query": query,
+                "created_at": time.time(),
+                "last_used": time.time(),
+                "hits": 0,
+            }
+            if len(self._plans) > self.max_entries:
+                oldest = min(self._plans, key=lambda key: self._plans[key]["last_used"])
+                del self._plans[oldest]
+            self.metrics["stored"] += 1
+            self._save()
+            return True
+
+    def invalidate(self, intent=None, analysis: str = None) -> int:
+        """
+        Drops the plan used for `intent`, every plan of an analysis type, or (with no arguments)
+        everything. Returns the number of plans removed.
+        """
+        with self._lock:
+            if intent is not None:
+                keys = [key for key in (self.key(intent), self.key(intent, False)) if key in self._plans]
+            elif analysis:
+                keys = [key for key, plan in self._plans.items() if plan["analysis"] == analysis]
+            else:
+                keys = list(self._plans)
+            for key in keys:
+                del self._plans[key]
+            self.metrics["invalidated"] += len(keys)
+            if keys:
+                self._save()
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else None,
+                "plans": len(self._plans),
+                "version": self.version,
+            }
@@ -0,0 +1,154 @@
+"""
+In-memory plot rendering with downsampling.
+
+A line with more points than the axes has pixels cannot show them all. Drawing them anyway
+makes rendering time grow with history length. Before rendering, dense lines are reduced to
+about two points per horizontal pixel with LTTB (largest triangle three buckets) or min/max
+bucketing. The figure is then rendered with Agg into a PNG in memory.
+
+Generated scripts keep calling `plt.savefig("stock_plot.png")`. While `capture_savefig()` is
+active, PNG saves are rendered in memory and collected by file name; nothing is written to disk:
+
+    with capture_savefig() as images:
+        exec(code)
+    png = images["stock_plot.png"]
+"""
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+# Points kept per horizontal pixel of the axes
+POINTS_PER_PIXEL = 2
+# Used when no figure is given, e.g. a 12 inch wide figure at 100 dpi
+DEFAULT_MAX_POINTS = 2400
+
+_original_savefig = Figure.savefig
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the n_out points chosen by Largest-Triangle-Three-Buckets (first and last are kept)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 buckets over the interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of n_out / 2 buckets, in order."""
+    n = len(y)
+    buckets = n_out // 2
+    if buckets < 1 or n_out >= n:
+        return np.arange(n)
+    starts = np.linspace(0, n, buckets + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    position = np.arange(n)
+    # Smallest position in each bucket where y equals the bucket's min (resp. max)
+    is_low = y == np.minimum.reduceat(y, starts)[bucket]
+    is_high = y == np.maximum.reduceat(y, starts)[bucket]
+    first_low = np.minimum.reduceat(np.where(is_low, position, n), starts)
+    first_high = np.minimum.reduceat(np.where(is_high, position, n), starts)
+    return np.unique(np.concatenate([[0, n - 1], first_low, first_high]))
+
+
+def _indices(x, y, n_out: int, method: str) -> np.ndarray:
+    if method == "lttb":
+        return lttb_indices(x, y, n_out)
+    if method == "minmax":
+        return minmax_indices(y, n_out)
+    raise ValueError(f"Unknown downsampling method '{method}'. Use 'lttb' or 'minmax'.")
+
+
+def downsample(series: pd.Series, max_points: int = DEFAULT_MAX_POINTS, method: str = "lttb") -> pd.Series:
+    """Reduces a Series to at most about max_points points, keeping its visual shape."""
+    series = series.dropna()
+    if len(series) <= max_points:
+        return series
+    x = np.arange(len(series), dtype=float)
+    if isinstance(series.index, pd.DatetimeIndex):
+        x = series.index.asi8.astype(float)
+    return series.iloc[_indices(x, series.to_numpy(dtype=float), max_points, method)]
+
+
+def downsample_figure(fig: Figure, method: str = "lttb") -> int:
+    """
+    Downsamples every dense, x-sorted line of the figure to its axes' pixel width.
+    Returns the number of points removed.
+    """
+    removed = 0
+    for ax in fig.axes:
+        max_points = max(int(ax.bbox.width * POINTS_PER_PIXEL), 3)
+        for line in ax.get_lines():
+            if not isinstance(line, Line2D) or line.get_linestyle() in ("None", "", " "):
+                continue
+            xy = line.get_xydata()
+            if len(xy) <= max_points:
+                continue
+            x, y = xy[:, 0], xy[:, 1]
+            finite = np.isfinite(x) & np.isfinite(y)
+            x, y = x[finite], y[finite]
+            if len(x) <= max_points or np.any(np.diff(x) < 0):
+                continue
+            keep = _indices(x, y, max_points, method)
+            line.set_data(x[keep], y[keep])
+            removed += len(xy) - len(keep)
+    return removed
+
+
+def render_png(fig: Figure, method: str = "lttb", **savefig_kwargs) -> bytes:
+    """Downsamples the figure and renders it with Agg into PNG bytes."""
+    downsample_figure(fig, method)
+    buffer = io.BytesIO()
+    savefig_kwargs.pop("format", None)
+    _original_savefig(fig, buffer, format="png", **savefig_kwargs)
+    return buffer.getvalue()
+
+
+@contextlib.contextmanager
+def capture_savefig(images: dict = None, stats: dict = None):
+    """
+    Within the block, savefig() to a .png path renders into `images[file name]` instead of the
+    file. The time spent rendering is added to stats["render_seconds"].
+    """
+    images = {} if images is None else images
+    stats = {} if stats is None else stats
+    stats.setdefault("render_seconds", 0.0)
+
+    def savefig(fig, fname, *args, **kwargs):
+        if isinstance(fname, (str, os.PathLike)) and not args:
+            name = os.path.basename(os.fspath(fname))
+            fmt = (kwargs.get("format") or os.path.splitext(name)[1].lstrip(".") or "png").lower()
+            if fmt == "png":
+                started = time.perf_counter()
+                images[name] = render_png(fig, **kwargs)
+                stats["render_seconds"] += time.perf_counter() - started
+                return None
+        return _original_savefig(fig, fname, *args, **kwargs)
+
+    Figure.savefig = savefig
+    try:
+        yield images
+    finally:
+        Figure.savefig = _original_savefig
@@ -1,133 +1,339 @@
+import anyio
 from fastmcp import FastMCP
-from finance_crew import FinancialCrew
+from fastmcp.utilities.types import Image
+from fast_path import plan_query
+from executor_pool import get_pool
+from jobs import JobManager
+from analytics import analyze_tickers
+from plan_cache import PlanCache, PROMPT_VERSION
 import os
 import sys
 import re
-import subprocess
+import json
+import threading
+import time
 
-# Initialize MCP Server
-mcp = FastMCP("MCP FINANCIAL ANALYST")
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.instrumentation import instrument, record_span, span
 
-import google.generativeai as genai
-import urllib.parse
+# Initialize MCP Server (every tool call is timed; see get_server_metrics and /metrics)
+mcp = instrument(FastMCP("MCP FINANCIAL ANALYST"))
 
-# Configure Gemini directly for the story generation
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Agents are reused across queries; each job thread has its own crew so concurrent jobs never share one
+_crews = threading.local()
 
-def generate_story(query: str) -> tuple[str, str]:
-    """
-    Generates a simple story explanation and an image prompt.
-    Returns: (story_text, image_prompt)
-    """
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    prompt = f"""
-    You are a wise African storyteller.
-    Explain the financial concept or stock trend related to: "{query}"
-    
-    Target Audience: A 12-year-old African child.
-    Analogy: Use a village market, farming, or trading analogy (e.g., yams, cattle, rain).
-    Tone: Inspiring, educational, simple, and warm.
-    Length: Under 150 words.
-    
-    Also, provide a short, vivid image prompt that represents this story visually.
-    
-    Output Format:
-    STORY: [The story text]
-    IMAGE_PROMPT: [The image prompt]
-    """
-    
-    try:
-        response = model.generate_content(prompt)
-        text = response.text
-        
-        # Parse output
-        story = ""
-        image_prompt = ""
+def get_crew():
+    if not hasattr(_crews, "crew"):
+        # Imported on first use: crewai and yfinance are only needed once a query reaches the crew
+        from finance_crew import FinancialCrew
+        _crews.crew = FinancialCrew()
+    return _crews.crew
+
+def __getattr__(name):
+    # Story generation (and its cache) lives in stories.py; server.generate_story is re-exported
+    # for existing callers, imported on access so the server starts without google.generativeai
+    if name == "generate_story":
+        from stories import generate_story
+        return generate_story
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Crew scripts that ran successfully, reused with new tickers/period for queries of the same kind
+plan_cache = PlanCache(version=PROMPT_VERSION)
+
+def execute_script(code: str, workspace: str, progress) -> dict:
+    """Saves the script into the job workspace, runs it there and reports the plot it produced."""
+    # 3. Save the code to a file
+    script_path = os.path.join(workspace, "generated_stock_analysis.py")
+    with open(script_path, "w") as f:
+        f.write(code)
         
-        if "STORY:" in text:
-            parts = text.split("IMAGE_PROMPT:")
-            story = parts[0].replace("STORY:", "").strip()
-            if len(parts) > 1:
-                image_prompt = parts[1].strip()
-        else:
-            story = text
-            image_prompt = f"African village market learning finance {query}"
-            
-        return story, image_prompt
-    except Exception as e:
-        return f"Could not generate story: {e}", ""
+    print(f"Code saved to {script_path}. Executing...", file=sys.stderr)
+    progress("executing")
+    
+    # 4. Execute the code
+    # Security Warning: This executes generated code directly. 
+    # In a production environment, this MUST be sandboxed (Docker, etc.).
+    # Runs on a warm worker process (pandas/matplotlib/yfinance already imported, Agg backend)
+    # with a timeout and memory limit, and with the job workspace as working directory
+    with span("script_execution") as record:
+        execution = get_pool().run(code, cwd=workspace, script_name=os.path.basename(script_path))
+        record["attributes"].update(ok=execution.ok, images=len(execution.images))
+        if execution.images:
+            # Rendering happens inside the worker, as part of the script's run time
+            record_span("plotting", duration_ms=execution.render_seconds * 1000)
+    if not execution.ok:
+        return {
+            "ok": False,
+            "code": code,
+            "message": f"Error executing generated code:\n{execution.stderr}{execution.error}\n\nCode:\n{code}",
+        }
 
-def run_analysis(query: str) -> str:
+    # Plots are rendered in memory by the worker; fall back to a file the script wrote some other way
+    images = dict(execution.images)
+    plot_name = "stock_plot.png"
+    disk_path = os.path.join(workspace, plot_name)
+    if plot_name not in images and os.path.exists(disk_path):
+        with open(disk_path, "rb") as f:
+            images[plot_name] = f.read()
+    if plot_name not in images:
+        return {
+            "ok": False,
+            "code": code,
+            "message": "The code executed successfully but 'stock_plot.png' was not found. Please check the generated code.",
+        }
+
+    progress("plotting", f"{plot_name} rendered ({len(images[plot_name]) // 1024} KB)")
+    output = execution.stdout.strip()
+    return {
+        "ok": True,
+        "code": code,
+        "plot": plot_name,
+        "images": images,
+        "output": output,
+        "message": f"Success! Analysis complete. The plot '{plot_name}' was rendered ({len(images[plot_name]) // 1024} KB).\n\n"
+                   + (f"{output}\n\n" if output else "")
+                   + f"Generated Code:\n```python\n{code}\n```",
+    }
+
+def plot_png(job, name: str = None):
+    """PNG bytes of a finished job's plot (its main plot unless another image name is given), or None."""
+    return job.result.get("images", {}).get(name or job.result.get("plot"))
+
+def analyze_query(query: str, workspace: str = ".", progress=None) -> dict:
     """
-    Core logic to analyze stock and plot.
+    Core logic to analyze stock and plot, writing every file into `workspace`.
+    Returns a dict with "ok", "message" and, on success, "code", "plot" (image name),
+    "images" (PNG bytes by name) and "output".
     """
+    progress = progress or (lambda stage, detail="": None)
     try:
         print(f"Received query: {query}", file=sys.stderr)
         
+        # 0. Fast path: common queries are answered by a pre-written template without the crew
+        progress("planning")
+        with span("fast_path"):
+            plan = plan_query(query)
+        if plan:
+            intent, code = plan
+            print(f"Fast path: {intent}", file=sys.stderr)
+            progress("fast_path", f"{intent['analysis']} {', '.join(intent['tickers'])} {intent['period']}")
+            result = execute_script(code, workspace, progress)
+            if result["ok"]:
+                return result
+            print(f"Fast path failed, falling back to the crew:\n{result['message']}", file=sys.stderr)
+        
+        # 0b. Plan cache: a crew script that already worked for this kind of query
+        with span("plan_cache_lookup"):
+            cached = plan_cache.lookup(query)
+        if cached:
+            intent, code = cached
+            print(f"Plan cache hit: {intent}", file=sys.stderr)
+            progress("plan_cache", f"{intent['analysis']} {', '.join(intent['tickers'])} {intent['period']}")
+            result = execute_script(code, workspace, progress)
+            if result["ok"]:
+                return result
+            # The cached script no longer works for this query; drop it and let the crew write a new one
+            plan_cache.invalidate(intent)
+            print(f"Cached plan failed, falling back to the crew:\n{result['message']}", file=sys.stderr)
+        
         # 1. Run the Crew to get the Python code
-        crew = FinancialCrew()
-        result = crew.run(query)
+        progress("parsing")
+        stage_started = time.perf_counter()
+
+        def crew_progress(stage, detail=""):
+            # The crew reports its task boundaries through progress; time each task from them
+            nonlocal stage_started
+            if stage == "code_generation":
+                record_span("crew_parse", stage_started)
+                stage_started = time.perf_counter()
+            elif stage == "code_generated":
+                record_span("codegen", stage_started)
+            progress(stage, detail)
+
+        with span("crew"):
+            result = get_crew().run(query, progress=crew_progress)
         
         # CrewAI returns a CrewOutput object, we need the string
         result_str = str(result)
         
         print("Crew execution finished. Extracting code...", file=sys.stderr)
+        progress("extracting_code")
         
         # 2. Extract Python code from the result
-        # Look for markdown code blocks
-        code_match = re.search(r"```python(.*?)```", result_str, re.DOTALL)
-        if not code_match:
-            # Try looking for just ``` if python isn't specified
-            code_match = re.search(r"```(.*?)```", result_str, re.DOTALL)
+        with span("code_extraction"):
+            # Look for markdown code blocks
+            code_match = re.search(r"```python(.*?)```", result_str, re.DOTALL)
+            if not code_match:
+                # Try looking for just ``` if python isn't specified
+                code_match = re.search(r"```(.*?)```", result_str, re.DOTALL)
             
         if code_match:
             code = code_match.group(1).strip()
         else:
             # If no code block, assume the whole output might be code (risky, but fallback)
             # or return error
-            return f"Error: Could not extract Python code from agent output:\n{result_str}"
+            return {"ok": False, "message": f"Error: Could not extract Python code from agent output:\n{result_str}"}
 
-        # 3. Save the code to a file
-        script_path = "generated_stock_analysis.py"
-        with open(script_path, "w") as f:
-            f.write(code)
-            
-        print(f"Code saved to {script_path}. Executing...", file=sys.stderr)
-        
-        # 4. Execute the code
-        # Security Warning: This executes generated code directly. 
-        # In a production environment, this MUST be sandboxed (Docker, etc.).
-        try:
-            # Run the script using the current python interpreter
-            subprocess.run([sys.executable, script_path], check=True, capture_output=True, text=True)
-            
-            # Check if plot exists
-            if os.path.exists("stock_plot.png"):
-                return f"Success! Analysis complete. The plot has been saved to 'stock_plot.png' in the server directory.\n\nGenerated Code:\n```python\n{code}\n```"
-            else:
-                return "The code executed successfully but 'stock_plot.png' was not found. Please check the generated code."
-                
-        except subprocess.CalledProcessError as e:
-            return f"Error executing generated code:\n{e.stderr}\n\nCode:\n{code}"
+        result = execute_script(code, workspace, progress)
+        if result["ok"]:
+            plan_cache.store(query, code)
+        return result
 
     except Exception as e:
-        return f"An error occurred during analysis: {str(e)}"
+        return {"ok": False, "message": f"An error occurred during analysis: {str(e)}"}
+
+def traced_analysis(query: str, workspace: str = ".", progress=None) -> dict:
+    """analyze_query as one trace: jobs run on their own threads, outside the tool call's span."""
+    with span("analysis", job=os.path.basename(os.path.abspath(workspace))) as record:
+        result = analyze_query(query, workspace, progress)
+        record["attributes"]["ok"] = result.get("ok")
+        return result
+
+# Every analysis runs as a job in its own workspace; ANALYSIS_MAX_PARALLEL_JOBS run at once
+jobs = JobManager(traced_analysis)
+
+def run_analysis(query: str) -> str:
+    """
+    Runs one analysis job and waits for it. Returns the status message.
+    """
+    return jobs.run(query).message
+
+# Tools that wait on an analysis or on market data are async and wait on a worker thread:
+# FastMCP runs sync tools on the event loop, which would stall every other call meanwhile
 
 @mcp.tool()
-def analyze_stock_and_plot(query: str) -> str:
+async def analyze_stock_and_plot(query: str) -> list[str | Image]:
     """
     Analyzes a stock based on a natural language query, generates Python code to visualize it,
-    executes the code, and saves the plot.
+    executes the code, and returns the plot.
     
     Args:
         query: The user's question, e.g., "Show me Apple's stock trend for the last 6 months."
         
     Returns:
-        A status message indicating success or failure, and the path to the generated plot.
+        A status message indicating success or failure, and the plot as a PNG image.
+    """
+    job = jobs.submit(query)
+    await anyio.to_thread.run_sync(job.done.wait)
+    png = plot_png(job)
+    if png is None:
+        return [job.message]
+    return [job.message, Image(data=png, format="png")]
+
+@mcp.tool()
+async def compare_stock_metrics(tickers: list[str], period: str = "1y") -> str:
+    """
+    Computes key metrics for one or more stocks in a single call, without generating code:
+    total and annualized return, annualized and 20-day volatility, Sharpe ratio, max and current drawdown,
+    best/worst day, return correlations and performance relative to the group.
+    
+    Args:
+        tickers: Stock ticker symbols, e.g. ["AAPL", "MSFT", "GOOGL"].
+        period: 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd or max.
+        
+    Returns:
+        A compact JSON summary of the metrics.
+    """
+    try:
+        with span("compute_metrics", tickers=len(tickers)):
+            summary = await anyio.to_thread.run_sync(lambda: analyze_tickers(tickers, period=period))
+        return json.dumps(summary, indent=2)
+    except Exception as e:
+        return f"Error computing stock metrics: {str(e)}"
+
+@mcp.tool()
+def get_plan_cache_stats() -> str:
+    """
+    Reports how often analyses reused a cached crew script instead of calling the agents:
+    hits, misses, stored, rejected (not reusable), invalid and invalidated plans, and the hit rate.
+    
+    Returns:
+        The plan cache metrics as JSON.
+    """
+    return json.dumps(plan_cache.stats(), indent=2)
+
+@mcp.tool()
+def submit_stock_analysis(query: str) -> str:
+    """
+    Starts a stock analysis in the background and returns immediately with a job ID.
+    Use get_stock_analysis_status to follow its progress and get_stock_analysis_artifacts for the results.
+    
+    Args:
+        query: The user's question, e.g., "Compare Tesla and Ford over 2 years."
+        
+    Returns:
+        The job ID and its initial status as JSON.
+    """
+    job = jobs.submit(query)
+    return json.dumps(job.to_dict(), indent=2)
+
+@mcp.tool()
+def get_stock_analysis_status(job_id: str) -> str:
+    """
+    Reports the status (queued, running, succeeded, failed), current stage and progress events of an analysis job.
+    
+    Args:
+        job_id: The ID returned by submit_stock_analysis.
+        
+    Returns:
+        The job status as JSON.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return f"Error: No analysis job with ID {job_id}."
+    return json.dumps(job.to_dict(), indent=2)
+
+@mcp.tool()
+def get_stock_analysis_artifacts(job_id: str) -> str:
+    """
+    Returns the results of a finished analysis job: the status message, the generated code, the names of its
+    plots (fetch them with get_stock_analysis_plot) and the paths of its files.
+    
+    Args:
+        job_id: The ID returned by submit_stock_analysis.
+        
+    Returns:
+        The job results as JSON, or its status if it has not finished yet.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return f"Error: No analysis job with ID {job_id}."
+    if not job.finished:
+        return json.dumps(job.to_dict(), indent=2)
+    return json.dumps({
+        **job.to_dict(),
+        "message": job.message,
+        "code": job.result.get("code"),
+        "plot": job.result.get("plot"),
+        "images": sorted(job.result.get("images", {})),
+        "artifacts": job.artifacts(),
+    }, indent=2)
+
+@mcp.tool()
+def get_stock_analysis_plot(job_id: str, name: str = "") -> list[str | Image]:
+    """
+    Returns a plot of a finished analysis job as a PNG image.
+    
+    Args:
+        job_id: The ID returned by submit_stock_analysis.
+        name: The image name from get_stock_analysis_artifacts; defaults to the main plot.
+        
+    Returns:
+        The plot image, or an error message.
     """
-    return run_analysis(query)
+    job = jobs.get(job_id)
+    if job is None:
+        return [f"Error: No analysis job with ID {job_id}."]
+    if not job.finished:
+        return [f"Error: Analysis job {job_id} is still {job.status}."]
+    png = plot_png(job, name or None)
+    if png is None:
+        return [f"Error: Analysis job {job_id} has no plot named '{name or job.result.get('plot')}'."]
+    return [Image(data=png, format="png")]
 
 if __name__ == "__main__":
     print("Starting Financial Analyst MCP Server...", file=sys.stderr)
+    # Start the executor workers now so the first analysis does not pay for their imports
+    get_pool()
     mcp.run()
@@ -0,0 +1,204 @@
+"""
+Village stories: generation, streaming and a TTL cache.
+
+The web app starts a story as soon as a query is submitted, in parallel with the analysis,
+so it is usually ready by the time the analysis is. Stories are cached by normalized query
+for STORY_CACHE_TTL_SECONDS, and can be read chunk by chunk while Gemini is still writing them.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+import google.generativeai as genai
+
+# Shared MCP helpers (mcp_shared/) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcp_shared.llm import shared_llm
+
+STORY_MODEL = "gemini-2.5-flash"
+STORY_TTL_SECONDS = float(os.getenv("STORY_CACHE_TTL_SECONDS", "3600"))
+MAX_CACHED_STORIES = int(os.getenv("STORY_CACHE_MAX_ENTRIES", "256"))
+
+STORY_MARKER = "STORY:"
+IMAGE_PROMPT_MARKER = "IMAGE_PROMPT:"
+
+# Configure Gemini directly for the story generation
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+def story_prompt(query: str) -> str:
+    return f"""
+    You are a wise African storyteller.
+    Explain the financial concept or stock trend related to: "{query}"
+
+    Target Audience: A 12-year-old African child.
+    Analogy: Use a village market, farming, or trading analogy (e.g., yams, cattle, rain).
+    Tone: Inspiring, educational, simple, and warm.
+    Length: Under 150 words.
+
+    Also, provide a short, vivid image prompt that represents this story visually.
+
+    Output Format:
+    STORY: [The story text]
+    IMAGE_PROMPT: [The image prompt]
+    """
+
+
+def parse_story(text: str, query: str) -> tuple[str, str]:
+    """Splits the model output into (story_text, image_prompt)."""
+    if STORY_MARKER in text:
+        parts = text.split(IMAGE_PROMPT_MARKER)
+        story = parts[0].replace(STORY_MARKER, "").strip()
+        image_prompt = parts[1].strip() if len(parts) > 1 else ""
+        return story, image_prompt
+    return text, f"African village market learning finance {query}"
+
+
+def story_section(text: str, final: bool = False) -> str:
+    """
+    The story part of possibly incomplete model output. Until the output is final, the tail
+    that could be the start of the IMAGE_PROMPT marker is held back.
+    """
+    start = text.find(STORY_MARKER)
+    body = text[start + len(STORY_MARKER):] if start >= 0 else text
+    end = body.find(IMAGE_PROMPT_MARKER)
+    if end >= 0:
+        body = body[:end]
+    elif not final:
+        body = body[:max(0, len(body) - len(IMAGE_PROMPT_MARKER))]
+    return body.lstrip()
+
+
+def stream_story_text(query: str):
+    """Yields the raw model output for the story prompt as it is generated."""
+    model = genai.GenerativeModel(STORY_MODEL)
+    # Scheduled, retried and counted by the shared LLM layer; StoryCache already dedups by query
+    # closing(): a reader that stops early frees the LLM slot at once instead of on garbage collection
+    with closing(shared_llm.stream("stories", model.generate_content, story_prompt(query), stream=True)) as chunks:
+        for chunk in chunks:
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+def generate_story(query: str) -> tuple[str, str]:
+    """
+    Generates a simple story explanation and an image prompt.
+    Returns: (story_text, image_prompt)
+    """
+    try:
+        return parse_story("".join(stream_story_text(query)), query)
+    except Exception as e:
+        return f"Could not generate story: {e}", ""
+
+
+def normalize_query(query: str) -> str:
+    """Cache key: case, whitespace and trailing punctuation do not change the story."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!.").strip().lower()
+
+
+class StoryEntry:
+    """A story that is being generated or is finished; readers can follow it while it is written."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.created_at = time.time()
+        self.text = ""
+        self.error = None
+        self.finished = False
+        self._changed = threading.Condition()
+
+    def append(self, chunk: str):
+        with self._changed:
+            self.text += chunk
+            self._changed.notify_all()
+
+    def finish(self, error: Exception = None):
+        with self._changed:
+            self.error = error
+            self.finished = True
+            self._changed.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self.finished, timeout)
+
+    def result(self) -> tuple[str, str]:
+        """(story_text, image_prompt) once finished, like generate_story()."""
+        self.wait()
+        if self.error is not None:
+            return f"Could not generate story: {self.error}", ""
+        return parse_story(self.text, self.query)
+
+    def _visible(self) -> str:
+        # Output that ignores the format is only shown once it is complete, like parse_story() does
+        if STORY_MARKER not in self.text:
+            return self.text if self.finished else ""
+        return story_section(self.text, final=self.finished)
+
+    def stream(self):
+        """Yields the story text in chunks as they arrive, until generation finishes."""
+        sent = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self.finished or len(self._visible()) > sent)
+                visible, finished, error = self._visible(), self.finished, self.error
+            if error is not None:
+                if not sent:
+                    yield f"Could not generate story: {error}"
+                return
+            if len(visible) > sent:
+                yield visible[sent:]
+                sent = len(visible)
+            if finished:
+                return
+
+
+class StoryCache:
+    """
+    Starts each story once per normalized query and keeps it for `ttl` seconds.
+    Failed stories are dropped, so the next request tries again.
+    """
+
+    def __init__(self, stream_text=stream_story_text, ttl: float = STORY_TTL_SECONDS,
+                 max_entries: int = MAX_CACHED_STORIES):
+        self.stream_text = stream_text
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, StoryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> StoryEntry:
+        """Returns the cached or in-progress story for the query, starting it if needed."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created_at < self.ttl:
+                self._entries.move_to_end(key)
+                return entry
+            entry = StoryEntry(query)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        threading.Thread(target=self._generate, args=(key, entry), daemon=True).start()
+        return entry
+
+    def _generate(self, key: str, entry: StoryEntry):
+        try:
+            with closing(self.stream_text(entry.query)) as chunks:
+                for chunk in chunks:
+                    entry.append(chunk)
+            entry.finish()
+        except Exception as e:
+            print(f"Story generation failed for '{entry.query}': {e}", file=sys.stderr)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.finish(e)
+
+
+story_cache = StoryCache()
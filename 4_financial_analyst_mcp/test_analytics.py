@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from analytics import compute_summary
+
+
+def test_short_and_flat_series_give_valid_json():
+    index = pd.bdate_range("2024-01-01", periods=10)
+    closes = pd.DataFrame({"UP": np.linspace(100, 110, 10), "FLAT": 50.0}, index=index)
+    summary = compute_summary(closes)
+    json.dumps(summary, allow_nan=False)
+
+    up, flat = summary["tickers"]["UP"], summary["tickers"]["FLAT"]
+    assert up["total_return_pct"] == 10.0
+    # Ten days are not annualized, and the 20-day window has too few rows
+    assert up["annualized_return_pct"] is None
+    assert up["volatility_20d_pct"] is None
+    assert flat["sharpe_ratio"] is None
+    assert summary["return_correlation"]["UP"]["FLAT"] is None
+
+
+def test_year_of_prices_is_annualized():
+    index = pd.bdate_range("2023-01-02", periods=252)
+    closes = pd.DataFrame({"A": 100 * np.exp(np.linspace(0, np.log(1.21), 252))}, index=index)
+    ticker = compute_summary(closes)["tickers"]["A"]
+    assert ticker["total_return_pct"] == 21.0
+    assert 20 < ticker["annualized_return_pct"] < 22
+    assert ticker["volatility_20d_pct"] is not None
+
+
+def test_unknown_ticker_is_reported_as_missing(tmp_path, monkeypatch):
+    import market_data
+    from analytics import analyze_tickers
+
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=300, tz="America/New_York", name="Date")
+    frame = pd.DataFrame({column: np.linspace(100, 120, len(index)) for column in market_data.COLUMNS}, index=index)
+    frame.to_csv(tmp_path / "AAPL.csv")
+    store = market_data.MarketDataStore(str(tmp_path / "bars.db"), provider=market_data.CSVProvider(str(tmp_path)))
+    monkeypatch.setattr(market_data, "_default_store", store)
+
+    summary = analyze_tickers(["AAPL", "NOSUCH"], period="6mo")
+    assert summary["missing_tickers"] == ["NOSUCH"]
+    assert list(summary["tickers"]) == ["AAPL"]
+    assert "error" in analyze_tickers(["NOSUCH"], period="6mo")
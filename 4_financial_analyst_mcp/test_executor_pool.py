@@ -0,0 +1,29 @@
+import time
+
+import executor_pool
+from executor_pool import ScriptExecutorPool
+
+
+class BrokenPool(ScriptExecutorPool):
+    """Workers that never come up, e.g. a missing interpreter or an import error."""
+
+    def __init__(self, **kwargs):
+        self.spawned = 0
+        super().__init__(**kwargs)
+
+    def _spawn(self):
+        self.spawned += 1
+        return None
+
+
+def test_run_fails_fast_when_no_worker_can_start(monkeypatch):
+    monkeypatch.setattr(executor_pool, "START_BACKOFF_SECONDS", 0.01)
+    pool = BrokenPool(size=2, start_method="spawn")
+    started = time.perf_counter()
+    result = pool.run("print('hi')", timeout=30)
+    assert not result.ok and not result.timed_out
+    assert "could be started" in result.error
+    assert time.perf_counter() - started < 5
+    # Each worker was retried before the pool gave up on it
+    assert pool.spawned >= 2 * executor_pool.START_ATTEMPTS
+    pool.shutdown()
@@ -0,0 +1,35 @@
+import pytest
+
+from fast_path import extract_tickers, plan_query
+
+
+@pytest.mark.parametrize("query", [
+    "How did Tesla do in 2023?",
+    "Show AAPL since January",
+    "What was AAPL high in March?",
+    "Show AAPL from March to June",
+    "Plot Apple between 3/1 and 6/30",
+    "Show Apple over the last two years",
+    "How did AAPL do in Q3?",
+])
+def test_calendar_dates_and_unparsed_timeframes_go_to_the_crew(query):
+    assert plan_query(query) is None
+
+
+@pytest.mark.parametrize("query, period", [
+    ("Show AAPL over 6 months", "6mo"),
+    ("Compare Google and Amazon this year", "ytd"),
+    ("Plot Apple for the past week", "5d"),
+    ("Show Apple stock over the past year", "1y"),
+    ("Show MSFT with the 50-day moving average", "1y"),
+])
+def test_supported_timeframes_use_the_fast_path(query, period):
+    intent, _ = plan_query(query)
+    assert intent["period"] == period
+
+
+def test_all_caps_words_that_are_not_tickers_are_ignored():
+    assert extract_tickers("Plot the stock price of Apple in USD") == ["AAPL"]
+    assert extract_tickers("Plot OHLC for AAPL") == ["AAPL"]
+    intent, _ = plan_query("Plot the stock price of Apple in USD")
+    assert intent["tickers"] == ["AAPL"] and intent["analysis"] == "price"
@@ -0,0 +1,169 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from market_data import COLUMNS, CSVProvider, MarketDataStore
+
+
+def write_csv(directory, ticker, days=800):
+    index = pd.bdate_range(end=pd.Timestamp(date.today()), periods=days, tz="America/New_York", name="Date")
+    close = 100 + np.cumsum(np.random.default_rng(len(ticker)).normal(0, 1, len(index)))
+    frame = pd.DataFrame({column: close for column in COLUMNS}, index=index)
+    frame["Volume"] = 1000.0
+    frame["Dividends"] = frame["Stock Splits"] = 0.0
+    frame.to_csv(directory / f"{ticker}.csv")
+    return frame
+
+
+class CountingProvider(CSVProvider):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.calls = []
+
+    def fetch(self, ticker, start, end, interval="1d"):
+        self.calls.append((ticker, start, end))
+        return super().fetch(ticker, start, end, interval)
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    directory = tmp_path / "csv"
+    directory.mkdir()
+    return directory
+
+
+def make_store(tmp_path, csv_dir):
+    provider = CountingProvider(str(csv_dir))
+    return MarketDataStore(str(tmp_path / "bars.db"), provider=provider), provider
+
+
+def test_second_request_is_served_locally(tmp_path, csv_dir):
+    source = write_csv(csv_dir, "AAPL")
+    store, provider = make_store(tmp_path, csv_dir)
+
+    first = store.get_history("AAPL", period="6mo")
+    assert len(provider.calls) == 1
+    second = store.get_history("aapl", period="3mo")
+    assert len(provider.calls) == 1
+    assert len(second) < len(first)
+    assert second["Close"].iloc[-1] == pytest.approx(source["Close"].iloc[-1])
+    assert list(first.columns) == COLUMNS
+
+
+def test_longer_period_fetches_only_the_missing_range(tmp_path, csv_dir):
+    write_csv(csv_dir, "MSFT")
+    store, provider = make_store(tmp_path, csv_dir)
+    store.get_history("MSFT", period="6mo")
+    covered_start = provider.calls[0][1]
+
+    history = store.get_history("MSFT", period="2y")
+    assert len(provider.calls) == 2
+    _, start, end = provider.calls[1]
+    assert end == covered_start - timedelta(days=1)
+    assert history.index.is_monotonic_increasing
+    assert not history.index.duplicated().any()
+
+
+def test_empty_fetch_is_not_recorded_as_covered(tmp_path, csv_dir):
+    store, provider = make_store(tmp_path, csv_dir)
+    with pytest.raises(ValueError, match="NVDA"):
+        store.get_history("NVDA", period="1y")
+
+    # The provider recovers: the range is asked for again instead of being served empty
+    write_csv(csv_dir, "NVDA")
+    assert len(store.get_history("NVDA", period="1y")) > 200
+    assert len(provider.calls) == 2
+
+
+def test_one_failing_ticker_does_not_cover_the_others(tmp_path, csv_dir):
+    write_csv(csv_dir, "AMZN")
+    store, provider = make_store(tmp_path, csv_dir)
+    with pytest.raises(ValueError, match="GOOGL"):
+        store.get_histories(["AMZN", "GOOGL"], period="1y")
+
+    write_csv(csv_dir, "GOOGL")
+    histories = store.get_histories(["AMZN", "GOOGL"], period="1y")
+    assert [ticker for ticker, _, _ in provider.calls[2:]] == ["GOOGL"]
+    assert len(histories["GOOGL"]) == len(histories["AMZN"])
+
+
+class YahooLikeProvider:
+    """Answers like yfinance: Ticker.history bars are tz-aware, yf.download bars tz-naive."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def fetch(self, ticker, start, end, interval="1d"):
+        frame = self.frames[ticker]
+        days = frame.index.date
+        return frame[(days >= start) & (days <= end)]
+
+    def fetch_many(self, tickers, start, end, interval="1d"):
+        frames = {ticker: self.fetch(ticker, start, end, interval) for ticker in tickers}
+        for frame in frames.values():
+            frame.index = frame.index.tz_localize(None)
+        return frames
+
+
+def test_bulk_and_single_fetches_store_the_same_rows(tmp_path, csv_dir):
+    frames = {ticker: write_csv(csv_dir, ticker) for ticker in ("AAPL", "MSFT")}
+    bulk = MarketDataStore(str(tmp_path / "bulk.db"), provider=YahooLikeProvider(frames))
+    single = MarketDataStore(str(tmp_path / "single.db"), provider=YahooLikeProvider(frames))
+
+    before = bulk.get_histories(["AAPL", "MSFT"], period="6mo")["AAPL"]
+    # Forget the coverage, so the same range is downloaded again with Ticker.history
+    with bulk._connect() as conn:
+        conn.execute("DELETE FROM coverage WHERE ticker = 'AAPL'")
+    after = bulk.get_history("AAPL", period="6mo")
+    expected = single.get_history("AAPL", period="6mo")
+
+    assert len(before) == len(after) == len(expected)
+    assert list(after.index) == list(expected.index)
+    assert list(before.index.date) == list(expected.index.date)
+    assert str(expected.index.tz) == "America/New_York"
+    assert expected.index[-1].date() == frames["AAPL"].index[-1].date()
+    pd.testing.assert_frame_equal(after, expected)
+
+
+def test_ranges_without_bars_are_not_asked_for_again(tmp_path, csv_dir):
+    write_csv(csv_dir, "SHOP", days=200)
+    store, provider = make_store(tmp_path, csv_dir)
+    store.get_history("SHOP", period="1y")
+    # Before the first bar: answered with no bars, and recorded as covered
+    store.get_history("SHOP", period="5y")
+    calls = len(provider.calls)
+    store.get_history("SHOP", period="5y")
+    assert len(provider.calls) == calls
+
+    # A refresh of the current day that brings nothing new (weekend, holiday) also counts as done
+    with store._connect() as conn:
+        conn.execute("UPDATE coverage SET fetched_at = 0")
+    store.get_history("SHOP", period="1y")
+    calls = len(provider.calls)
+    store.get_history("SHOP", period="1y")
+    assert len(provider.calls) == calls
+
+
+def test_failed_fetch_serves_stored_bars_and_is_retried(tmp_path, csv_dir):
+    write_csv(csv_dir, "IBM")
+    store, provider = make_store(tmp_path, csv_dir)
+    stored = store.get_history("IBM", period="6mo")
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("offline")
+
+    provider.fetch = fail
+    assert len(store.get_history("IBM", period="1y")) >= len(stored)
+    with pytest.raises(ValueError, match="ORCL"):
+        store.get_history("ORCL", period="1y")
+
+
+def test_day_periods_count_trading_sessions(tmp_path, csv_dir):
+    source = write_csv(csv_dir, "AAPL")
+    store, _ = make_store(tmp_path, csv_dir)
+    assert len(store.get_history("AAPL", period="5d")) == 5
+    last = store.get_history("AAPL", period="1d")
+    assert len(last) == 1
+    assert last.index[-1].date() == source.index[-1].date()
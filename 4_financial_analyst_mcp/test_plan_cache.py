@@ -0,0 +1,76 @@
+from plan_cache import PERIOD_PLACEHOLDER, TICKER_PLACEHOLDER, PlanCache, intent_for, make_template, render_plan
+
+SCRIPT = '''import matplotlib.pyplot as plt
+from market_data import load_history
+
+hist = load_history("AAPL", period="6mo")
+plt.plot(hist.index, hist["Close"], label="Close")
+plt.title(f"Closing price over {len(hist)} days")
+plt.savefig("stock_plot.png")
+'''
+
+COMPARE_SCRIPT = '''from market_data import load_close
+
+closes = load_close(["AAPL", "MSFT"], period="1y")
+closes.plot().get_figure().savefig("stock_plot.png")
+'''
+
+
+def test_template_round_trip_restores_the_original_script():
+    intent = intent_for("Show Apple stock over the last 6 months")
+    template, period_parameterized = make_template(SCRIPT, intent)
+    assert period_parameterized
+    assert TICKER_PLACEHOLDER.format(0) in template and PERIOD_PLACEHOLDER in template
+    assert "AAPL" not in template and "6mo" not in template
+    assert render_plan(template, intent) == SCRIPT.replace('"AAPL"', "'AAPL'").replace('"6mo"', "'6mo'")
+
+
+def test_template_fills_in_new_tickers_and_period():
+    template, _ = make_template(COMPARE_SCRIPT, intent_for("Compare Apple and Microsoft over 1 year"))
+    code = render_plan(template, intent_for("Compare Tesla and Nvidia over 2 years"))
+    assert "load_close(['TSLA', 'NVDA'], period='2y')" in code
+    compile(code, "<plan>", "exec")
+
+
+def test_script_naming_the_company_elsewhere_is_not_reusable():
+    intent = intent_for("Show Apple stock over the last 6 months")
+    assert make_template(SCRIPT.replace("Closing price", "Apple closing price"), intent) is None
+
+
+def test_cache_hit_for_same_intent_with_other_parameters(tmp_path):
+    path = str(tmp_path / "plans.json")
+    cache = PlanCache(path=path, version="test")
+    assert cache.lookup("Show Apple stock over the last 6 months") is None
+    assert cache.store("Show Apple stock over the last 6 months", SCRIPT)
+
+    intent, code = cache.lookup("Show Tesla stock over the last 2 years")
+    assert intent["tickers"] == ["TSLA"]
+    assert "load_history('TSLA', period='2y')" in code
+    # Another window size is another analysis
+    assert cache.lookup("Show the 30-day rolling volatility of Apple for the last 6 months") is None
+
+    # Persisted, and dropped when the prompts change
+    assert PlanCache(path=path, version="test").lookup("Show Nvidia stock over the last year") is not None
+    assert PlanCache(path=path, version="other").stats()["plans"] == 0
+
+
+def test_invalidate_drops_the_plan(tmp_path):
+    cache = PlanCache(path=None)
+    cache.store("Show Apple stock over the last 6 months", SCRIPT)
+    assert cache.invalidate(intent_for("Show Meta stock over the last year")) == 1
+    assert cache.lookup("Show Apple stock over the last 6 months") is None
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_different_requests_of_the_same_kind_do_not_share_a_plan():
+    pairs = [
+        ("Show Apple volatility against gold prices", "Show Apple volatility"),
+        ("Plot the rolling volatility of Tesla", "Show Apple volatility"),
+        ("Show Apple volatility against gold prices", "Plot the rolling volatility of Tesla"),
+        ("Predict Apple stock with a random forest", "Predict Tesla stock"),
+    ]
+    for first, second in pairs:
+        assert PlanCache.key(intent_for(first)) != PlanCache.key(intent_for(second)), (first, second)
+    # Only the tickers and the timeframe differ: the same plan
+    assert PlanCache.key(intent_for("Forecast Apple's stock price over 2 years")) == \
+        PlanCache.key(intent_for("forecast Google stock for the last 6 months"))
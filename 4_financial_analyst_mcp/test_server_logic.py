@@ -1,15 +1,16 @@
-from server import run_analysis
+from server import jobs, plot_png
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 print("Testing analyze_stock_and_plot...")
-result = run_analysis("Compare Google and Amazon stock performance over the last year")
+job = jobs.run("Compare Google and Amazon stock performance over the last year")
 print("\n--- Result ---")
-print(result)
+print(job.message)
 
-if os.path.exists("stock_plot.png"):
-    print("\nSUCCESS: stock_plot.png exists.")
+png = plot_png(job)
+if png:
+    print(f"\nSUCCESS: stock_plot.png rendered ({len(png)} bytes).")
 else:
-    print("\nFAILURE: stock_plot.png does not exist.")
+    print("\nFAILURE: stock_plot.png was not rendered.")
@@ -0,0 +1,252 @@
+"""
+One process hosting every MCP tool server in this repository.
+
+The SQLite, weather, RAG and finance servers are imported into a single FastMCP gateway and
+their tools are exposed under namespaced names (`sqlite_add_person`, `rag_machine_learning_faq_retrieval_tool`,
+`finance_analyze_stock_and_plot`, ...). Agents then manage one server instead of four,
+and the process imports pydantic, genai and dotenv once.
+
+- Each subsystem can be switched off with GATEWAY_ENABLE_<NAME>=0 or `--disable <name>`.
+- Subsystems listed in GATEWAY_LAZY (default: rag,finance, which load a sentence-transformer
+  or CrewAI) are imported on their first tool call. Their tool list comes from
+  gateway_tools.json, which is rewritten whenever a subsystem's code changes.
+- Every tool runs on the gateway's one event loop. The servers' slow tools are async and do
+  their blocking work on worker threads, at most GATEWAY_MAX_THREADS at a time, so a slow
+  analysis does not stall the other subsystems.
+- The SQLite database and the Qdrant index are kept next to their servers' files, unless
+  SQLITE_DB_PATH / RAG_QDRANT_PATH say otherwise.
+- Calls are timed by mcp_shared.instrumentation; see `get_server_metrics` and GET /metrics.
+
+Usage:
+    python gateway.py                                  # HTTP on 127.0.0.1:8080/mcp
+    python gateway.py --transport stdio --disable finance
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import anyio
+from fastmcp import FastMCP
+from fastmcp.tools.tool import Tool
+from pydantic import PrivateAttr
+
+from mcp_shared.instrumentation import instrument, span
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.getenv("GATEWAY_MANIFEST_PATH", os.path.join(ROOT, "gateway_tools.json"))
+LAZY = {name.strip() for name in os.getenv("GATEWAY_LAZY", "rag,finance").split(",") if name.strip()}
+MAX_THREADS = int(os.getenv("GATEWAY_MAX_THREADS", "32"))
+
+# Tools every subsystem registers through instrument(); the gateway serves its own copy
+SHARED_TOOLS = {"get_server_metrics"}
+
+
+@dataclass
+class Subsystem:
+    name: str
+    directory: str
+    filename: str
+    setup: str = None  # module function to call once after import (e.g. creating tables)
+    # Environment defaults set before import; relative paths resolve inside the subsystem's directory
+    paths: dict = field(default_factory=dict)
+    server: FastMCP = field(default=None, repr=False)
+    load_seconds: float = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(ROOT, self.directory)
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv(f"GATEWAY_ENABLE_{self.name.upper()}", "1").lower() not in ("0", "false", "no")
+
+    def fingerprint(self) -> str:
+        """Changes whenever a Python file of the subsystem (or of mcp_shared) changes."""
+        digest = hashlib.sha1()
+        for directory in (self.path, os.path.join(ROOT, "mcp_shared")):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".py"):
+                    stat = os.stat(os.path.join(directory, name))
+                    digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return digest.hexdigest()
+
+    def load(self) -> FastMCP:
+        """Imports the subsystem's server module (once) and returns its FastMCP instance."""
+        with self._lock:
+            if self.server is None:
+                started = time.perf_counter()
+                with span("subsystem_load", subsystem=self.name):
+                    # Sibling modules (rag_app, finance_crew, ...) are imported by plain name
+                    if self.path not in sys.path:
+                        sys.path.append(self.path)
+                    for variable, path in self.paths.items():
+                        os.environ.setdefault(variable, os.path.join(self.path, path))
+                    # Two servers are called server.py, so each gets a module name of its own
+                    spec = importlib.util.spec_from_file_location(f"gateway_{self.name}_server",
+                                                                  os.path.join(self.path, self.filename))
+                    module = importlib.util.module_from_spec(spec)
+                    sys.modules[spec.name] = module
+                    spec.loader.exec_module(module)
+                    if self.setup:
+                        getattr(module, self.setup)()
+                self.server = module.mcp
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                print(f"gateway: loaded {self.name} in {self.load_seconds:.2f}s", file=sys.stderr)
+            return self.server
+
+
+SUBSYSTEMS = {
+    subsystem.name: subsystem
+    for subsystem in (
+        Subsystem("sqlite", "1_sqlite_mcp_agent", "sqlite_server.py", setup="init_db",
+                  paths={"SQLITE_DB_PATH": "data.db"}),
+        Subsystem("weather", "2_weather_ai_agent", "weather_server.py"),
+        Subsystem("rag", "3_mcp_agentic-rag", "server.py", paths={"RAG_QDRANT_PATH": "qdrant_db_new"}),
+        Subsystem("finance", "4_financial_analyst_mcp", "server.py"),
+    )
+}
+
+def _thread_limiter():
+    # The servers' tools hand blocking work to anyio.to_thread, which uses the loop's default limiter
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = MAX_THREADS
+    return limiter
+
+
+class ForwardedTool(Tool):
+    """A subsystem tool under its namespaced gateway name; loads the subsystem on first call."""
+
+    _subsystem: Subsystem = PrivateAttr()
+    _tool_name: str = PrivateAttr()
+
+    @classmethod
+    def create(cls, subsystem: Subsystem, spec: dict) -> "ForwardedTool":
+        tool = cls(
+            name=f"{subsystem.name}_{spec['name']}",
+            description=spec.get("description"),
+            parameters=spec["parameters"],
+            output_schema=spec.get("output_schema"),
+            annotations=spec.get("annotations"),
+            tags={subsystem.name},
+        )
+        tool._subsystem = subsystem
+        tool._tool_name = spec["name"]
+        return tool
+
+    async def run(self, arguments):
+        subsystem = self._subsystem
+        server = subsystem.server or await anyio.to_thread.run_sync(subsystem.load, limiter=_thread_limiter())
+        tool = await server.get_tool(self._tool_name)
+        # On the gateway's loop, so tools can keep loop-bound state (clients, locks, futures) across calls
+        _thread_limiter()
+        return await tool.run(arguments)
+
+
+def tool_specs(server: FastMCP) -> list:
+    """Name, description and schemas of a loaded server's tools, as stored in the manifest."""
+    tools = asyncio.run(server.get_tools())
+    specs = []
+    for name, tool in sorted(tools.items()):
+        if name in SHARED_TOOLS:
+            continue
+        specs.append({
+            "name": name,
+            "description": tool.description,
+            "parameters": tool.parameters,
+            "output_schema": tool.output_schema,
+            "annotations": tool.annotations.model_dump(exclude_none=True) if tool.annotations else None,
+        })
+    return specs
+
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict):
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def build_gateway(disabled=()) -> FastMCP:
+    """
+    Creates the gateway and registers the tools of every enabled subsystem. Eager subsystems
+    are imported now; lazy ones only when their manifest entry is missing or out of date.
+    """
+    gateway = instrument(FastMCP("MCP GATEWAY"))
+    manifest = load_manifest()
+    changed = False
+
+    for subsystem in SUBSYSTEMS.values():
+        if not subsystem.enabled or subsystem.name in disabled:
+            print(f"gateway: {subsystem.name} disabled", file=sys.stderr)
+            continue
+        fingerprint = subsystem.fingerprint()
+        entry = manifest.get(subsystem.name)
+        if subsystem.name not in LAZY or not entry or entry.get("fingerprint") != fingerprint:
+            try:
+                server = subsystem.load()
+            except Exception as e:
+                print(f"gateway: {subsystem.name} failed to load and is skipped: {e}", file=sys.stderr)
+                continue
+            specs = tool_specs(server)
+            if not entry or entry.get("fingerprint") != fingerprint or entry.get("tools") != specs:
+                manifest[subsystem.name] = entry = {"fingerprint": fingerprint, "tools": specs}
+                changed = True
+        for spec in entry["tools"]:
+            gateway.add_tool(ForwardedTool.create(subsystem, spec))
+
+    if changed:
+        save_manifest(manifest)
+
+    @gateway.tool()
+    def get_gateway_status() -> str:
+        """Report which subsystems are enabled, which are loaded, how long they took to load and their tools"""
+        return json.dumps({
+            name: {
+                "enabled": subsystem.enabled and name not in disabled,
+                "lazy": name in LAZY,
+                "loaded": subsystem.server is not None,
+                "load_seconds": subsystem.load_seconds,
+                "tools": [spec["name"] for spec in manifest.get(name, {}).get("tools", [])],
+            }
+            for name, subsystem in SUBSYSTEMS.items()
+        }, indent=2)
+
+    return gateway
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve every MCP tool server of this repository from one process.")
+    parser.add_argument("--transport", choices=["stdio", "http"], default=os.getenv("GATEWAY_TRANSPORT", "http"))
+    parser.add_argument("--host", default=os.getenv("GATEWAY_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("GATEWAY_PORT", "8080")))
+    parser.add_argument("--disable", action="append", default=[], choices=list(SUBSYSTEMS),
+                        help="Subsystem to leave out (repeatable)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    mcp = build_gateway(disabled=set(args.disable))
+    loaded = [name for name, subsystem in SUBSYSTEMS.items() if subsystem.server is not None]
+    print(f"gateway: ready in {time.perf_counter() - started:.2f}s (loaded: {', '.join(loaded) or 'none'})", file=sys.stderr)
+
+    if args.transport == "http":
+        print(f"Starting MCP Gateway on http://{args.host}:{args.port}/mcp ...", file=sys.stderr)
+        mcp.run(transport="http", host=args.host, port=args.port)
+    else:
+        print("Starting MCP Gateway on stdio...", file=sys.stderr)
+        mcp.run()
@@ -0,0 +1 @@
+"""Helpers shared by the MCP servers in this repository."""
@@ -0,0 +1,339 @@
+"""
+Timing and metrics for FastMCP servers.
+
+`instrument(mcp)` adds a middleware that records, for every tool call: latency (as a
+histogram), argument and response sizes, exceptions, "Error: ..." results and how many
+calls of the tool are running at once. It also registers a `get_server_metrics` tool and,
+on HTTP transports, a JSON `/metrics` endpoint.
+
+Code inside a tool marks its internal stages with `span()`:
+
+    with span("embed", texts=len(texts)):
+        vectors = model.encode(texts)
+
+Spans nest (embed inside search inside the tool call), every span name gets its own latency
+histogram, and with MCP_TRACE_FILE set each finished call is appended to that file as one
+JSON line holding its span tree. Spans opened outside a tool call (background jobs) become
+traces of their own.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from fastmcp.server.middleware import Middleware
+
+TRACE_FILE = os.getenv("MCP_TRACE_FILE", "")
+RECENT_TRACES = int(os.getenv("MCP_RECENT_TRACES", "50"))
+# Children kept per span, so a loop of spans cannot grow a trace without bound
+MAX_CHILD_SPANS = 200
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+SIZE_BUCKETS_BYTES = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are estimated by interpolating within a bucket."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.bounds[index - 1] if index > 0 else 0.0
+                high = self.bounds[index] if index < len(self.bounds) else self.max
+                return round(min(low + (high - low) * (rank - seen) / count, self.max), 3)
+            seen += count
+        return round(self.max, 3)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3),
+            "buckets": {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts) if count},
+        }
+
+
+class ToolStats:
+    def __init__(self):
+        self.calls = 0
+        self.exceptions = 0
+        self.error_results = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latency_ms = Histogram()
+        self.request_bytes = Histogram(SIZE_BUCKETS_BYTES)
+        self.response_bytes = Histogram(SIZE_BUCKETS_BYTES)
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "exceptions": self.exceptions,
+            "error_results": self.error_results,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "latency_ms": self.latency_ms.snapshot(),
+            "request_bytes": self.request_bytes.snapshot(),
+            "response_bytes": self.response_bytes.snapshot(),
+        }
+
+
+class Metrics:
+    """Process-wide registry of tool and span statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.tools = {}
+        self.spans = {}
+        self.span_errors = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.recent_traces = deque(maxlen=RECENT_TRACES)
+        self.sections = {}
+
+    def add_section(self, name: str, report):
+        """Adds `report()` (a JSON-serializable dict) to every snapshot under `name`."""
+        self.sections[name] = report
+
+    def _tool(self, name: str) -> ToolStats:
+        stats = self.tools.get(name)
+        if stats is None:
+            stats = self.tools[name] = ToolStats()
+        return stats
+
+    def call_started(self, name: str, request_bytes: int):
+        with self._lock:
+            stats = self._tool(name)
+            stats.calls += 1
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            stats.request_bytes.observe(request_bytes)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def call_finished(self, name: str, duration_ms: float, response_bytes: int = None,
+                      exception: bool = False, error_result: bool = False):
+        with self._lock:
+            stats = self._tool(name)
+            stats.in_flight -= 1
+            self.in_flight -= 1
+            stats.latency_ms.observe(duration_ms)
+            if response_bytes is not None:
+                stats.response_bytes.observe(response_bytes)
+            stats.exceptions += exception
+            stats.error_results += error_result
+
+    def span_finished(self, name: str, duration_ms: float, failed: bool):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram()
+            histogram.observe(duration_ms)
+            if failed:
+                self.span_errors[name] = self.span_errors.get(name, 0) + 1
+
+    def add_trace(self, trace: dict):
+        with self._lock:
+            self.recent_traces.append(trace)
+
+    def snapshot(self, include_traces: bool = False) -> dict:
+        with self._lock:
+            data = {
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "tools": {name: stats.snapshot() for name, stats in sorted(self.tools.items())},
+                "spans": {
+                    name: {**histogram.snapshot(), "errors": self.span_errors.get(name, 0)}
+                    for name, histogram in sorted(self.spans.items())
+                },
+                "trace_file": TRACE_FILE or None,
+            }
+            if include_traces:
+                data["recent_traces"] = list(self.recent_traces)
+        for name, report in list(self.sections.items()):
+            data[name] = report()
+        return data
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.tools.clear()
+            self.spans.clear()
+            self.span_errors.clear()
+            self.max_in_flight = self.in_flight
+            self.recent_traces.clear()
+
+
+metrics = Metrics()
+
+_current_span = contextvars.ContextVar("mcp_current_span", default=None)
+_trace_lock = threading.Lock()
+
+
+def _write_trace(trace: dict):
+    metrics.add_trace(trace)
+    if not TRACE_FILE:
+        return
+    try:
+        line = json.dumps(trace, default=str)
+        with _trace_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except (OSError, TypeError, ValueError) as e:
+        print(f"instrumentation: could not write trace to {TRACE_FILE}: {e}", file=sys.stderr)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Times the enclosed block as a stage of the current tool call (or as a trace of its own
+    when no span is open). Yields the span record, whose "attributes" may be added to.
+    """
+    parent = _current_span.get()
+    record = {"name": name, "start": round(time.time(), 6), "attributes": attributes, "children": []}
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield record
+    except BaseException as e:
+        failed = True
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(record, parent, (time.perf_counter() - started) * 1000, failed)
+
+
+def record_span(name: str, started: float = None, duration_ms: float = None, **attributes):
+    """
+    Records a stage that has already finished, for stages whose boundaries are only known from
+    callbacks or that ran elsewhere. Give either `started`, the time.perf_counter() value at
+    which the stage began, or the measured `duration_ms`.
+    """
+    if duration_ms is None:
+        duration_ms = (time.perf_counter() - started) * 1000
+    record = {"name": name, "start": round(time.time() - duration_ms / 1000, 6), "attributes": attributes, "children": []}
+    _finish(record, _current_span.get(), duration_ms, False)
+
+
+def _finish(record: dict, parent, duration_ms: float, failed: bool):
+    record["duration_ms"] = round(duration_ms, 3)
+    if not record["children"]:
+        del record["children"]
+    metrics.span_finished(record["name"], duration_ms, failed)
+    if parent is None:
+        _write_trace(record)
+    elif len(parent["children"]) < MAX_CHILD_SPANS:
+        parent["children"].append(record)
+    else:
+        parent["dropped_children"] = parent.get("dropped_children", 0) + 1
+
+
+def current_span():
+    """The innermost open span record, or None."""
+    return _current_span.get()
+
+
+def _payload_size(value) -> int:
+    try:
+        return len(json.dumps(value, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _response_size(result) -> int:
+    size = 0
+    for block in getattr(result, "content", None) or []:
+        text = getattr(block, "text", None)
+        if text is not None:
+            size += len(text.encode("utf-8"))
+        else:
+            # Images and audio carry base64 data
+            size += len(getattr(block, "data", "") or "")
+    return size
+
+
+def _is_error_result(result) -> bool:
+    if getattr(result, "is_error", False) or getattr(result, "isError", False):
+        return True
+    content = getattr(result, "content", None) or []
+    text = getattr(content[0], "text", None) if content else None
+    return bool(text) and text.lstrip().startswith("Error")
+
+
+class InstrumentationMiddleware(Middleware):
+    """Records every tool call in `metrics` and opens the root span of its trace."""
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        arguments = context.message.arguments or {}
+        metrics.call_started(name, _payload_size(arguments))
+        started = time.perf_counter()
+        result = None
+        exception = False
+        try:
+            with span(f"tool:{name}", tool=name) as record:
+                result = await call_next(context)
+                record["attributes"]["response_bytes"] = _response_size(result)
+            return result
+        except BaseException:
+            exception = True
+            raise
+        finally:
+            metrics.call_finished(
+                name,
+                (time.perf_counter() - started) * 1000,
+                response_bytes=_response_size(result) if result is not None else None,
+                exception=exception,
+                error_result=result is not None and _is_error_result(result),
+            )
+
+
+def instrument(mcp, metrics_tool: bool = True, http_endpoint: bool = True):
+    """
+    Adds the instrumentation middleware to a FastMCP server, plus a `get_server_metrics` tool
+    and a GET /metrics route (HTTP transports only). Returns the server.
+    """
+    mcp.add_middleware(InstrumentationMiddleware())
+
+    if metrics_tool:
+        @mcp.tool()
+        def get_server_metrics(include_traces: bool = False) -> str:
+            """Report per-tool latency percentiles, payload sizes, error counts, concurrency and internal stage timings"""
+            return json.dumps(metrics.snapshot(include_traces), indent=2)
+
+    if http_endpoint:
+        from starlette.responses import JSONResponse
+
+        @mcp.custom_route("/metrics", methods=["GET"])
+        async def metrics_endpoint(request):
+            include_traces = request.query_params.get("traces", "").lower() in ("1", "true", "yes")
+            return JSONResponse(metrics.snapshot(include_traces))
+
+    return mcp
@@ -0,0 +1,591 @@
+"""
+One call layer for every Gemini client in this repository.
+
+The projects talk to Gemini through llama-index (`Gemini`), `genai.GenerativeModel` and
+crewai (`LLM`). Whatever the SDK, each call is handed to `shared_llm`, which:
+
+- schedules it: a token bucket (LLM_REQUESTS_PER_MINUTE, bursts of LLM_BURST) and at most
+  LLM_MAX_CONCURRENT calls at once, shared by every caller in the process;
+- retries rate-limit and transient errors with jittered exponential backoff, and pauses the
+  whole bucket after a 429 so other callers do not walk into the same limit;
+- deduplicates identical in-flight requests (single flight) and caches their responses for
+  LLM_CACHE_TTL_SECONDS. Only requests with a key are deduplicated and cached; callers pass
+  one when the request is deterministic (temperature 0), see `request_key`;
+- counts calls, cache hits, deduplicated calls, retries, errors, waiting time, latency and
+  tokens per caller (`shared_llm.usage()`, also part of get_server_metrics).
+
+`wrap_llama_index_llm` and `wrap_crewai_llm` route an existing SDK object through the layer;
+genai calls go through `shared_llm.call` / `shared_llm.stream` directly.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from mcp_shared.instrumentation import metrics, span
+
+REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+BURST = int(os.getenv("LLM_BURST", "10"))
+MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "4"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+MAX_CACHED_RESPONSES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "RateLimitError", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "APIConnectionError", "APITimeoutError", "Timeout", "ConnectionError",
+}
+RATE_LIMIT_HINTS = ("429", "rate limit", "quota", "resource exhausted", "overloaded")
+
+# End-of-stream marker for the one-chunk lookahead in stream()/astream()
+_END = object()
+
+
+async def _anext(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+def request_key(*parts) -> str:
+    """Content hash of everything that determines a response (model, prompt, settings, tools)."""
+    data = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(temperature) -> bool:
+    return temperature is not None and float(temperature) <= 0
+
+
+def _status(error):
+    for name in ("code", "status_code", "status"):
+        value = getattr(error, name, None)
+        value = value() if callable(value) else value
+        value = getattr(value, "value", value)  # grpc/http status enums
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_rate_limited(error) -> bool:
+    if _status(error) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in RATE_LIMIT_HINTS)
+
+
+def is_retryable(error) -> bool:
+    if is_rate_limited(error) or _status(error) in RETRYABLE_STATUS:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff: anywhere up to base * 2^attempt, capped."""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def _field(obj, name: str):
+    # SDK responses are objects, or dicts once serialized (llama-index keeps the raw response as a dict)
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def token_usage(response) -> dict:
+    """Prompt/completion token counts of a genai, litellm or llama-index response, if present."""
+    usage = _field(response, "usage_metadata")
+    if usage is not None:
+        return {"prompt": _field(usage, "prompt_token_count") or 0,
+                "completion": _field(usage, "candidates_token_count") or 0}
+    raw = _field(response, "raw")
+    if raw is not None and raw is not response:
+        return token_usage(raw)
+    usage = _field(response, "usage")
+    if usage is not None:
+        return {"prompt": _field(usage, "prompt_tokens") or 0, "completion": _field(usage, "completion_tokens") or 0}
+    return {}
+
+
+class TokenBucket:
+    """Requests per minute with bursts; `pause` holds every caller back after a rate-limit response."""
+
+    def __init__(self, per_minute: float = REQUESTS_PER_MINUTE, burst: int = BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Takes a token and returns 0, or returns how long to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CallerStats:
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.deduplicated = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def snapshot(self) -> dict:
+        sent = self.calls - self.cache_hits - self.deduplicated
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "deduplicated": self.deduplicated,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "mean_latency_seconds": round(self.latency_seconds / sent, 3) if sent > 0 else None,
+            "max_latency_seconds": round(self.max_latency_seconds, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class LLMClient:
+    def __init__(self, bucket: TokenBucket = None, max_concurrent: int = MAX_CONCURRENT,
+                 max_retries: int = MAX_RETRIES, cache_ttl: float = CACHE_TTL_SECONDS,
+                 max_cached: int = MAX_CACHED_RESPONSES):
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, response)
+        self._inflight = {}  # key -> Future of the call in progress
+        self._lock = threading.Lock()
+        self._callers = {}
+
+    # --- bookkeeping ---
+
+    def _stats(self, caller: str) -> CallerStats:
+        # Called with the lock held
+        stats = self._callers.get(caller)
+        if stats is None:
+            stats = self._callers[caller] = CallerStats()
+        return stats
+
+    def _count(self, caller: str, **increments):
+        with self._lock:
+            stats = self._stats(caller)
+            for name, value in increments.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    def _finished(self, caller: str, latency: float, response=None, failed: bool = False):
+        usage = token_usage(response) if response is not None else {}
+        with self._lock:
+            stats = self._stats(caller)
+            stats.latency_seconds += latency
+            stats.max_latency_seconds = max(stats.max_latency_seconds, latency)
+            stats.prompt_tokens += usage.get("prompt", 0)
+            stats.completion_tokens += usage.get("completion", 0)
+            stats.errors += failed
+
+    def _cached(self, key: str):
+        # Called with the lock held
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] >= self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, response):
+        with self._lock:
+            self._cache[key] = (time.time(), response)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def _claim(self, caller: str, key: str, cache: bool):
+        """Returns ("hit", response), ("wait", future) or ("run", future-or-None) for a new call."""
+        with self._lock:
+            self._stats(caller).calls += 1
+            if key is None:
+                return "run", None
+            entry = self._cached(key) if cache else None
+            if entry is not None:
+                self._stats(caller).cache_hits += 1
+                return "hit", entry[1]
+            if key in self._inflight:
+                self._stats(caller).deduplicated += 1
+                return "wait", self._inflight[key]
+            future = self._inflight[key] = Future()
+            return "run", future
+
+    def _settle(self, key: str, future: Future, response=None, error: BaseException = None, cache: bool = True):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None and cache:
+            self._store(key, response)
+        if error is None:
+            future.set_result(response)
+        else:
+            future.set_exception(error)
+
+    def _rate_limited(self, caller: str, error, attempt: int) -> float:
+        delay = backoff(attempt)
+        if is_rate_limited(error):
+            self._count(caller, rate_limited=1)
+            self.bucket.pause(delay)
+        self._count(caller, retries=1)
+        return delay
+
+    # --- synchronous calls ---
+
+    def _acquire(self, caller: str):
+        started = time.monotonic()
+        while True:
+            wait = self.bucket.try_acquire()
+            if not wait:
+                break
+            time.sleep(min(wait, 1.0))
+        self._slots.acquire()
+        self._count(caller, wait_seconds=time.monotonic() - started)
+
+    def _send(self, caller: str, fn, args, kwargs):
+        attempt = 0
+        while True:
+            self._acquire(caller)
+            started = time.monotonic()
+            try:
+                response = fn(*args, **kwargs)
+            except Exception as e:
+                self._slots.release()
+                retry = attempt < self.max_retries and is_retryable(e)
+                self._finished(caller, time.monotonic() - started, failed=not retry)
+                if not retry:
+                    raise
+                time.sleep(self._rate_limited(caller, e, attempt))
+                attempt += 1
+                continue
+            self._slots.release()
+            self._finished(caller, time.monotonic() - started, response)
+            return response
+
+    def call(self, caller: str, fn, *args, key: str = None, cache: bool = True, **kwargs):
+        """
+        Calls fn(*args, **kwargs) through the scheduler. With a `key`, identical calls in flight
+        share one request, and (with `cache`) the response is reused until it expires.
+        """
+        with span("llm", caller=caller) as record:
+            state, value = self._claim(caller, key, cache)
+            record["attributes"]["source"] = {"hit": "cache", "wait": "in_flight"}.get(state, "model")
+            if state == "hit":
+                return value
+            if state == "wait":
+                return value.result()
+            try:
+                response = self._send(caller, fn, args, kwargs)
+            except BaseException as e:
+                if value is not None:
+                    self._settle(key, value, error=e)
+                raise
+            if value is not None:
+                self._settle(key, value, response, cache=cache)
+            return response
+
+    def stream(self, caller: str, fn, *args, key: str = None, cache: bool = True, **kwargs):
+        """
+        Iterates over fn(*args, **kwargs) (a streaming response) through the scheduler. Errors
+        before the first chunk are retried; with a `key` and `cache`, a completed stream is
+        replayed from the cache. Streams are not deduplicated.
+
+        The concurrency slot is held while the response is being received and freed as soon as
+        it ends or fails. A reader that stops early must close() the generator (or iterate it
+        inside contextlib.closing), or the slot stays taken until the generator is collected.
+        """
+        with self._lock:
+            self._stats(caller).calls += 1
+            entry = self._cached(key) if key is not None and cache else None
+            if entry is not None:
+                self._stats(caller).cache_hits += 1
+        if entry is not None:
+            yield from entry[1]
+            return
+
+        attempt = 0
+        while True:
+            self._acquire(caller)
+            started = time.monotonic()
+            chunks, held = [], True
+            try:
+                iterator = iter(fn(*args, **kwargs))
+                chunk = next(iterator, _END)
+                while chunk is not _END:
+                    chunks.append(chunk)
+                    # Read one chunk ahead, so the slot is freed before the last one is handed over
+                    following = next(iterator, _END)
+                    if following is _END:
+                        held = False
+                        self._slots.release()
+                        self._finished(caller, time.monotonic() - started, chunk)
+                    yield chunk
+                    chunk = following
+            except Exception as e:
+                if not held:
+                    raise
+                retry = not chunks and attempt < self.max_retries and is_retryable(e)
+                self._slots.release()
+                self._finished(caller, time.monotonic() - started, failed=not retry)
+                if not retry:
+                    raise
+                time.sleep(self._rate_limited(caller, e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # The reader stopped early (GeneratorExit): nothing complete to cache
+                if held:
+                    self._slots.release()
+                    self._finished(caller, time.monotonic() - started)
+                raise
+            if held:
+                # An empty response
+                self._slots.release()
+                self._finished(caller, time.monotonic() - started)
+            if key is not None and cache:
+                self._store(key, chunks)
+            return
+
+    # --- asynchronous calls (same bucket, slots and cache) ---
+
+    async def _aacquire(self, caller: str):
+        started = time.monotonic()
+        while True:
+            wait = self.bucket.try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, 1.0))
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+        self._count(caller, wait_seconds=time.monotonic() - started)
+
+    async def acall(self, caller: str, fn, *args, key: str = None, cache: bool = True, **kwargs):
+        """`call` for a coroutine function."""
+        with span("llm", caller=caller) as record:
+            state, value = self._claim(caller, key, cache)
+            record["attributes"]["source"] = {"hit": "cache", "wait": "in_flight"}.get(state, "model")
+            if state == "hit":
+                return value
+            if state == "wait":
+                return await asyncio.wrap_future(value)
+            try:
+                attempt = 0
+                while True:
+                    await self._aacquire(caller)
+                    started = time.monotonic()
+                    try:
+                        response = await fn(*args, **kwargs)
+                    except Exception as e:
+                        self._slots.release()
+                        retry = attempt < self.max_retries and is_retryable(e)
+                        self._finished(caller, time.monotonic() - started, failed=not retry)
+                        if not retry:
+                            raise
+                        await asyncio.sleep(self._rate_limited(caller, e, attempt))
+                        attempt += 1
+                        continue
+                    self._slots.release()
+                    self._finished(caller, time.monotonic() - started, response)
+                    break
+            except BaseException as e:
+                if value is not None:
+                    self._settle(key, value, error=e)
+                raise
+            if value is not None:
+                self._settle(key, value, response, cache=cache)
+            return response
+
+    async def astream(self, caller: str, fn, *args, key: str = None, cache: bool = True, **kwargs):
+        """
+        `stream` for a coroutine function returning an async iterator (llama-index astream_*).
+        A reader that stops early must aclose() it, as with `stream`.
+        """
+        with self._lock:
+            self._stats(caller).calls += 1
+            entry = self._cached(key) if key is not None and cache else None
+            if entry is not None:
+                self._stats(caller).cache_hits += 1
+        if entry is not None:
+            for chunk in entry[1]:
+                yield chunk
+            return
+
+        attempt = 0
+        while True:
+            await self._aacquire(caller)
+            started = time.monotonic()
+            chunks, held = [], True
+            try:
+                iterator = (await fn(*args, **kwargs)).__aiter__()
+                chunk = await _anext(iterator)
+                while chunk is not _END:
+                    chunks.append(chunk)
+                    following = await _anext(iterator)
+                    if following is _END:
+                        held = False
+                        self._slots.release()
+                        self._finished(caller, time.monotonic() - started, chunk)
+                    yield chunk
+                    chunk = following
+            except Exception as e:
+                if not held:
+                    raise
+                retry = not chunks and attempt < self.max_retries and is_retryable(e)
+                self._slots.release()
+                self._finished(caller, time.monotonic() - started, failed=not retry)
+                if not retry:
+                    raise
+                await asyncio.sleep(self._rate_limited(caller, e, attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                if held:
+                    self._slots.release()
+                    self._finished(caller, time.monotonic() - started)
+                raise
+            if held:
+                self._slots.release()
+                self._finished(caller, time.monotonic() - started)
+            if key is not None and cache:
+                self._store(key, chunks)
+            return
+
+    def add_tokens(self, caller: str, prompt: int = 0, completion: int = 0):
+        """Counts tokens of calls whose response does not carry them (see wrap_crewai_llm)."""
+        self._count(caller, prompt_tokens=prompt, completion_tokens=completion)
+
+    def usage(self) -> dict:
+        with self._lock:
+            return {
+                "callers": {caller: stats.snapshot() for caller, stats in sorted(self._callers.items())},
+                "cached_responses": len(self._cache),
+                "in_flight_keys": len(self._inflight),
+            }
+
+
+shared_llm = LLMClient()
+metrics.add_section("llm", shared_llm.usage)
+
+
+# --- SDK adapters ---
+
+def _set(obj, name: str, value):
+    # SDK objects are often pydantic models, which reject unknown attributes through setattr
+    object.__setattr__(obj, name, value)
+
+
+def _messages_key(messages) -> list:
+    if isinstance(messages, str):
+        return [messages]
+    return [
+        (str(getattr(message, "role", "")), getattr(message, "content", message)) if not isinstance(message, dict) else message
+        for message in messages
+    ]
+
+
+def _tools_key(kwargs: dict) -> list:
+    tools = kwargs.get("tools") or []
+    return [getattr(getattr(tool, "metadata", None), "name", None) or getattr(tool, "name", None) or str(tool)
+            for tool in tools]
+
+
+def wrap_llama_index_llm(llm, caller: str, client: LLMClient = None):
+    """
+    Routes a llama-index LLM's chat/complete calls (sync, async and streaming) through the
+    shared client. Calls are keyed and cached only when the LLM's temperature is 0.
+    """
+    client = client or shared_llm
+
+    def key_for(method: str, args, kwargs):
+        if not is_deterministic(getattr(llm, "temperature", None)):
+            return None
+        # Agents pass messages by keyword (chat_with_tools), plain calls positionally
+        prompt = args[0] if args else kwargs.get("messages", kwargs.get("prompt"))
+        return request_key("llama-index", getattr(llm, "model", None), method, _messages_key(prompt or []), _tools_key(kwargs))
+
+    for method in ("chat", "complete"):
+        _set(llm, method, lambda *args, _original=getattr(llm, method), _method=method, **kwargs:
+             client.call(caller, _original, *args, key=key_for(_method, args, kwargs), **kwargs))
+    for method in ("stream_chat", "stream_complete"):
+        _set(llm, method, lambda *args, _original=getattr(llm, method), _method=method, **kwargs:
+             client.stream(caller, _original, *args, key=key_for(_method, args, kwargs), **kwargs))
+    for method in ("achat", "acomplete"):
+        async def wrapped(*args, _original=getattr(llm, method), _method=method, **kwargs):
+            return await client.acall(caller, _original, *args, key=key_for(_method, args, kwargs), **kwargs)
+        _set(llm, method, wrapped)
+    for method in ("astream_chat", "astream_complete"):
+        async def wrapped(*args, _original=getattr(llm, method), _method=method, **kwargs):
+            # llama-index awaits astream_* and then iterates the generator it returns
+            return client.astream(caller, _original, *args, key=key_for(_method, args, kwargs), **kwargs)
+        _set(llm, method, wrapped)
+    return llm
+
+
+def wrap_crewai_llm(llm, caller: str, client: LLMClient = None):
+    """Routes a crewai LLM's `call` through the shared client; cached when its temperature is 0."""
+    client = client or shared_llm
+    original = llm.call
+    # crewai's call returns text only. The LLM keeps running totals taken from every provider
+    # response (get_token_usage_summary), and their growth since the last report is counted:
+    # crews on several threads share one LLM, so a before/after delta per call would double count
+    reported = {"prompt_tokens": 0, "completion_tokens": 0}
+    reported_lock = threading.Lock()
+
+    def report_tokens():
+        summary = getattr(llm, "get_token_usage_summary", None)
+        if summary is None:
+            return
+        totals = summary()
+        with reported_lock:
+            growth = {}
+            for name in reported:
+                value = getattr(totals, name, 0) or 0
+                growth[name], reported[name] = max(0, value - reported[name]), value
+        client.add_tokens(caller, growth["prompt_tokens"], growth["completion_tokens"])
+
+    def call(messages, *args, **kwargs):
+        key = None
+        if is_deterministic(getattr(llm, "temperature", None)):
+            key = request_key("crewai", getattr(llm, "model", None), _messages_key(messages), _tools_key(kwargs))
+        try:
+            return client.call(caller, original, messages, *args, key=key, **kwargs)
+        finally:
+            report_tokens()
+
+    _set(llm, "call", call)
+    return llm
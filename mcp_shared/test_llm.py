@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+
+from mcp_shared import llm
+from mcp_shared.llm import LLMClient, TokenBucket, token_usage, wrap_crewai_llm
+
+
+def make_client(**kwargs):
+    # A bucket that never makes the tests wait
+    return LLMClient(bucket=TokenBucket(per_minute=60000, burst=1000), **kwargs)
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+def test_identical_calls_in_flight_share_one_request():
+    client = make_client()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.call("test", slow, key="k"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
+    assert client.usage()["callers"]["test"]["deduplicated"] == 2
+
+
+def test_cached_responses_expire_and_the_least_recently_used_is_dropped():
+    client = make_client(cache_ttl=0.1, max_cached=2)
+    calls = []
+
+    def answer(value):
+        calls.append(value)
+        return value
+
+    client.call("test", answer, "a", key="a")
+    client.call("test", answer, "a", key="a")
+    assert calls == ["a"]
+    time.sleep(0.15)
+    client.call("test", answer, "a", key="a")
+    assert calls == ["a", "a"]
+
+    client.call("test", answer, "b", key="b")
+    client.call("test", answer, "a", key="a")  # touches a, so b is the oldest
+    client.call("test", answer, "c", key="c")
+    client.call("test", answer, "a", key="a")
+    client.call("test", answer, "b", key="b")
+    assert calls == ["a", "a", "b", "c", "b"]
+
+
+def test_rate_limit_is_retried_and_pauses_every_caller(monkeypatch):
+    monkeypatch.setattr(llm, "backoff", lambda attempt: 0.05)
+    client = make_client()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimited("429 Too Many Requests")
+        return "ok"
+
+    assert client.call("test", flaky) == "ok"
+    assert client.bucket.paused_until > 0
+    stats = client.usage()["callers"]["test"]
+    assert (stats["retries"], stats["rate_limited"], stats["errors"]) == (1, 1, 0)
+
+    def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        client.call("test", broken)
+    assert client.usage()["callers"]["test"]["errors"] == 1
+
+
+def test_stream_frees_its_slot_when_closed_early_or_exhausted():
+    client = make_client(max_concurrent=1)
+
+    def endless():
+        while True:
+            yield "chunk"
+
+    stream = client.stream("test", endless)
+    next(stream)
+    assert not client._slots.acquire(blocking=False)
+    stream.close()
+    assert client._slots.acquire(blocking=False)
+    client._slots.release()
+
+    # The slot is free once the response has ended, before the last chunk is read
+    stream = client.stream("test", lambda: iter(["a", "b"]))
+    assert next(stream) == "a"
+    assert next(stream) == "b"
+    assert client._slots.acquire(blocking=False)
+    client._slots.release()
+
+
+def test_token_usage_of_object_and_dict_responses():
+    class Usage:
+        prompt_token_count = 3
+        candidates_token_count = 5
+
+    class Response:
+        usage_metadata = Usage()
+
+    class ChatResponse:
+        raw = {"usage_metadata": {"prompt_token_count": 7, "candidates_token_count": 11}}
+
+    assert token_usage(Response()) == {"prompt": 3, "completion": 5}
+    assert token_usage(ChatResponse()) == {"prompt": 7, "completion": 11}
+    assert token_usage({"usage": {"prompt_tokens": 1, "completion_tokens": 2}}) == {"prompt": 1, "completion": 2}
+    assert token_usage("plain text") == {}
+
+
+def test_crewai_tokens_come_from_the_llm_totals():
+    class Totals:
+        def __init__(self, prompt, completion):
+            self.prompt_tokens, self.completion_tokens = prompt, completion
+
+    class FakeCrewLLM:
+        model = "gemini/test"
+        temperature = 0
+
+        def __init__(self):
+            self.totals = Totals(0, 0)
+
+        def call(self, messages, **kwargs):
+            self.totals = Totals(self.totals.prompt_tokens + 10, self.totals.completion_tokens + 4)
+            return "text"
+
+        def get_token_usage_summary(self):
+            return self.totals
+
+    client = make_client()
+    crew_llm = wrap_crewai_llm(FakeCrewLLM(), caller="crew", client=client)
+    assert crew_llm.call("first prompt") == "text"
+    crew_llm.call("second prompt")
+    crew_llm.call("second prompt")  # cached: no new tokens
+    stats = client.usage()["callers"]["crew"]
+    assert (stats["prompt_tokens"], stats["completion_tokens"], stats["cache_hits"]) == (20, 8, 1)